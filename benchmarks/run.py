@@ -0,0 +1,372 @@
+"""
+Times the hot paths of models.py, and compares them against a stored baseline.
+
+    python benchmarks/run.py                     # run, print, and compare against benchmarks/baseline.json
+    python benchmarks/run.py --output out.json   # also write the results to out.json
+    python benchmarks/run.py --save-baseline     # replace the baseline with this run's results
+
+Each benchmark reports how many hands (or other units of work) it gets through per second, and how many bytes it
+allocates per unit (measured in a separate, untimed pass with tracemalloc). A benchmark regresses if its throughput
+falls, or its allocations grow, by more than the tolerance relative to the baseline; any regression makes the script
+exit with status 1; a benchmark which seems to have regressed is timed again first, and only reported if it still
+has. Baselines are only comparable on the machine which recorded them.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from operator import methodcaller
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Deck, Hand, HandEvaluatorMixin, Simulator  # noqa: E402
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# times plain Python, which no change to models.py can speed up or slow down, to measure the machine itself
+CALIBRATION = "machine.calibration"
+
+TWO_SUITS = {"𓆏": "GREEN", "𓃰": "GREY"}
+
+RANKS_TO_RANK_VALUES = {
+    "A": 1, "K": 10, "Q": 10, "J": 10, "10": 10, "9": 9, "8": 6, "7": 7, "6": 6, "5": 5, "4": 4, "3": 3, "2": 2
+}
+
+
+def _calibrate(_):
+    counts = dict()
+
+    for i in range(52):
+        counts[i % 13] = counts.get(i % 13, 0) + 1
+
+    return sorted(counts.values())
+
+
+def _sample_hands(count=256, size=13):
+    """
+    Returns a pool of 13 card hands from the doubled two-suit deck (without aces) used by the tests.py experiments.
+    """
+
+    deck = Deck(custom_suits=TWO_SUITS)
+    deck.double_cards()
+    deck.remove_cards(lambda_statement=lambda x: x.rank != "A")
+
+    rng = Random(0)
+
+    return [rng.sample(deck.cards, size) for _ in range(count)]
+
+
+def _doubled_deck():
+    deck = Deck(custom_suits=TWO_SUITS)
+    deck.double_cards()
+
+    return deck
+
+
+def _valued_deck():
+    deck = Deck()
+    deck.remove_cards_by_rank(["10", "9", "8"])
+
+    for card in deck.cards:
+        card.assign_custom_rank_value(RANKS_TO_RANK_VALUES)
+
+    return deck
+
+
+class Benchmark:
+    def __init__(self, name, run, setup=None, units=1):
+        """
+        :param name: The benchmark's name, as recorded in results.
+        :param run: Does one operation's work, given whatever setup returned.
+        :param setup: Prepares a fresh input for each operation, outside of the timing (optional).
+        :param units: How many hands (or other units of work) one operation processes.
+        """
+
+        self.name = name
+        self.run = run
+        self.setup = setup if setup else (lambda: None)
+        self.units = units
+
+    def batch_size(self, round_seconds):
+        """
+        Returns how many operations to time at once for a round to last about round_seconds - so that operations of a
+        few microseconds aren't swamped by the timer's own overhead, or by the odd slow one.
+        """
+
+        # doubles the batch until it's long enough to measure, then scales it up to a round's length
+        operations = 1
+        elapsed = self.time_batch(operations)
+
+        while elapsed < round_seconds / 10:
+            operations *= 2
+            elapsed = self.time_batch(operations)
+
+        return max(operations, int(operations * round_seconds / elapsed))
+
+    def time_batch(self, operations):
+        """
+        Returns the seconds taken by operations-many operations, timed as a single loop over inputs which are all set
+        up beforehand (with garbage collection paused, as timeit does).
+        """
+
+        arguments = [self.setup() for _ in range(operations)]
+        run = self.run
+
+        collecting = gc.isenabled()
+        gc.disable()
+
+        try:
+            started = time.perf_counter()
+
+            for argument in arguments:
+                run(argument)
+
+            return time.perf_counter() - started
+
+        finally:
+            if collecting:
+                gc.enable()
+
+    def allocations(self):
+        """
+        Returns the bytes allocated (at peak) by one operation - the least over a few operations, after a warm-up
+        one, so that one-off allocations (e.g. of caches) aren't counted.
+        """
+
+        self.run(self.setup())
+
+        peaks = []
+
+        for _ in range(3):
+            argument = self.setup()
+
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+            self.run(argument)
+
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            tracemalloc.stop()
+
+        return min(peaks)
+
+
+def build_benchmarks():
+    hands = _sample_hands()
+    rotation = iter(range(1 << 62))
+
+    def next_hand():
+        return hands[next(rotation) % len(hands)]
+
+    def query(name, *args):
+        return Benchmark(
+            name=f"evaluator.{name}",
+            setup=lambda: HandEvaluatorMixin(next_hand()),
+            run=methodcaller(name, *args)
+        )
+
+    doubled_deck = _doubled_deck()
+    valued_deck = _valued_deck()
+
+    foak_simulator = Simulator(
+        deck=doubled_deck,
+        draw_count=13,
+        predicates={"four_of_a_kind": methodcaller("has_four_of_a_kind")},
+        card_filter=lambda x: x.rank != "A"
+    )
+
+    straights_simulator = Simulator(
+        deck=doubled_deck,
+        draw_count=13,
+        predicates={n: methodcaller("has_straight", n) for n in range(3, 9)},
+        card_filter=lambda x: x.rank != "A"
+    )
+
+    diminishing_simulator = Simulator(
+        deck=doubled_deck, draw_count=12, predicates={}, card_filter=lambda x: x.rank != "A"
+    )
+
+    def diminishing_straights(iterations):
+        for cards in diminishing_simulator.samples(iterations, seed=0):
+            hand = Hand(custom_cards=cards)
+
+            while len(hand.cards) >= 3:
+                hand.evaluator.has_straight(3)
+                hand.remove_lowest_ranked_card()
+
+    rank_values_simulator = Simulator(deck=valued_deck, draw_count=5, predicates={})
+
+    def draw_setup():
+        hand = Hand()
+        hand.remove_all_cards()
+
+        deck = Deck()
+        deck.shuffle()
+
+        return hand, deck
+
+    return [
+        Benchmark(CALIBRATION, run=_calibrate),
+        # a hand's cards are only made when they're read (see Hand), so this reads them
+        Benchmark("hand.construction", run=lambda _: Hand().cards),
+        Benchmark("hand.lazy_construction", run=lambda _: Hand()),
+        Benchmark("hand.double_cards", setup=lambda: Deck(custom_suits=TWO_SUITS), run=methodcaller("double_cards")),
+        Benchmark("hand.shuffle", setup=_doubled_deck, run=methodcaller("shuffle")),
+        Benchmark("hand.draw_cards_from_deck", setup=draw_setup, run=lambda a: a[0].draw_cards_from_deck(a[1], 5)),
+        Benchmark("evaluator.construction", run=lambda _: HandEvaluatorMixin(next_hand()).rank_values_histogram),
+        query("has_flush", 5),
+        query("has_straight", 5),
+        query("has_straight_flush", 5),
+        query("has_four_of_a_kind"),
+        query("has_three_of_a_kind"),
+        query("has_pair"),
+        query("has_two_pairs"),
+        query("has_m_many_n_of_a_kind", 3, 2),
+        Benchmark("scenario.foak_probability", run=lambda _: foak_simulator.run(2000, seed=0), units=2000),
+        Benchmark("scenario.straights_probability", run=lambda _: straights_simulator.run(2000, seed=0), units=2000),
+        Benchmark("scenario.diminishing_straights", run=lambda _: diminishing_straights(200), units=200),
+        Benchmark(
+            "scenario.rank_values",
+            run=lambda _: rank_values_simulator.tally(methodcaller("get_total_rank_values"), 2000, seed=0),
+            units=2000
+        ),
+    ]
+
+
+def run_benchmarks(min_seconds, names=None, rounds=30):
+    """
+    Times each benchmark (or those named) for about min_seconds, in rounds, keeping its best seconds per operation.
+    Rounds take turns across the benchmarks, rather than running back to back, so that a slow spell on the machine
+    only costs a benchmark a few of its rounds rather than all of them.
+    """
+
+    benchmarks = [
+        benchmark for benchmark in build_benchmarks()
+        if names is None or benchmark.name in names or benchmark.name == CALIBRATION
+    ]
+    batch_sizes = [benchmark.batch_size(min_seconds / rounds) for benchmark in benchmarks]
+    best = [float("inf")] * len(benchmarks)
+
+    for _ in range(rounds):
+        for i, (benchmark, operations) in enumerate(zip(benchmarks, batch_sizes)):
+            best[i] = min(best[i], benchmark.time_batch(operations) / operations)
+
+    results = dict()
+
+    for benchmark, seconds in zip(benchmarks, best):
+        results[benchmark.name] = {
+            "hands_per_second": benchmark.units / seconds,
+            "bytes_allocated_per_hand": benchmark.allocations() / benchmark.units,
+        }
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a description of each benchmark which regressed relative to the baseline. Throughputs are expected to
+    fall with the machine's: if the calibration benchmark runs at 80% of its baseline, so may the rest.
+    """
+
+    regressions = []
+    speed = 1.0
+
+    if CALIBRATION in results and CALIBRATION in baseline:
+        speed = min(1.0, results[CALIBRATION]["hands_per_second"] / baseline[CALIBRATION]["hands_per_second"])
+
+    for name, result in results.items():
+        if name not in baseline or name == CALIBRATION:
+            continue
+
+        expected = baseline[name]
+
+        if result["hands_per_second"] < expected["hands_per_second"] * speed * (1 - tolerance):
+            regressions.append(
+                "{}: {:,.0f} hands/s, down from {:,.0f}".format(
+                    name, result["hands_per_second"], expected["hands_per_second"]
+                )
+            )
+
+        # a little slack for allocations which are too small to be stable
+        if result["bytes_allocated_per_hand"] > expected["bytes_allocated_per_hand"] * (1 + tolerance) + 64:
+            regressions.append(
+                "{}: {:,.0f} bytes allocated per hand, up from {:,.0f}".format(
+                    name, result["bytes_allocated_per_hand"], expected["bytes_allocated_per_hand"]
+                )
+            )
+
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Writes the results to this JSON file.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="The baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true", help="Replaces the baseline with these results.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="The allowed relative regression.")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="How long to time each benchmark for.")
+    options = parser.parse_args(arguments)
+
+    results = run_benchmarks(options.min_seconds)
+    baseline = None
+
+    if not options.save_baseline and os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+
+        # a benchmark which seems to have regressed is timed again before it's reported, in case the machine was
+        # only busy for a while
+        suspects = [
+            name for name in results
+            if compare({name: results[name], CALIBRATION: results[CALIBRATION]}, baseline, options.tolerance)
+        ]
+
+        if suspects:
+            for name, result in run_benchmarks(options.min_seconds, suspects).items():
+                # the machine is as slow as it was in the slower of the two runs, while the benchmarks are as fast
+                # as they were in the faster one
+                pick = min if name == CALIBRATION else max
+
+                results[name] = {
+                    "hands_per_second": pick(result["hands_per_second"], results[name]["hands_per_second"]),
+                    "bytes_allocated_per_hand": min(
+                        result["bytes_allocated_per_hand"], results[name]["bytes_allocated_per_hand"]
+                    )
+                }
+
+    for name, result in results.items():
+        print("{:<36} {:>14,.0f} hands/s {:>12,.0f} bytes/hand".format(
+            name, result["hands_per_second"], result["bytes_allocated_per_hand"]
+        ))
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+
+        return 0
+
+    if baseline is None:
+        print(f"No baseline at {options.baseline}; run with --save-baseline to record one.")
+        return 0
+
+    regressions = compare(results, baseline, options.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,73 +1,177 @@
-from random import shuffle
-from copy import deepcopy
+from random import shuffle, Random
+from copy import copy
+from collections import Counter, OrderedDict, namedtuple
+from operator import attrgetter
+from array import array
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, lru_cache, wraps
+from fractions import Fraction
+from math import comb, factorial, prod, lgamma, log, exp
+from bisect import bisect_left
+from itertools import combinations, combinations_with_replacement, compress
+import os
+import pickle
+import sys
+import mmap
+import struct
+import hashlib
+import json
+import csv
+import io
+from contextlib import contextmanager
+from time import perf_counter
+
+
+DEFAULT_CARD_RANKS = {
+    "2": 2,
+    "3": 3,
+    "4": 4,
+    "5": 5,
+    "6": 6,
+    "7": 7,
+    "8": 8,
+    "9": 9,
+    "10": 10,
+    "J": 11,
+    "Q": 12,
+    "K": 13,
+    "A": 14
+}
+
+DEFAULT_CARD_SUITS = {
+    "♠": "BLACK",
+    "♣": "BLACK",
+    "♡": "RED",
+    "♢": "RED"
+}
+
+# the rank (and suit, and color) of jokers - which WildcardEvaluator treats as wild by default
+JOKER_RANK = "JOKER"
+JOKER_SUIT = "🃏"
+JOKER_COLOR = "NONE"
+
+# hand categories, from worst to best
+HAND_CATEGORIES = (
+    "HIGH_CARD",
+    "PAIR",
+    "TWO_PAIRS",
+    "THREE_OF_A_KIND",
+    "STRAIGHT",
+    "FLUSH",
+    "FULL_HOUSE",
+    "FOUR_OF_A_KIND",
+    "STRAIGHT_FLUSH"
+)
 
 
 class Hand:
-    def __init__(self, custom_cards=None, custom_suits=None, custom_ranks=None):
+    def __init__(self, custom_cards=None, custom_suits=None, custom_ranks=None, evaluation_cache=None):
         """
         A hand of playing cards. By default, generates a normal 52 card deck. \
         If custom_cards is specified, these cards are used instead. \
         If both custom_suits and custom_ranks are specified, generates a deck with these ranks/suits. \
-        If only one is specified, uses default ranks/suits (respective to what was unspecified)
+        If only one is specified, uses default ranks/suits (respective to what was unspecified). \
+        Generated hands keep a reference to the (interned) DeckSchema of their ranks/suits in self.schema, and start
+        out as a copy of the schema's codes: until their cards are first read, they stand for the schema's shared,
+        immutable cards (see DeckSchema.views), and shuffling, doubling, drawing and removing cards (by index, by rank
+        or with a CardFilter) only move codes around. Mutable Cards are only made when self.cards is read (see
+        __getattr__), as from then on they can be changed. For an empty hand, use Hand.empty.
 
         :type custom_cards: list[Card]
         :type custom_suits: dict[str, str]
         :type custom_ranks: dict[str, int]
+        :param evaluation_cache: Caches the hand evaluator's query results (optional; see EvaluationCache).
+        :type evaluation_cache: EvaluationCache
         """
 
-        default_card_ranks = {
-            "2": 2,
-            "3": 3,
-            "4": 4,
-            "5": 5,
-            "6": 6,
-            "7": 7,
-            "8": 8,
-            "9": 9,
-            "10": 10,
-            "J": 11,
-            "Q": 12,
-            "K": 13,
-            "A": 14
-        }
-
-        default_card_suits = {
-            "♠": "BLACK",
-            "♣": "BLACK",
-            "♡": "RED",
-            "♢": "RED"
-        }
+        self._evaluation_cache = evaluation_cache
 
         if custom_cards:
             self.cards = custom_cards
+            self.schema = None
+            self._codes = None
+            self.evaluator = HandEvaluatorMixin(self.cards, evaluation_cache)
 
-        elif custom_suits or custom_ranks:
-            self.cards = [
-                Card(
-                    rank=rank,
-                    rank_value=(custom_ranks if custom_ranks else default_card_ranks)[rank],
-                    suit=suit,
-                    color=(custom_suits if custom_suits else default_card_suits)[suit],
-                )
-                for rank in (custom_ranks if custom_ranks else default_card_ranks)
-                for suit in (custom_suits if custom_suits else default_card_suits)
-            ]
+        else:
+            # the cards (and their evaluator) are only made when they're first read (see __getattr__)
+            self.schema = DeckSchema.intern(custom_suits, custom_ranks)
+            self._codes = list(self.schema.template_codes)
+
+    @classmethod
+    def empty(cls, schema=None, evaluation_cache=None):
+        """
+        Returns a hand without any cards, to draw or add cards to.
+
+        :param schema: The DeckSchema of the cards the hand will hold (optional; needed to encode the hand).
+        :type schema: DeckSchema
+        :type evaluation_cache: EvaluationCache
+        """
+
+        hand = cls.__new__(cls)
+        hand._evaluation_cache = evaluation_cache
+        hand.schema = schema
 
+        if schema is None:
+            hand.cards = []
+            hand._codes = None
         else:
-            self.cards = [
-                Card(
-                    rank=rank,
-                    rank_value=default_card_ranks[rank],
-                    suit=suit,
-                    color=default_card_suits[suit],
-                ) for rank in default_card_ranks for suit in default_card_suits
-            ]
+            hand._codes = []
+
+        return hand
+
+    def __getattr__(self, name):
+        """
+        Makes a generated hand's cards, or builds its evaluator (which is then kept up to date as the hand changes),
+        the first time it's read. Only called for attributes which aren't set, so reading them afterwards costs
+        nothing.
+        """
+
+        if name == "cards":
+            # the cards are handed out, and may be changed - so from now on, the hand holds mutable Cards
+            self.cards = self.schema.new_cards(self._codes)
+            self._codes = None
+
+            evaluator = self.__dict__.get("evaluator")
+
+            if evaluator is not None:
+                evaluator.cards = self.cards
+
+            return self.cards
+
+        if name == "evaluator":
+            self.evaluator = HandEvaluatorMixin(self._read_cards(), self._evaluation_cache)
+            return self.evaluator
+
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def _unread_codes(self):
+        """
+        Returns the codes of a generated hand's cards, while they haven't been read (see __getattr__) - otherwise None.
+        (They're kept in a list, as small ints are shared, and lists are quicker to shuffle and slice than arrays.)
+
+        :rtype: list[int] | None
+        """
+
+        return None if "cards" in self.__dict__ else self._codes
 
-        self.evaluator = HandEvaluatorMixin(self.cards)
+    def _read_cards(self):
+        """
+        Returns the hand's cards for reading only - which, while they haven't been read, are the schema's shared
+        CardViews rather than new Cards.
+
+        :rtype: list[Card | CardView]
+        """
+
+        codes = self._unread_codes()
+
+        return self.cards if codes is None else self.schema.decode(codes)
 
     def __str__(self):
-        if len(self.cards) > 0:
-            return " ".join([f"{c.rank}{c.suit}" for c in self.cards])
+        cards = self._read_cards()
+
+        if len(cards) > 0:
+            return " ".join([f"{c.rank}{c.suit}" for c in cards])
         else:
             return ""
 
@@ -78,84 +182,369 @@ class Hand:
         for c in cards:
             self.cards.append(c)
 
-        # reinitialize hand evaluator
-        self.evaluator = HandEvaluatorMixin(self.cards)
+        self._update_evaluator(added=cards)
 
     def double_cards(self):
         """
         Creates a duplicate of each card in the deck.
         """
 
-        self.cards += deepcopy(self.cards)
+        codes = self._unread_codes()
+
+        if codes is not None:
+            duplicates = codes[:]
+            codes.extend(duplicates)
+
+            self._update_evaluator_codes(added=duplicates)
+            return
 
-        # reinitialize hand evaluator
-        self.evaluator = HandEvaluatorMixin(self.cards)
+        duplicates = [copy(c) for c in self.cards]
+        self.cards += duplicates
+
+        self._update_evaluator(added=duplicates)
 
     def remove_cards(self, lambda_statement=None, index=None):
         """
         Filters self.cards according to the provided lambda statement.  If both are specified, lambdas filter first.
+        While a generated hand's cards haven't been read, a CardFilter is applied to their codes with the mask it
+        compiled for the hand's schema (see CardFilter.schema_mask), as PermutationDeck does - without calling it on
+        any card.
         """
 
+        codes = self._unread_codes()
+
+        if codes is not None and (not lambda_statement or isinstance(lambda_statement, CardFilter)):
+            removed = []
+
+            if lambda_statement:
+                mask = lambda_statement.schema_mask(self.schema)
+
+                if "evaluator" in self.__dict__:
+                    removed = [c for c in codes if not mask[c]]
+
+                codes = list(compress(codes, map(mask.__getitem__, codes)))
+
+            if index:
+                removed += codes[index:]
+                codes = codes[0:index]
+
+            self._codes = codes
+
+            self._update_evaluator_codes(removed=removed)
+            return
+
+        removed = []
+
         if lambda_statement:
-            self.cards = list(filter(lambda_statement, self.cards))
+            kept = []
+
+            for c in self.cards:
+                (kept if lambda_statement(c) else removed).append(c)
+
+            self.cards = kept
 
         if index:
+            removed += self.cards[index:]
             self.cards = self.cards[0:index]
 
-        # reinitialize hand evaluator
-        self.evaluator = HandEvaluatorMixin(self.cards)
+        self._update_evaluator(removed=removed)
+
+    def add_jokers(self, count):
+        """
+        Adds count jokers (see JOKER_RANK), which are wild once the hand uses wildcards (see use_wildcards).
+        """
+
+        self.add_cards([Card(rank=JOKER_RANK, rank_value=0, suit=JOKER_SUIT, color=JOKER_COLOR) for _ in range(count)])
+
+    def use_wildcards(self, wild=None, rank_values=None, suits=None):
+        """
+        Evaluates the hand with a WildcardEvaluator from now on.
+
+        :param wild: Which cards are wild (optional; by default, jokers).
+        :param rank_values: The rank values wild cards can stand in for (optional; by default, the hand's schema's - or
+            the default deck's).
+        :param suits: The suits wild cards can stand in for (optional; likewise).
+        """
+
+        if self.schema is not None:
+            rank_values = self.schema.ranks.values() if rank_values is None else rank_values
+            suits = self.schema.suits if suits is None else suits
+
+        self.evaluator = WildcardEvaluator(
+            self._read_cards(), self.evaluator.evaluation_cache, wild, rank_values, suits
+        )
 
     def remove_top_card(self):
         """
         Removes the first card.
         """
 
+        codes = self._unread_codes()
+
+        if codes is not None:
+            self._codes = codes[1:]
+
+            self._update_evaluator_codes(removed=codes[0:1])
+            return
+
+        removed = self.cards[0:1]
         self.cards = self.cards[1:len(self.cards)]
 
-        # reinitialize hand evaluator
-        self.evaluator = HandEvaluatorMixin(self.cards)
+        self._update_evaluator(removed=removed)
 
     def remove_all_cards(self):
-        self.cards.clear()
+        if "cards" in self.__dict__:
+            self.cards.clear()
+        else:
+            self._codes = []
 
-        # reinitialize hand evaluator
-        self.evaluator = HandEvaluatorMixin(self.cards)
+        evaluator = self.__dict__.get("evaluator")
+
+        if evaluator is not None:
+            evaluator.cards = self._read_cards()
+            evaluator.clear()
 
     def remove_cards_by_rank(self, ranks):
+        ranks = set(ranks)
+        codes = self._unread_codes()
+
+        if codes is not None:
+            code_ranks = self.schema.code_ranks
+
+            removed = [c for c in codes if code_ranks[c] in ranks] if "evaluator" in self.__dict__ else ()
+            self._codes = [c for c in codes if code_ranks[c] not in ranks]
+
+            self._update_evaluator_codes(removed=removed)
+            return
+
+        kept = []
+        removed = []
+
+        for c in self.cards:
+            (removed if c.rank in ranks else kept).append(c)
 
-        self.cards = [c for c in self.cards if c.rank not in ranks]
+        self.cards = kept
 
-        # reinitialize hand evaluator
-        self.evaluator = HandEvaluatorMixin(self.cards)
+        self._update_evaluator(removed=removed)
 
     def remove_lowest_ranked_card(self):
         if len(self.cards) != 0:
-            self.cards.remove(min(self.cards, key=lambda x: x.rank))
+            card = min(self.cards, key=lambda x: x.rank_value)
+            self.cards.remove(card)
+
+            self._update_evaluator(removed=[card])
+
+    def sweep_lowest_cards(self, predicate, min_cards_count=1, key=None):
+        """
+        Evaluates a predicate over the hand, then over the hand without its lowest card, and so on down to
+        min_cards_count cards - as repeatedly calling remove_lowest_ranked_card (or remove_lowest_point_value_card)
+        would, but without changing the hand.
+
+        The cards are sorted once, and a single evaluator is filled from the highest card downwards, so each step only
+        counts one more card rather than re-evaluating the hand.
+
+        :param predicate: A function of a HandEvaluatorMixin, e.g. lambda e: e.has_straight(3).
+        :param min_cards_count: The smallest hand size to evaluate.
+        :param key: Orders the cards, lowest first (rank value, by default).
+        :return: The predicate's result by hand size.
+        :rtype: dict[int, object]
+        """
+
+        # sorted() is stable, so equally ranked cards are dropped in the order min() would pick them
+        cards = sorted(self._read_cards(), key=key or attrgetter("rank_value"))
+
+        # of the same kind as the hand's (e.g. a WildcardEvaluator, which counts wild cards differently)
+        evaluator = self.evaluator.with_cards([])
+        results = dict()
 
-            # reinitialize hand evaluator
-            self.evaluator = HandEvaluatorMixin(self.cards)
+        for size in range(1, len(cards) + 1):
+            card = cards[-size]
+
+            evaluator.cards.append(card)
+            evaluator.add_cards([card])
+
+            if size >= min_cards_count:
+                results[size] = predicate(evaluator)
+
+        return results
 
     def remove_lowest_point_value_card(self):
         if len(self.cards) != 0:
-            self.cards.remove(min(self.cards, key=lambda x: x.point_value))
+            card = min(self.cards, key=lambda x: x.point_value)
+            self.cards.remove(card)
+
+            self._update_evaluator(removed=[card])
+
+    def _update_evaluator(self, added=(), removed=()):
+        """
+        Brings the hand evaluator up to date after a mutation, applying the added and removed cards as deltas rather
+        than rebuilding it from scratch. (An evaluator which hasn't been built yet will count the cards when it is.)
+        """
+
+        evaluator = self.__dict__.get("evaluator")
+
+        if evaluator is None:
+            return
+
+        evaluator.cards = self._read_cards()
+
+        if removed:
+            evaluator.remove_cards(removed)
+
+        if added:
+            evaluator.add_cards(added)
+
+    def _update_evaluator_codes(self, added=(), removed=()):
+        """
+        As _update_evaluator, for a hand whose cards haven't been read, given the codes of the added and removed cards.
+        """
+
+        if "evaluator" in self.__dict__:
+            self._update_evaluator(self.schema.decode(added), self.schema.decode(removed))
 
-            # reinitialize hand evaluator
-            self.evaluator = HandEvaluatorMixin(self.cards)
+    def shuffle(self, seed=None):
+        """
+        :param seed: Shuffles reproducibly, using a random number generator seeded with this (optional). Whether or
+            not the hand's cards have been read, a seed gives the same order.
+        """
+
+        codes = self._unread_codes()
+        cards = self.cards if codes is None else codes
+
+        if seed is None:
+            shuffle(cards)
+        else:
+            Random(seed).shuffle(cards)
 
-    def shuffle(self):
-        shuffle(self.cards)
+        if codes is not None:
+            self._update_evaluator()
 
     def draw_cards_from_deck(self, deck, amount):
         """
-        Draws a card from a deck.
+        Draws cards from the top of a deck (or a Shoe).
+
+        :type deck: Hand | Shoe
         """
 
-        for a in range(amount):
-            self.add_cards([deck.cards[0]])
-            deck.remove_top_card()
+        if isinstance(deck, Shoe):
+            self.add_cards(deck.deal(amount))
+            return
+
+        deck_codes = deck._unread_codes()
+
+        if deck_codes is not None:
+            if amount > len(deck_codes):
+                raise IndexError(f"Can't draw {amount} cards from a deck of {len(deck_codes)}.")
+
+            codes = deck_codes[0:amount]
+            deck._codes = deck_codes[amount:]
+            deck._update_evaluator_codes(removed=codes)
+
+            own_codes = self._unread_codes()
+
+            if own_codes is not None and self.schema is deck.schema:
+                own_codes.extend(codes)
+                self._update_evaluator_codes(added=codes)
+            else:
+                self.add_cards(deck.schema.new_cards(codes))
+
+            return
+
+        if amount > len(deck.cards):
+            raise IndexError(f"Can't draw {amount} cards from a deck of {len(deck.cards)}.")
+
+        cards = deck.cards[0:amount]
+        deck.cards = deck.cards[amount:]
+
+        deck._update_evaluator(removed=cards)
+        self.add_cards(cards)
 
     def get_total_rank_values(self):
-        return sum([c.rank_value for c in self.cards])
+        return sum([c.rank_value for c in self._read_cards()])
+
+    def encode(self):
+        """
+        Returns the hand's cards as an array of DeckSchema codes (two bytes per card).
+
+        :rtype: array
+        """
+
+        if self.schema is None:
+            raise ValueError("This hand was built from custom cards, and has no deck schema to encode them against.")
+
+        codes = self._unread_codes()
+
+        return self.schema.encode(self.cards) if codes is None else array("H", codes)
+
+    def canonicalize(self, suits=None):
+        """
+        Returns the representative of this hand's suit isomorphism class - the hands which are the same as this one up
+        to a relabelling of suits - along with how many distinct hands (as multisets of ranks and suits) are in the
+        class. Suit-symmetric queries (pairs, straights, flushes in any suit, rank value totals...) give the same
+        answer for every hand in a class, so they only need evaluating once per class, weighted by its size.
+
+        The representative gives its fullest suit (then its highest ranked one) the first suit, and so on. Colors
+        follow the suits, so they aren't preserved.
+
+        :param suits: The deck's suits, mapped to their colors (optional; by default, the hand's schema's suits - or,
+        for custom cards, the suits in the hand).
+        :type suits: dict[str, str]
+        :rtype: tuple[Hand, int]
+        """
+
+        if suits is None:
+            suits = self.schema.suits if self.schema else {c.suit: c.color for c in self.cards}
+
+        suit_cards = {suit: [] for suit in suits}
+
+        for c in self._read_cards():
+            if c.suit not in suit_cards:
+                raise ValueError(f"The suit {c.suit} isn't one of the deck's suits.")
+
+            suit_cards[c.suit].append(c)
+
+        def signature(cards):
+            return len(cards), sorted(((c.rank_value, c.rank) for c in cards), reverse=True)
+
+        ordered_suit_cards = sorted(suit_cards.values(), key=signature, reverse=True)
+
+        cards = [
+            Card(rank=c.rank, rank_value=c.rank_value, suit=suit, color=suits[suit], point_value=c.point_value)
+            for suit, cards in zip(suits, ordered_suit_cards)
+            for c in sorted(cards, key=lambda c: (c.rank_value, c.rank))
+        ]
+
+        # relabellings which swap suits holding the same ranks give the same hand
+        identical_suit_counts = Counter(tuple(signature(cards)[1]) for cards in suit_cards.values()).values()
+        count = factorial(len(suits)) // prod(factorial(n) for n in identical_suit_counts)
+
+        if cards:
+            representative = Hand(custom_cards=cards)
+            representative.schema = self.schema
+        else:
+            representative = Hand.empty(self.schema)
+
+        return representative, count
+
+    @classmethod
+    def from_codes(cls, codes, schema):
+        """
+        Builds a hand of read-only CardViews from an array of codes. The views are shared with the schema, so no
+        card objects are allocated.
+
+        :type codes: array | list[int]
+        :type schema: DeckSchema
+        """
+
+        cards = schema.decode(codes)
+
+        if not cards:
+            return cls.empty(schema)
+
+        hand = cls(custom_cards=cards)
+        hand.schema = schema
+
+        return hand
 
 
 class Deck(Hand):
@@ -163,127 +552,3865 @@ class Deck(Hand):
     Kind of like a hand, if you think about it.
     """
 
-    def __init__(self, custom_cards=None, custom_suits=None, custom_ranks=None):
-        super().__init__(custom_cards, custom_suits, custom_ranks)
-
     def get_sample_hand(self, count):
+        codes = self._unread_codes()
+
+        if codes is not None:
+            hand = Hand.empty(self.schema)
+            hand._codes = codes[0:count]
+
+            return hand
+
         return Hand(custom_cards=self.cards[0:count])
 
+    def shoe(self):
+        """
+        Returns a Shoe which deals from this deck's cards (in their current order).
+        """
+
+        return Shoe(self.cards)
 
-class HandEvaluatorMixin:
+    def permutation_deck(self):
+        """
+        Returns a PermutationDeck of this deck's cards (in their current order).
+        """
+
+        return PermutationDeck(self.cards)
+
+
+class Shoe:
     def __init__(self, cards):
+        """
+        Deals cards off the top of a deck by moving a position along it, rather than removing them from the deck, so
+        dealing n cards only costs O(n). The cards aren't copied: shuffle the deck before making a shoe of it, and
+        don't change it while dealing.
 
-        self.cards = cards if cards else []
+        :type cards: list[Card]
+        """
 
-        self.all_card_suits = self._enumerate_card_suits()
-        self.all_card_ranks = self._enumerate_card_ranks()
-        self.all_card_colors = self._enumerate_card_colors()
-        self.all_card_rank_values = self._enumerate_card_rank_values()
+        self.cards = cards
+        self.position = 0
 
-        self.suits_histogram = self._enumerate_suits_histogram()
-        self.rank_values_histogram = self._enumerate_rank_values_histogram()
+    def __len__(self):
+        return len(self.cards) - self.position
 
-    def _enumerate_card_suits(self):
-        return {c.suit for c in self.cards}
+    def deal(self, amount):
+        """
+        Returns the next amount-many cards.
 
-    def _enumerate_card_ranks(self):
-        return {c.rank for c in self.cards}
+        :rtype: list[Card]
+        """
 
-    def _enumerate_card_colors(self):
-        return {c.color for c in self.cards}
+        if amount > len(self):
+            raise IndexError(f"Can't deal {amount} cards from a shoe with {len(self)} left.")
 
-    def _enumerate_card_rank_values(self):
-        return {c.rank_value for c in self.cards}
+        cards = self.cards[self.position:self.position + amount]
+        self.position += amount
 
-    def _enumerate_suits_histogram(self):
-        return {suit: len([c for c in self.cards if c.suit == suit]) for suit in self.all_card_suits}
+        return cards
 
-    def _enumerate_rank_values_histogram(self):
-        return {
-            rank_value:
-                len([c for c in self.cards if c.rank_value == rank_value]) for rank_value in self.all_card_rank_values
-        }
+    def deal_hand(self, amount):
+        """
+        Returns a Hand of the next amount-many cards.
 
-    def has_flush(self, cards_count=5, suit=None):
+        :rtype: Hand
         """
-        :param cards_count: The amount of cards required to constitute a flush.
-        :param suit: The suit that a flush is required to constitute (optional; default: None).
+
+        if amount < 1:
+            raise ValueError("Hands must be dealt at least one card.")
+
+        return Hand(custom_cards=self.deal(amount))
+
+    def deal_hands(self, player_count, amount):
         """
+        Yields player_count-many successive hands of amount-many cards (one after another, rather than a card to each
+        player in turn - which, from a shuffled deck, is no different).
 
-        if suit:
-            return self.suits_histogram[suit] > cards_count
+        :rtype: collections.abc.Iterator[Hand]
+        """
 
-        return any(c >= cards_count for c in self.suits_histogram.values())
+        if player_count * amount > len(self):
+            raise IndexError(f"Can't deal {player_count} hands of {amount} from a shoe with {len(self)} left.")
 
-    def has_straight(self, cards_count=5):
+        for _ in range(player_count):
+            yield self.deal_hand(amount)
 
-        sorted_rank_values = sorted(self.rank_values_histogram.keys())
+    def reset(self):
+        """
+        Puts every dealt card back (e.g. after the deck has been shuffled again).
+        """
 
-        for i in range(0, len(sorted_rank_values) - cards_count + 1):
-            if all(
-                    sorted_rank_values[i + increment] ==
-                    sorted_rank_values[i + increment + 1] - 1
-                    for increment in range(0, cards_count - 1)
-            ):
-                return True
+        self.position = 0
 
-        return False
 
-    def has_straight_flush(self):
-        pass
+class PermutationDeck:
+    def __init__(self, cards):
+        """
+        A deck kept as a fixed table of cards and an array of indexes into it, in deck order. Shuffling, sampling,
+        truncating and filtering the deck only move indexes around, and samples are DeckViews which share the table,
+        so no cards (or lists of them) are copied until something reads a view's cards.
 
-    def has_four_of_a_kind(self):
-        return self.has_m_many_n_of_a_kind(1, 4)
+        :type cards: list[Card]
+        """
 
-    def has_three_of_a_kind(self):
-        return self.has_m_many_n_of_a_kind(1, 3)
+        self.table = tuple(cards)
+        self.order = array("I", range(len(self.table)))
 
-    def has_pair(self):
-        return self.has_m_many_n_of_a_kind(1, 2)
+        # CardFilter masks over the table, by filter
+        self._masks = dict()
 
-    def has_two_pairs(self):
-        return self.has_m_many_n_of_a_kind(2, 2)
+    def __len__(self):
+        return len(self.order)
 
-    def has_m_many_n_of_a_kind(self, matching_sets_count, cards_count):
+    @property
+    def cards(self):
         """
-        Returns whether or not the hand contains m-or-more n-of-a-kinds, where n is the number of cards necessary to
-        comprise a set (i.e. the 'pair' in two-pair) - and m is the total amount of matching sets (e.g. the
-        'two' in two-pair).
+        The deck's cards, in order (as a new list).
+
+        :rtype: list[Card]
         """
 
-        rank_counts = list(filter(lambda s: s >= cards_count, self.rank_values_histogram.values()))
+        table = self.table
 
-        return len(rank_counts) >= matching_sets_count
+        return [table[i] for i in self.order]
 
-    def has_cards(self):
-        return len(self.cards) > 0
+    def shuffle(self, seed=None):
+        """
+        :param seed: Shuffles reproducibly, using a random number generator seeded with this (optional).
+        """
 
+        if seed is None:
+            shuffle(self.order)
+        else:
+            Random(seed).shuffle(self.order)
 
-class Card:
-    def __init__(self, rank, rank_value, suit, color, point_value=None):
+    def truncate(self, count):
+        """
+        Keeps only the first count cards.
         """
-        A playing card.
 
-        :param rank: A card's rank (e.g. "Ace").
-        :type rank: str
-        :param rank_value: A rank's value (e.g. 14).
-        :type rank_value: int
-        :param suit: A card's suit.
-        :type suit: str
-        :param color: A card's color.
-        :type color: str
-        :param point_value: A card's point value - if that matters.
-        :type point_value: int
+        del self.order[count:]
+
+    def remove_cards(self, lambda_statement=None, index=None):
+        """
+        Filters the deck as Hand.remove_cards does: by the lambda statement, then down to the first index cards. A
+        CardFilter is only evaluated once per card in the table, however many times the deck is filtered with it.
         """
 
-        self.rank = rank
-        self.rank_value = rank_value
-        self.suit = suit
-        self.color = color
+        if isinstance(lambda_statement, CardFilter):
+            self.order = CardFilter.take(self.order, self._mask(lambda_statement))
 
-    def assign_custom_rank_value(self, custom_ranks_to_rank_values_dict):
+        elif lambda_statement:
+            table = self.table
+            self.order = array("I", [i for i in self.order if lambda_statement(table[i])])
+
+        if index:
+            self.truncate(index)
+
+    def filter_permutations(self, permutations, card_filter):
         """
-        :type custom_ranks_to_rank_values_dict: A dictionary mapping card ranks to point values.
+        Filters a batch of orders of the deck's table (e.g. from permutations) with a CardFilter.
+
+        :type permutations: list[array]
+        :type card_filter: CardFilter
+        :rtype: list[array]
         """
 
-        self.rank_value = custom_ranks_to_rank_values_dict[self.rank]
+        mask = self._mask(card_filter)
+
+        return [CardFilter.take(order, mask) for order in permutations]
+
+    def _mask(self, card_filter):
+        if card_filter not in self._masks:
+            self._masks[card_filter] = card_filter.mask(self.table)
+
+        return self._masks[card_filter]
+
+    def get_sample_hand(self, count):
+        """
+        Returns a view of the top count cards.
+
+        :rtype: DeckView
+        """
+
+        return DeckView(self.table, self.order[0:count])
+
+    def sample(self, count, seed=None):
+        """
+        Returns a view of count cards drawn at random from the deck, leaving the deck's order as it is.
+
+        :rtype: DeckView
+        """
+
+        rng = Random(seed)
+
+        return DeckView(self.table, array("I", rng.sample(self.order, count)))
+
+    def permutations(self, count, seed=None):
+        """
+        Returns count independently shuffled copies of the deck's order, e.g. to deal a batch of games from.
+
+        :rtype: list[array]
+        """
+
+        rng = Random(seed)
+        permutations = []
+
+        for _ in range(count):
+            order = array("I", self.order)
+            rng.shuffle(order)
+            permutations.append(order)
+
+        return permutations
+
+
+class DeckView:
+    __slots__ = ("table", "indexes", "_evaluator")
+
+    def __init__(self, table, indexes):
+        """
+        Some of a PermutationDeck's cards, as indexes into its card table. The evaluator is only built when first
+        read.
+
+        :type table: tuple[Card]
+        :type indexes: array
+        """
+
+        self.table = table
+        self.indexes = indexes
+        self._evaluator = None
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __str__(self):
+        return " ".join([f"{c.rank}{c.suit}" for c in self.cards])
+
+    @property
+    def cards(self):
+        """
+        :rtype: list[Card]
+        """
+
+        table = self.table
+
+        return [table[i] for i in self.indexes]
+
+    @property
+    def evaluator(self):
+        """
+        :rtype: HandEvaluatorMixin
+        """
+
+        if self._evaluator is None:
+            self._evaluator = HandEvaluatorMixin(self.cards)
+
+        return self._evaluator
+
+
+class EvaluationCache:
+    def __init__(self, maxsize=100000):
+        """
+        A bounded cache of HandEvaluatorMixin query results, which evicts the least recently used entries first.
+        Entries are keyed by the query, its arguments, and the hand's canonical key (see
+        HandEvaluatorMixin.canonical_key) - so hands which only differ by which suit is which share their entries.
+
+        One cache can be shared by any number of hands; DeckSchema.evaluation_cache gives each schema a shared one.
+
+        :param maxsize: The most entries to keep.
+        :type maxsize: int
+        """
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute):
+        """
+        Returns the entry for key, calling compute to make it if there isn't one.
+        """
+
+        entries = self._entries
+
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+
+            return entries[key]
+
+        self.misses += 1
+
+        value = entries[key] = compute()
+
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class ArtifactCache:
+    # identifies artifact files, and the version of their layout (bump it whenever the layout changes)
+    MAGIC = b"HEVA"
+    VERSION = 1
+
+    _header = struct.Struct("<4sHH")
+    _descriptor = struct.Struct("<16sc7xQ")
+
+    def __init__(self, directory):
+        """
+        A directory of precomputed artifacts (lookup tables, exact results...), each a named set of arrays, which are
+        built once, written to disk, and from then on opened with mmap - so every process which opens an artifact
+        shares one physical copy of it, and none of them has to build it again.
+
+        Each artifact is a file holding a header (see MAGIC and VERSION), a descriptor per array (its name, array
+        typecode and length), and then the arrays' bytes in native byte order, each aligned to 8 bytes. Files with
+        another magic or version are rebuilt.
+
+        Artifacts are keyed by a fingerprint of what they were built from (see key).
+
+        :param directory: Where to keep the artifacts (created if it doesn't exist).
+        :type directory: str
+        """
+
+        self.directory = directory
+
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(name, cards=(), *parameters):
+        """
+        Returns the key of an artifact: a sha256 hash of its name, the cards it was built from (as a multiset of
+        their attributes, so it covers the deck's suits, ranks, rank values and duplication), and any other
+        parameters (which must have stable reprs).
+
+        :type name: str
+        :type cards: collections.abc.Iterable[Card | CardView]
+        :rtype: str
+        """
+
+        card_counts = Counter((c.rank, c.rank_value, c.suit, c.color, c.point_value) for c in cards)
+
+        fingerprint = repr((name, sys.byteorder, sorted(card_counts.items(), key=repr), parameters))
+
+        return f"{name}-{hashlib.sha256(fingerprint.encode()).hexdigest()}"
+
+    def get(self, key, build):
+        """
+        Returns an artifact's arrays (as memoryviews over the mapped file - see MappedArrays), calling build to make
+        them - as a dict of arrays, by name - and writing them to disk first if the artifact isn't there yet.
+
+        :type key: str
+        :type build: callable
+        :rtype: MappedArrays
+        """
+
+        arrays = self.load(key)
+
+        if arrays is None:
+            self.store(key, build())
+            arrays = self.load(key)
+
+        return arrays
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def load(self, key):
+        """
+        Returns an artifact's arrays, or None if it isn't there (or is from another version).
+
+        :rtype: MappedArrays | None
+        """
+
+        try:
+            with open(self.path(key), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        arrays = MappedArrays(mapped)
+        view = arrays.view
+
+        try:
+            magic, version, array_count = self._header.unpack_from(view)
+
+            if magic != self.MAGIC or version != self.VERSION:
+                arrays.close()
+                return None
+
+            offset = self._header.size + array_count * self._descriptor.size
+
+            for i in range(array_count):
+                name, typecode, length = self._descriptor.unpack_from(
+                    view, self._header.size + i * self._descriptor.size
+                )
+
+                typecode = typecode.decode()
+                size = length * array(typecode).itemsize
+
+                if offset + size > len(view):
+                    arrays.close()
+                    return None
+
+                arrays[name.rstrip(b"\0").decode()] = view[offset:offset + size].cast(typecode)
+                offset += -size % 8 + size
+
+        except struct.error:
+            arrays.close()
+            return None
+
+        return arrays
+
+    def store(self, key, arrays):
+        """
+        Writes an artifact's arrays (replacing the file atomically, so that readers never see half an artifact).
+
+        :param arrays: Arrays by name (of up to 16 bytes).
+        :type key: str
+        :type arrays: dict[str, array]
+        """
+
+        for name in arrays:
+            if len(name.encode()) > 16:
+                raise ValueError(f"Artifact array names can be at most 16 bytes long, not {name!r}.")
+
+        temporary_path = f"{self.path(key)}.{os.getpid()}.tmp"
+
+        with open(temporary_path, "wb") as f:
+            f.write(self._header.pack(self.MAGIC, self.VERSION, len(arrays)))
+
+            for name, values in arrays.items():
+                f.write(self._descriptor.pack(name.encode(), values.typecode.encode(), len(values)))
+
+            for values in arrays.values():
+                data = values.tobytes()
+
+                f.write(data)
+                f.write(bytes(-len(data) % 8))
+
+        os.replace(temporary_path, self.path(key))
+
+
+class MappedArrays(dict):
+    def __init__(self, mapped):
+        """
+        An artifact's arrays, by name: memoryviews over its mapped file, which stay valid until close is called (or
+        the end of a with block over them).
+
+        :type mapped: mmap.mmap
+        """
+
+        super().__init__()
+
+        self.mapped = mapped
+        self.view = memoryview(mapped)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases the arrays and unmaps the file.
+        """
+
+        for values in self.values():
+            values.release()
+
+        self.clear()
+        self.view.release()
+        self.mapped.close()
+
+
+def _cached_query(method):
+    """
+    Routes an evaluator query through the evaluator's EvaluationCache, if it has one.
+    """
+
+    @wraps(method)
+    def query(self, *args):
+        if self.evaluation_cache is None:
+            return method(self, *args)
+
+        return self.evaluation_cache.get((self.canonical_key(), method.__name__, args), lambda: method(self, *args))
+
+    return query
+
+
+class HandEvaluatorMixin:
+    def __init__(self, cards, evaluation_cache=None):
+        """
+        Evaluates a hand of cards. Suit, rank, color and rank value counts are kept as counters, each of which is only
+        built the first time something reads it, and is then updated by deltas as cards are added or removed (see
+        add_cards and remove_cards). The sets and histograms exposed below are views over those counters.
+
+        If a card's rank value is reassigned after it was counted (see Card.assign_custom_rank_value), the counters
+        are rebuilt from self.cards the next time they are read.
+
+        :type cards: list[Card]
+        :param evaluation_cache: Caches the results of the has_* queries (optional).
+        :type evaluation_cache: EvaluationCache
+        """
+
+        self.cards = cards if cards else []
+        self.evaluation_cache = evaluation_cache
+
+        # counters by the card attribute they count
+        self._counters = dict()
+        self._revision = Card._revision
+
+        # bitmasks of rank values (see _rank_values_bitmask), and the rank value their bit 0 stands for, are built when
+        # first needed and then kept up to date as cards are added; the canonical key is rebuilt after each change
+        self._rank_values_base = None
+        self._rank_values_mask = None
+        self._suit_rank_values_masks = None
+        self._canonical_key = None
+
+    def _sync(self):
+        if self._revision != Card._revision:
+            self._forget()
+            self._revision = Card._revision
+
+    def _forget(self):
+        self._counters.clear()
+        self._changed()
+
+    def _changed(self):
+        self._rank_values_base = None
+        self._rank_values_mask = None
+        self._suit_rank_values_masks = None
+        self._canonical_key = None
+
+    def _counter(self, attribute):
+        self._sync()
+
+        counter = self._counters.get(attribute)
+
+        if counter is None:
+            # Counter counts an iterable in C, which is much quicker than incrementing keys one by one
+            counter = self._counters[attribute] = Counter(map(attrgetter(attribute), self._counted(self.cards)))
+
+        return counter
+
+    def _counted(self, cards):
+        """
+        Returns which of some cards the histograms count (all of them - but see WildcardEvaluator).
+        """
+
+        return cards
+
+    def add_cards(self, cards):
+        """
+        Counts cards which have been appended to self.cards.
+
+        :type cards: list[Card]
+        """
+
+        if self._revision != Card._revision:
+            self._sync()
+            return
+
+        self._canonical_key = None
+
+        cards = self._counted(cards)
+
+        if self._rank_values_base is not None:
+            self._add_to_bitmasks(cards)
+
+        for attribute, counter in self._counters.items():
+            counter.update(map(attrgetter(attribute), cards))
+
+    def _add_to_bitmasks(self, cards):
+        """
+        Sets the bits of newly added cards in any bitmasks which have already been built. A card ranked below the
+        masks' lowest rank value shifts them up, so they stay on a common scale.
+        """
+
+        for c in cards:
+            if c.rank_value < self._rank_values_base:
+                shift = self._rank_values_base - c.rank_value
+                self._rank_values_base = c.rank_value
+
+                if self._rank_values_mask is not None:
+                    self._rank_values_mask <<= shift
+
+                if self._suit_rank_values_masks is not None:
+                    for suit in self._suit_rank_values_masks:
+                        self._suit_rank_values_masks[suit] <<= shift
+
+            bit = 1 << (c.rank_value - self._rank_values_base)
+
+            if self._rank_values_mask is not None:
+                self._rank_values_mask |= bit
+
+            if self._suit_rank_values_masks is not None:
+                self._suit_rank_values_masks[c.suit] = self._suit_rank_values_masks.get(c.suit, 0) | bit
+
+    def remove_cards(self, cards):
+        """
+        Uncounts cards which have been removed from self.cards.
+
+        :type cards: list[Card]
+        """
+
+        if self._revision != Card._revision:
+            self._sync()
+            return
+
+        self._changed()
+
+        cards = self._counted(cards)
+
+        for attribute, counter in self._counters.items():
+            for key in map(attrgetter(attribute), cards):
+                # drop keys which reach zero, so that the histograms only describe cards which are in the hand
+                if counter[key] > 1:
+                    counter[key] -= 1
+                else:
+                    counter.pop(key, None)
+
+    def clear(self):
+        """
+        Uncounts every card, for when self.cards has been emptied.
+        """
+
+        self._forget()
+
+    @property
+    def all_card_suits(self):
+        return set(self._counter("suit"))
+
+    @property
+    def all_card_ranks(self):
+        return set(self._counter("rank"))
+
+    @property
+    def all_card_colors(self):
+        return set(self._counter("color"))
+
+    @property
+    def all_card_rank_values(self):
+        return set(self._counter("rank_value"))
+
+    @property
+    def suits_histogram(self):
+        return self._counter("suit")
+
+    @property
+    def rank_values_histogram(self):
+        return self._counter("rank_value")
+
+    def has_flush(self, cards_count=5, suit=None):
+        """
+        :param cards_count: The amount of cards required to constitute a flush.
+        :param suit: The suit that a flush is required to constitute (optional; default: None).
+        """
+
+        if suit:
+            return self.suits_histogram[suit] > cards_count
+
+        return self._has_flush_in_any_suit(cards_count)
+
+    @_cached_query
+    def _has_flush_in_any_suit(self, cards_count):
+        return any(c >= cards_count for c in self.suits_histogram.values())
+
+    def with_cards(self, cards):
+        """
+        Returns an evaluator of the same kind (and settings, and evaluation cache) for other cards.
+
+        :type cards: list[Card]
+        :rtype: HandEvaluatorMixin
+        """
+
+        return HandEvaluatorMixin(cards, self.evaluation_cache)
+
+    def canonical_key(self):
+        """
+        Returns a hashable encoding of the hand which ignores which suit is which: the sorted rank values within each
+        suit, with the suits in sorted order. Hands which only differ by a relabelling of their suits (and colors)
+        share a key, and every has_* query gives the same answer for them (bar has_flush for a particular suit).
+        """
+
+        self._sync()
+
+        if self._canonical_key is None:
+            suit_rank_values = dict()
+
+            for c in self._counted(self.cards):
+                suit_rank_values.setdefault(c.suit, []).append(c.rank_value)
+
+            self._canonical_key = tuple(sorted(tuple(sorted(rank_values)) for rank_values in suit_rank_values.values()))
+
+        return self._canonical_key
+
+    def _rank_values_bitmask(self):
+        """
+        Returns the hand's rank values as a bitmask, in which bit i is set if the hand has a card whose rank value is
+        a base rank value (no higher than the hand's lowest) plus i. Rank values don't need to be contiguous (or start
+        at 2) - gaps just leave bits unset.
+        """
+
+        rank_values = self.rank_values_histogram
+
+        if self._rank_values_mask is None:
+            base = self._bitmask_base()
+
+            self._rank_values_mask = 0
+
+            for rank_value in rank_values:
+                self._rank_values_mask |= 1 << (rank_value - base)
+
+        return self._rank_values_mask
+
+    def _suit_rank_values_bitmasks(self):
+        """
+        Returns a bitmask of each suit's rank values, on the same scale as _rank_values_bitmask.
+        """
+
+        rank_values = self.rank_values_histogram
+
+        if self._suit_rank_values_masks is None:
+            base = self._bitmask_base()
+
+            self._suit_rank_values_masks = dict()
+
+            for c in self._counted(self.cards):
+                self._suit_rank_values_masks[c.suit] = (
+                    self._suit_rank_values_masks.get(c.suit, 0) | 1 << (c.rank_value - base)
+                )
+
+        return self._suit_rank_values_masks
+
+    def _bitmask_base(self):
+        if self._rank_values_base is None:
+            self._rank_values_base = min(self.rank_values_histogram, default=0)
+
+        return self._rank_values_base
+
+    @_cached_query
+    def longest_straight(self):
+        """
+        Returns the length of the longest run of consecutive rank values in the hand.
+        """
+
+        return _longest_run(self._rank_values_bitmask())
+
+    @_cached_query
+    def longest_straight_flush(self):
+        """
+        Returns the length of the longest run of consecutive rank values within a single suit.
+        """
+
+        return max((_longest_run(mask) for mask in self._suit_rank_values_bitmasks().values()), default=0)
+
+    def has_straight(self, cards_count=5):
+        return cards_count <= 0 or self.longest_straight() >= cards_count
+
+    def has_straight_flush(self, cards_count=5):
+        return cards_count <= 0 or self.longest_straight_flush() >= cards_count
+
+    def has_four_of_a_kind(self):
+        return self.has_m_many_n_of_a_kind(1, 4)
+
+    def has_three_of_a_kind(self):
+        return self.has_m_many_n_of_a_kind(1, 3)
+
+    def has_pair(self):
+        return self.has_m_many_n_of_a_kind(1, 2)
+
+    def has_two_pairs(self):
+        return self.has_m_many_n_of_a_kind(2, 2)
+
+    @_cached_query
+    def has_m_many_n_of_a_kind(self, matching_sets_count, cards_count):
+        """
+        Returns whether or not the hand contains m-or-more n-of-a-kinds, where n is the number of cards necessary to
+        comprise a set (i.e. the 'pair' in two-pair) - and m is the total amount of matching sets (e.g. the
+        'two' in two-pair).
+        """
+
+        rank_counts = list(filter(lambda s: s >= cards_count, self.rank_values_histogram.values()))
+
+        return len(rank_counts) >= matching_sets_count
+
+    def has_cards(self):
+        return len(self.cards) > 0
+
+    def get_total_rank_values(self):
+        return sum(rank_value * count for rank_value, count in self.rank_values_histogram.items())
+
+
+class WildcardEvaluator(HandEvaluatorMixin):
+    def __init__(self, cards, evaluation_cache=None, wild=None, rank_values=None, suits=None):
+        """
+        Evaluates a hand in which some cards are wild (jokers, by default): each may stand in for any card of the deck
+        which the hand doesn't already hold. Wild cards are left out of the histograms (and the rank value total), and
+        counted separately; the has_* queries then answer whether the hand could satisfy them with its wild cards
+        substituted as well as possible, straight from the histograms and that count - without trying substitutions.
+
+        As with HandRanker.rank_wild, wild cards stand in for cards of a single deck: they can't make a rank value the
+        deck doesn't have (so they only fill gaps in straights where the deck has the rank value), nor more of a kind
+        than the deck has suits (so never a five-of-a-kind in the default deck), nor more of a suit than the deck has
+        rank values.
+
+        :type cards: list[Card]
+        :param evaluation_cache: As for HandEvaluatorMixin.
+        :type evaluation_cache: EvaluationCache
+        :param wild: Which cards are wild (optional; by default, those of JOKER_RANK).
+        :type wild: callable
+        :param rank_values: The deck's rank values (optional; by default, those of the default deck).
+        :type rank_values: collections.abc.Iterable[int]
+        :param suits: The deck's suits (optional; by default, those of the default deck).
+        :type suits: collections.abc.Iterable[str]
+        """
+
+        self.wild = wild or _is_joker
+        self.rank_values = tuple(sorted(set(rank_values if rank_values is not None else DEFAULT_CARD_RANKS.values())))
+        self.suits = tuple(suits if suits is not None else DEFAULT_CARD_SUITS)
+
+        super().__init__(cards, evaluation_cache)
+
+    def with_cards(self, cards):
+        return WildcardEvaluator(cards, self.evaluation_cache, self.wild, self.rank_values, self.suits)
+
+    def _counted(self, cards):
+        wild = self.wild
+
+        return [c for c in cards if not wild(c)]
+
+    @property
+    def wildcards_count(self):
+        return len(self.cards) - sum(self.suits_histogram.values())
+
+    def canonical_key(self):
+        return super().canonical_key(), self.wildcards_count, self.rank_values, len(self.suits)
+
+    def _completed(self, count, limit):
+        """
+        Returns how many cards a set (or suit) of count cards could have with the wild cards' help, when the deck has
+        at most limit of them.
+        """
+
+        return max(count, min(count + self.wildcards_count, limit))
+
+    def has_flush(self, cards_count=5, suit=None):
+        if suit:
+            return self._completed(self.suits_histogram[suit], len(self.rank_values)) > cards_count
+
+        return self._has_flush_in_any_suit(cards_count)
+
+    @_cached_query
+    def _has_flush_in_any_suit(self, cards_count):
+        if not self.cards:
+            return False
+
+        largest_suit = max(self.suits_histogram.values(), default=0)
+
+        return self._completed(largest_suit, len(self.rank_values)) >= cards_count
+
+    @_cached_query
+    def has_m_many_n_of_a_kind(self, matching_sets_count, cards_count):
+        """
+        As HandEvaluatorMixin.has_m_many_n_of_a_kind, where wild cards first complete the largest sets (which need the
+        fewest of them), and then make sets of their own of rank values the hand doesn't have - of at most as many
+        cards as the deck has suits.
+        """
+
+        if matching_sets_count <= 0:
+            return True
+
+        cards_count = max(cards_count, 1)
+
+        rank_value_counts = self.rank_values_histogram
+        largest_sets = sorted(rank_value_counts.values(), reverse=True)[:matching_sets_count]
+
+        wild_sets_count = matching_sets_count - len(largest_sets)
+
+        if wild_sets_count > len(set(self.rank_values) - set(rank_value_counts)):
+            return False
+
+        if cards_count > len(self.suits) and (wild_sets_count or min(largest_sets, default=0) < cards_count):
+            return False
+
+        missing = sum(cards_count - c for c in largest_sets if c < cards_count) + wild_sets_count * cards_count
+
+        return missing <= self.wildcards_count
+
+    @_cached_query
+    def longest_straight(self):
+        """
+        Returns the length of the longest run of consecutive rank values which the hand could make, with its wild
+        cards filling gaps (or extending the run).
+        """
+
+        rank_values = self.rank_values_histogram
+
+        return _longest_filled_run(sorted(set(self.rank_values) | set(rank_values)), rank_values, self.wildcards_count)
+
+    @_cached_query
+    def longest_straight_flush(self):
+        """
+        Returns the length of the longest run of consecutive rank values within a single suit which the hand could
+        make, with its wild cards filling gaps (or making up the run alone).
+        """
+
+        suit_rank_values = dict()
+
+        for c in self._counted(self.cards):
+            suit_rank_values.setdefault(c.suit, set()).add(c.rank_value)
+
+        wildcards_count = self.wildcards_count
+        all_rank_values = sorted(set(self.rank_values).union(*suit_rank_values.values()))
+
+        return max(
+            _longest_filled_run(all_rank_values, rank_values, wildcards_count)
+            for rank_values in [set()] + list(suit_rank_values.values())
+        )
+
+
+def _is_joker(card):
+    return card.rank == JOKER_RANK
+
+
+class Simulator:
+    def __init__(self, deck, draw_count, predicates, card_filter=None, evaluation_cache=None,
+                 evaluator_class=HandEvaluatorMixin):
+        """
+        Estimates how often hands drawn from a deck satisfy some predicates. The deck is only built (and filtered)
+        once: each sample partially shuffles an array of indexes into the deck, in place, and evaluates the cards
+        under the first draw_count indexes.
+
+        :param deck: The deck to draw from (e.g. a Deck which has had its cards doubled).
+        :type deck: Hand
+        :param draw_count: The amount of cards in each sample.
+        :type draw_count: int
+        :param predicates: Named functions of a sample's HandEvaluatorMixin (e.g. lambda e: e.has_four_of_a_kind()).
+        :type predicates: dict[str, callable]
+        :param card_filter: Which of the deck's cards to keep, as with Hand.remove_cards (optional).
+        :type card_filter: callable
+        :param evaluation_cache: Caches the samples' query results (optional). Each worker process gets its own copy.
+        :type evaluation_cache: EvaluationCache
+        :param evaluator_class: Evaluates the samples, given their cards and the evaluation cache (e.g. a
+            WildcardEvaluator, for decks with jokers).
+        :type evaluator_class: type
+        """
+
+        self.cards = [c for c in deck.cards if card_filter(c)] if card_filter else list(deck.cards)
+        self.draw_count = draw_count
+        self.predicates = dict(predicates)
+        self.evaluation_cache = evaluation_cache
+        self.evaluator_class = evaluator_class
+
+        if draw_count > len(self.cards):
+            raise ValueError(f"Can't draw {draw_count} cards from a deck of {len(self.cards)}.")
+
+    def samples(self, iterations, seed=None):
+        """
+        Yields iterations-many lists of draw_count cards, each drawn uniformly at random from the deck.
+
+        :param seed: Seeds the random number generator, for reproducible samples (optional).
+        """
+
+        cards = self.cards
+
+        for drawn in self._sample_indexes(iterations, seed):
+            yield [cards[k] for k in drawn]
+
+    def _sample_indexes(self, iterations, seed):
+        """
+        Yields the indexes (into self.cards) of each of samples' cards.
+        """
+
+        rng = Random(seed)
+        random = rng.random
+
+        deck_size = len(self.cards)
+        draw_count = self.draw_count
+        indexes = array("I", range(deck_size))
+
+        for _ in range(iterations):
+            # a partial Fisher-Yates shuffle: only the positions which are drawn need to be randomized
+            for i in range(draw_count):
+                j = i + int(random() * (deck_size - i))
+                indexes[i], indexes[j] = indexes[j], indexes[i]
+
+            yield indexes[0:draw_count]
+
+    def run(self, iterations, seed=None, workers=1, executor=None):
+        """
+        Draws iterations-many samples, counting how many satisfy each predicate.
+
+        The samples are split into one chunk per worker, and each chunk is drawn with its own seed derived from seed,
+        so results are identical for a given seed and worker count. With more than one worker the chunks run in a
+        ProcessPoolExecutor (so predicates must be picklable - e.g. module-level functions, or
+        operator.methodcaller("has_pair")), unless another executor is given.
+
+        :param seed: The master seed (optional).
+        :param workers: The amount of chunks to split the samples into.
+        :param executor: A concurrent.futures.Executor to run the chunks in (optional).
+        :rtype: SimulationResult
+        """
+
+        results = _run_in_chunks(self._run, iterations, seed, workers, executor)
+
+        return SimulationResult.merge(results)
+
+    def run_until(self, half_width=None, relative_error=None, confidence=0.95, method="wilson", batch_size=10000,
+                  max_iterations=10000000, seed=None, workers=1, executor=None):
+        """
+        Draws samples in batches until every predicate's probability is known precisely enough: until its confidence
+        interval (see SimulationResult.confidence_interval) is at most half_width either side of the estimate, or at
+        most relative_error times the estimate either side of it - or until max_iterations samples have been drawn.
+
+        Common events stop after a batch or two; rare ones get as many batches as they need. Each batch is run as in
+        run, with a seed derived from seed, so results are identical for a given seed, batch size and worker count.
+
+        :param half_width: The widest acceptable distance from the estimate to either end of its interval.
+        :type half_width: float
+        :param relative_error: The widest acceptable distance from the estimate to either end of its interval, as a
+            fraction of the estimate. A predicate which is never satisfied never meets this.
+        :type relative_error: float
+        :param confidence: The confidence level of the intervals.
+        :param method: "wilson" or "clopper-pearson".
+        :param batch_size: How many samples to draw between checks.
+        :param max_iterations: The most samples to draw.
+        :rtype: SimulationResult
+        """
+
+        if half_width is None and relative_error is None:
+            raise ValueError("A target half_width or relative_error is required.")
+
+        if max_iterations < 1 or batch_size < 1:
+            raise ValueError("At least one sample, in batches of at least one, is required.")
+
+        if workers > 1 and executor is None:
+            # one pool for every batch, rather than one per batch
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return self.run_until(
+                    half_width, relative_error, confidence, method, batch_size, max_iterations, seed, workers, pool
+                )
+
+        master = Random(seed)
+        result = None
+        iterations = 0
+
+        while iterations < max_iterations:
+            batch_iterations = min(batch_size, max_iterations - iterations)
+
+            batch = self.run(batch_iterations, master.getrandbits(64), workers, executor)
+            iterations += batch_iterations
+
+            # a running total, so that each check costs the same however many batches came before it
+            result = batch if result is None else SimulationResult.merge([result, batch])
+
+            if all(
+                self._is_precise(result, name, half_width, relative_error, confidence, method) for name in result.hits
+            ):
+                break
+
+        return result
+
+    @staticmethod
+    def _is_precise(result, name, half_width, relative_error, confidence, method):
+        p = result.probability(name)
+        lower, upper = result.confidence_interval(name, confidence, method)
+
+        distance = max(p - lower, upper - p)
+
+        if half_width is not None and distance > half_width:
+            return False
+
+        if relative_error is not None and (p == 0 or distance > relative_error * p):
+            return False
+
+        return True
+
+    def run_antithetic(self, iterations, seed=None):
+        """
+        Estimates each predicate's probability from antithetic pairs of hands: each shuffle is dealt from both ends,
+        pairing its first draw_count cards with its last draw_count cards. Both hands of a pair are uniform draws, so
+        the estimate is unbiased; because they can't share cards, their results are negatively correlated when the
+        deck is small next to the hands (with larger decks, pairs do about as well as independent hands).
+
+        :param iterations: The amount of hands to evaluate (in iterations // 2 pairs).
+        :rtype: dict[str, Estimate]
+        """
+
+        deck_size = len(self.cards)
+        draw_count = self.draw_count
+
+        if 2 * draw_count > deck_size:
+            raise ValueError(f"Can't deal two hands of {draw_count} from a deck of {deck_size}.")
+
+        rng = Random(seed)
+        random = rng.random
+
+        cards = self.cards
+        indexes = array("I", range(deck_size))
+        pairs = iterations // 2
+
+        predicates = list(self.predicates.items())
+        pair_means = {name: [] for name in self.predicates}
+
+        for _ in range(pairs):
+            # a partial Fisher-Yates shuffle of the front of the deck, then of the back of what's left
+            for i in range(draw_count):
+                j = i + int(random() * (deck_size - i))
+                indexes[i], indexes[j] = indexes[j], indexes[i]
+
+            for i in range(deck_size - 1, deck_size - 1 - draw_count, -1):
+                j = draw_count + int(random() * (i - draw_count + 1))
+                indexes[i], indexes[j] = indexes[j], indexes[i]
+
+            first = self.evaluator_class([cards[k] for k in indexes[0:draw_count]], self.evaluation_cache)
+            last = self.evaluator_class([cards[k] for k in indexes[deck_size - draw_count:]], self.evaluation_cache)
+
+            for name, predicate in predicates:
+                pair_means[name].append((bool(predicate(first)) + bool(predicate(last))) / 2)
+
+        return {name: Estimate.from_samples(means, 2 * pairs) for name, means in pair_means.items()}
+
+    def run_stratified(self, iterations, seed=None):
+        """
+        Estimates each predicate's probability by stratified sampling over rank multiplicity classes: hands are
+        grouped by how many rank values they hold once, twice, three times... (e.g. a full house and a hand with two
+        three-of-a-kinds are in different classes). Each class's probability is counted exactly (see
+        _MultiplicityStrata), each class gets its share of iterations (and at least two hands), and the estimate is
+        the probability-weighted sum of the classes' sample means.
+
+        Predicates which only depend on a hand's class (like has_four_of_a_kind) are estimated exactly; predicates
+        which mostly do (like has_two_pairs) gain the most.
+
+        :param iterations: About how many hands to evaluate.
+        :rtype: dict[str, Estimate]
+        """
+
+        rng = Random(seed)
+
+        rank_values = sorted({c.rank_value for c in self.cards})
+        groups = [[c for c in self.cards if c.rank_value == rank_value] for rank_value in rank_values]
+
+        strata = _MultiplicityStrata([len(g) for g in groups], self.draw_count)
+
+        predicates = list(self.predicates.items())
+        value = dict.fromkeys(self.predicates, 0.0)
+        variance = dict.fromkeys(self.predicates, 0.0)
+        hands = 0
+
+        for shape, weight in strata.weights():
+            stratum_iterations = max(2, round(iterations * weight))
+            hits = dict.fromkeys(self.predicates, 0)
+
+            for _ in range(stratum_iterations):
+                cards = []
+
+                for group, count in zip(groups, strata.sample(shape, rng)):
+                    if count:
+                        cards += rng.sample(group, count)
+
+                evaluator = self.evaluator_class(cards, self.evaluation_cache)
+
+                for name, predicate in predicates:
+                    if predicate(evaluator):
+                        hits[name] += 1
+
+            for name in hits:
+                p = hits[name] / stratum_iterations
+
+                value[name] += weight * p
+                variance[name] += weight * weight * p * (1 - p) / (stratum_iterations - 1)
+
+            hands += stratum_iterations
+
+        return {name: Estimate(value[name], variance[name] ** 0.5, hands) for name in self.predicates}
+
+    def run_importance(self, iterations, tilt, seed=None):
+        """
+        Estimates each predicate's probability by importance sampling: hands are drawn card by card from a proposal
+        which tilts towards (or, with a tilt below 1, away from) rank values already in the hand - each card is
+        tilt ** (the amount of cards of its rank value drawn so far) times as likely to be drawn as it would be
+        uniformly. Each hand is weighted by the likelihood ratio of drawing it uniformly rather than from the
+        proposal, which keeps the estimate unbiased.
+
+        Tilts above 1 make sets (n-of-a-kinds, full houses...) common; tilts below 1 make hands of distinct rank
+        values (and so straights) common.
+
+        :param iterations: The amount of hands to evaluate.
+        :type tilt: float
+        :rtype: dict[str, Estimate]
+        """
+
+        rng = Random(seed)
+        random = rng.random
+
+        rank_values = sorted({c.rank_value for c in self.cards})
+        groups = [[c for c in self.cards if c.rank_value == rank_value] for rank_value in rank_values]
+        group_indexes = range(len(groups))
+
+        deck_size = len(self.cards)
+        draw_count = self.draw_count
+        powers = [tilt ** d for d in range(max(map(len, groups)) + 1)]
+
+        predicates = list(self.predicates.items())
+        weighted_hits = {name: [] for name in self.predicates}
+
+        for _ in range(iterations):
+            remaining = [len(g) for g in groups]
+            drawn = [0] * len(groups)
+            likelihood_ratio = 1.0
+            cards = []
+
+            for i in range(draw_count):
+                weights = [remaining[g] * powers[drawn[g]] for g in group_indexes]
+                total = sum(weights)
+
+                # pick a rank value by its weight, and then one of its remaining cards uniformly (swapping drawn cards
+                # to the back of their group)
+                x = random() * total
+                g = 0
+
+                while g < len(groups) - 1 and x >= weights[g]:
+                    x -= weights[g]
+                    g += 1
+
+                # (in case rounding ran x past the last group with cards left)
+                while not remaining[g]:
+                    g -= 1
+
+                group = groups[g]
+                j = int(random() * remaining[g])
+                group[j], group[remaining[g] - 1] = group[remaining[g] - 1], group[j]
+                cards.append(group[remaining[g] - 1])
+
+                likelihood_ratio *= total / ((deck_size - i) * powers[drawn[g]])
+
+                remaining[g] -= 1
+                drawn[g] += 1
+
+            evaluator = self.evaluator_class(cards, self.evaluation_cache)
+
+            for name, predicate in predicates:
+                weighted_hits[name].append(likelihood_ratio if predicate(evaluator) else 0.0)
+
+        return {name: Estimate.from_samples(samples, iterations) for name, samples in weighted_hits.items()}
+
+    def _run(self, iterations, seed):
+        predicates = list(self.predicates.items())
+        hits = dict.fromkeys(self.predicates, 0)
+
+        for cards in self.samples(iterations, seed):
+            evaluator = self.evaluator_class(cards, self.evaluation_cache)
+
+            for name, predicate in predicates:
+                if predicate(evaluator):
+                    hits[name] += 1
+
+        return SimulationResult(iterations, hits)
+
+    def run_batches(self, iterations, sink, batch_size=10000, seed=None, record_hands=False, workers=1, executor=None):
+        """
+        Draws iterations-many samples as run does, in batches of batch_size, and writes each batch's counts (and, with
+        record_hands, each of its hands) to a sink as soon as the batch is done - so however long the run, only a
+        batch is held in memory at a time.
+
+        The sink checkpoints after every batch. Running again with the same sink path and arguments picks up after the
+        last batch which was written, rather than starting over: each batch is drawn with its own seed derived from
+        seed (or, if seed is None, from the seed the sink recorded), so a resumed run writes exactly what an
+        uninterrupted one would have.
+
+        :type sink: ResultSink
+        :param batch_size: How many samples to draw (and write) at a time.
+        :param record_hands: Whether to write each hand - the indexes of its cards in the (filtered) deck, and which
+            predicates it satisfied - as well as the batches' counts.
+        :param workers: The amount of chunks to split each batch into, as in run.
+        :rtype: SimulationResult
+        """
+
+        if iterations < 1 or batch_size < 1:
+            raise ValueError("At least one sample, in batches of at least one, is required.")
+
+        if record_hands:
+            # fails early, if there are too many predicates to record
+            _bits_typecode(len(self.predicates))
+
+        if workers > 1 and executor is None:
+            # one pool for every batch, as in run_until
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return self.run_batches(iterations, sink, batch_size, seed, record_hands, workers, pool)
+
+        header = {
+            "deck": ArtifactCache.key("simulation", self.cards, [(c.rank, c.rank_value, c.suit) for c in self.cards]),
+            "cards": [f"{c.rank}{c.suit}" for c in self.cards],
+            "draw_count": self.draw_count,
+            "predicates": list(self.predicates),
+            "iterations": iterations,
+            "batch_size": batch_size,
+            "record_hands": record_hands
+        }
+
+        seed, written_batch_count, total = sink.open(header, seed)
+
+        batch_count = -(-iterations // batch_size)
+        batch_seeds = _derive_seeds(seed, batch_count)
+        run_batch = partial(self._run_batch, record_hands)
+
+        try:
+            for index in range(written_batch_count, batch_count):
+                batch_iterations = min(batch_size, iterations - index * batch_size)
+                chunks = _run_in_chunks(run_batch, batch_iterations, batch_seeds[index], workers, executor)
+
+                result = SimulationResult.merge([result for result, codes, bits in chunks])
+
+                if record_hands:
+                    codes = array("H", b"".join(codes.tobytes() for result, codes, bits in chunks))
+                    bits = array(chunks[0][2].typecode, b"".join(bits.tobytes() for result, codes, bits in chunks))
+                else:
+                    codes = bits = None
+
+                sink.write_batch(index, result, codes, bits)
+                total = result if total is None else SimulationResult.merge([total, result])
+
+        finally:
+            sink.close()
+
+        return total
+
+    def _run_batch(self, record_hands, iterations, seed):
+        """
+        As _run, also returning each sample's card indexes (draw_count per sample) and predicate bits (bit i set if
+        it satisfied the ith predicate) - if record_hands.
+        """
+
+        if not record_hands:
+            return self._run(iterations, seed), None, None
+
+        cards = self.cards
+        predicates = list(self.predicates.values())
+        hits = [0] * len(predicates)
+
+        codes = array("H")
+        bits = array(_bits_typecode(len(predicates)))
+
+        for drawn in self._sample_indexes(iterations, seed):
+            evaluator = self.evaluator_class([cards[k] for k in drawn], self.evaluation_cache)
+            hand_bits = 0
+
+            for i, predicate in enumerate(predicates):
+                if predicate(evaluator):
+                    hits[i] += 1
+                    hand_bits |= 1 << i
+
+            codes.fromlist(drawn.tolist())
+            bits.append(hand_bits)
+
+        return SimulationResult(iterations, dict(zip(self.predicates, hits))), codes, bits
+
+    def tally(self, statistic, iterations, seed=None, workers=1, executor=None):
+        """
+        Draws iterations-many samples, counting how often each value of a statistic comes up (e.g.
+        lambda e: e.get_total_rank_values()). Samples are split across workers as in run.
+
+        :rtype: Counter
+        """
+
+        tallies = _run_in_chunks(partial(self._tally, statistic), iterations, seed, workers, executor)
+
+        total = Counter()
+
+        for t in tallies:
+            total.update(t)
+
+        return total
+
+    def _tally(self, statistic, iterations, seed):
+        return Counter(
+            statistic(self.evaluator_class(cards, self.evaluation_cache)) for cards in self.samples(iterations, seed)
+        )
+
+
+def _derive_seeds(seed, count):
+    """
+    Derives count independent seeds from a master seed (or from the operating system, if seed is None).
+    """
+
+    master = Random(seed)
+
+    return [master.getrandbits(64) for _ in range(count)]
+
+
+def _run_in_chunks(function, iterations, seed, workers, executor):
+    """
+    Splits iterations into one chunk per worker, and returns the results of function(chunk_iterations, chunk_seed)
+    for each chunk, in chunk order.
+    """
+
+    if workers < 1:
+        raise ValueError("At least one worker is required.")
+
+    chunk_iterations = [iterations // workers + (1 if i < iterations % workers else 0) for i in range(workers)]
+    chunk_seeds = _derive_seeds(seed, workers)
+
+    if workers == 1 and executor is None:
+        return [function(chunk_iterations[0], chunk_seeds[0])]
+
+    if _active_profiles:
+        # chunks which run in other processes are profiled there, and send their stats back
+        function = partial(_run_profiled, function)
+
+    if executor is not None:
+        results = list(executor.map(function, chunk_iterations, chunk_seeds))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(function, chunk_iterations, chunk_seeds))
+
+    if not _active_profiles:
+        return results
+
+    for result, snapshot in results:
+        if snapshot is not None:
+            for stats in _active_profiles:
+                stats.merge(snapshot)
+
+    return [result for result, snapshot in results]
+
+
+class SimulationResult:
+    def __init__(self, iterations, hits):
+        """
+        The outcome of a Simulator run.
+
+        :param iterations: The amount of samples drawn.
+        :type iterations: int
+        :param hits: The amount of samples which satisfied each predicate.
+        :type hits: dict[str, int]
+        """
+
+        self.iterations = iterations
+        self.hits = hits
+
+    @staticmethod
+    def merge(results):
+        """
+        Combines the results of simulations of the same predicates.
+
+        :type results: list[SimulationResult]
+        :rtype: SimulationResult
+        """
+
+        hits = dict.fromkeys(results[0].hits, 0)
+
+        for r in results:
+            for name in r.hits:
+                hits[name] += r.hits[name]
+
+        return SimulationResult(sum(r.iterations for r in results), hits)
+
+    def probability(self, name):
+        if not self.iterations:
+            raise ValueError("A simulation without any samples has no probabilities.")
+
+        return self.hits[name] / self.iterations
+
+    def probabilities(self):
+        return {name: self.probability(name) for name in self.hits}
+
+    def estimate(self, name):
+        """
+        Returns a predicate's probability as an Estimate (with the binomial standard error), to compare with the
+        estimates of Simulator.run_antithetic, run_stratified and run_importance.
+
+        :rtype: Estimate
+        """
+
+        p = self.probability(name)
+
+        return Estimate(p, (p * (1 - p) / self.iterations) ** 0.5, self.iterations)
+
+    def confidence_interval(self, name, confidence=0.95, method="wilson"):
+        """
+        Returns a confidence interval around a predicate's probability: the Wilson score interval, or the (exact, and
+        more conservative) Clopper-Pearson interval.
+
+        :param method: "wilson" or "clopper-pearson".
+        :rtype: tuple[float, float]
+        """
+
+        if not self.iterations:
+            raise ValueError("A simulation without any samples has no confidence intervals.")
+
+        if method == "clopper-pearson":
+            return _clopper_pearson_interval(self.hits[name], self.iterations, confidence)
+
+        if method != "wilson":
+            raise ValueError(f"Unknown confidence interval method: {method}.")
+
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        n = self.iterations
+        p = self.probability(name)
+
+        center = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half_width = z / (1 + z * z / n) * (p * (1 - p) / n + z * z / (4 * n * n)) ** 0.5
+
+        return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def _bits_typecode(count):
+    """
+    Returns the smallest unsigned array typecode with a bit for each of count predicates.
+    """
+
+    for typecode in "BHIQ":
+        if array(typecode).itemsize * 8 >= count:
+            return typecode
+
+    raise ValueError(f"Hands' results can be recorded for at most 64 predicates, not {count}.")
+
+
+class ResultSink:
+    def __init__(self, path, buffer_size=1 << 20):
+        """
+        Where Simulator.run_batches writes a simulation's results as it goes: each batch's counts, and (optionally)
+        each hand. Writes go through a buffer of buffer_size bytes, and are flushed to disk at the end of each batch,
+        after which the sink records a checkpoint (in a file next to path) of how many batches it holds, where they
+        end, and their running totals - so that an interrupted run can be resumed. The checkpoint is the same size
+        however many batches there are. Subclasses define the file format (see JSONLinesSink, CSVSink and BinarySink).
+
+        :param path: The file to write.
+        :type path: str
+        :type buffer_size: int
+        """
+
+        self.path = path
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.buffer_size = buffer_size
+
+        self._file = None
+        self._checkpoint = None
+        self._predicate_names = None
+
+    def open(self, header, seed=None):
+        """
+        Opens the sink for a simulation, returning its seed, how many batches the sink already holds, and their
+        combined result (or None, if there aren't any).
+
+        If the sink has a checkpoint of the same simulation (the same header, and seed - or any seed, if seed is
+        None), anything written after the checkpoint is dropped and the simulation resumes from it. Otherwise the
+        file is started over - unless it holds a checkpoint of another simulation, which isn't overwritten.
+
+        :param header: Describes the simulation (its deck, predicates, iterations...), as JSON-serializable values.
+        :type header: dict
+        :param seed: The simulation's seed (optional; if None, the checkpoint's, or a new one).
+        :type seed: int
+        :rtype: tuple[int, int, SimulationResult]
+        """
+
+        checkpoint = self._read_checkpoint()
+
+        if checkpoint is not None:
+            if checkpoint["header"] != header or seed not in (None, checkpoint["seed"]):
+                raise ValueError(
+                    f"{self.path} holds a different simulation; delete its checkpoint to start the file over."
+                )
+
+            try:
+                self._file = open(self.path, "r+b", buffering=self.buffer_size)
+            except FileNotFoundError:
+                raise ValueError(f"{self.path} is missing, but has a checkpoint.") from None
+
+            if self._file.seek(0, os.SEEK_END) < checkpoint["offset"]:
+                self._file.close()
+                raise ValueError(f"{self.path} is shorter than its checkpoint.")
+
+            self._file.truncate(checkpoint["offset"])
+            self._file.seek(checkpoint["offset"])
+
+        else:
+            seed = Random().getrandbits(64) if seed is None else seed
+            # hits are listed in the order of header["predicates"], as JSON would turn names which aren't strings
+            # into strings if they were keys
+            checkpoint = {
+                "header": header, "seed": seed, "offset": 0, "batches": 0, "iterations": 0,
+                "hits": [0] * len(header["predicates"])
+            }
+
+            self._file = open(self.path, "wb", buffering=self.buffer_size)
+            self._file.writelines(self._header_chunks(header))
+
+        self._checkpoint = checkpoint
+        self._predicate_names = header["predicates"]
+
+        if not checkpoint["batches"]:
+            return checkpoint["seed"], 0, None
+
+        written = SimulationResult(checkpoint["iterations"], dict(zip(self._predicate_names, checkpoint["hits"])))
+
+        return checkpoint["seed"], checkpoint["batches"], written
+
+    def write_batch(self, index, result, codes=None, bits=None):
+        """
+        Writes a batch (its counts, and its hands' card indexes and predicate bits - if they were recorded), then
+        flushes it to disk and checkpoints it.
+
+        :type index: int
+        :type result: SimulationResult
+        :type codes: array
+        :type bits: array
+        """
+
+        self._file.writelines(self._batch_chunks(index, result, codes, bits))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        checkpoint = self._checkpoint
+        hits = checkpoint["hits"]
+
+        checkpoint["offset"] = self._file.tell()
+        checkpoint["batches"] += 1
+        checkpoint["iterations"] += result.iterations
+
+        for i, name in enumerate(self._predicate_names):
+            hits[i] += result.hits[name]
+
+        # replaced atomically, so that the checkpoint only ever names whole batches
+        temporary_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self._checkpoint, f, ensure_ascii=False)
+
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _header_chunks(self, header):
+        """
+        Returns the bytes which start the file.
+        """
+
+        raise NotImplementedError
+
+    def _batch_chunks(self, index, result, codes, bits):
+        """
+        Returns the bytes of a batch.
+        """
+
+        raise NotImplementedError
+
+
+class JSONLinesSink(ResultSink):
+    """
+    Writes a line for the simulation's header, then a line per batch - {"batch": ..., "iterations": ..., "hits":
+    {...}} - followed by a line per recorded hand: {"batch": ..., "cards": [card indexes], "bits": ...}.
+    """
+
+    @staticmethod
+    def _line(value):
+        return (json.dumps(value, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+
+    def _header_chunks(self, header):
+        return [self._line(header)]
+
+    def _batch_chunks(self, index, result, codes, bits):
+        yield self._line({"batch": index, "iterations": result.iterations, "hits": result.hits})
+
+        if codes is None:
+            return
+
+        draw_count = len(codes) // len(bits) if bits else 0
+
+        for i, hand_bits in enumerate(bits):
+            yield self._line(
+                {"batch": index, "cards": codes[i * draw_count:(i + 1) * draw_count].tolist(), "bits": hand_bits}
+            )
+
+
+class CSVSink(ResultSink):
+    """
+    Writes a row per batch (its index, its iterations, and a column of hits per predicate) - or, if hands are
+    recorded, a row per hand instead (its batch, a column per card - its rank and suit, e.g. 10♠ - and a 0 or 1 column
+    per predicate).
+    """
+
+    def __init__(self, path, buffer_size=1 << 20):
+        super().__init__(path, buffer_size)
+
+        # the card labels, and how many predicates there are, of the simulation the sink was opened for
+        self._labels = None
+        self._predicates_count = 0
+
+    def _header_chunks(self, header):
+        if header["record_hands"]:
+            columns = ["batch"] + [f"card_{i + 1}" for i in range(header["draw_count"])] + header["predicates"]
+        else:
+            columns = ["batch", "iterations"] + header["predicates"]
+
+        return [self._rows([columns])]
+
+    def open(self, header, seed=None):
+        opened = super().open(header, seed)
+
+        self._labels = header["cards"]
+        self._predicates_count = len(header["predicates"])
+
+        return opened
+
+    @staticmethod
+    def _rows(rows):
+        text = io.StringIO()
+        csv.writer(text, lineterminator="\n").writerows(rows)
+
+        return text.getvalue().encode()
+
+    def _batch_chunks(self, index, result, codes, bits):
+        if codes is None:
+            return [self._rows([[index, result.iterations] + list(result.hits.values())])]
+
+        labels = self._labels
+        predicates = range(self._predicates_count)
+        draw_count = len(codes) // len(bits) if bits else 0
+
+        return [self._rows(
+            [index] + [labels[k] for k in codes[i * draw_count:(i + 1) * draw_count]] +
+            [hand_bits >> p & 1 for p in predicates]
+            for i, hand_bits in enumerate(bits)
+        )]
+
+
+class BinarySink(ResultSink):
+    """
+    Writes a compact binary file: a header (see MAGIC and VERSION) followed by the simulation's header as JSON, then
+    each batch - its index, iterations, hand count, and hits (one unsigned 64 bit integer per predicate), followed by
+    its hands' card indexes (two bytes each) and their predicate bits (in the smallest unsigned integer with a bit
+    per predicate), all little-endian. Read it back with BinarySink.read.
+    """
+
+    MAGIC = b"HEVR"
+    VERSION = 1
+
+    _header = struct.Struct("<4sHI")
+    _batch = struct.Struct("<QQQ")
+
+    Batch = namedtuple("Batch", ("index", "result", "codes", "bits"))
+
+    def _header_chunks(self, header):
+        data = json.dumps(header, ensure_ascii=False).encode()
+
+        return [self._header.pack(self.MAGIC, self.VERSION, len(data)), data]
+
+    def _batch_chunks(self, index, result, codes, bits):
+        hits = list(result.hits.values())
+
+        yield self._batch.pack(index, result.iterations, len(bits) if bits is not None else 0)
+        yield struct.pack(f"<{len(hits)}Q", *hits)
+
+        if codes is not None:
+            for values in (codes, bits):
+                if sys.byteorder != "little":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+
+                yield values.tobytes()
+
+    @classmethod
+    def read(cls, path):
+        """
+        Reads a binary sink's file, returning the simulation's header and an iterator over its batches (as Batch
+        tuples, of codes and bits arrays if hands were recorded) - which reads one batch at a time.
+
+        :type path: str
+        :rtype: tuple[dict, collections.abc.Iterator[BinarySink.Batch]]
+        """
+
+        with open(path, "rb") as f:
+            magic, version, length = cls._header.unpack(f.read(cls._header.size))
+
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"{path} isn't a (version {cls.VERSION}) binary sink file.")
+
+            header = json.loads(f.read(length).decode())
+
+        return header, cls._read_batches(path, cls._header.size + length, header)
+
+    @classmethod
+    def _read_batches(cls, path, offset, header):
+        names = header["predicates"]
+        draw_count = header["draw_count"]
+        bits_typecode = _bits_typecode(len(names))
+        hits_format = struct.Struct(f"<{len(names)}Q")
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+
+            while True:
+                data = f.read(cls._batch.size)
+
+                if not data:
+                    return
+
+                index, iterations, hands = cls._batch.unpack(data)
+                result = SimulationResult(iterations, dict(zip(names, hits_format.unpack(f.read(hits_format.size)))))
+
+                codes = bits = None
+
+                if header["record_hands"]:
+                    codes = array("H")
+                    codes.frombytes(f.read(hands * draw_count * codes.itemsize))
+                    bits = array(bits_typecode)
+                    bits.frombytes(f.read(hands * bits.itemsize))
+
+                    if sys.byteorder != "little":
+                        codes.byteswap()
+                        bits.byteswap()
+
+                yield cls.Batch(index, result, codes, bits)
+
+
+class _MultiplicityStrata:
+    def __init__(self, group_sizes, draw_count):
+        """
+        The rank multiplicity classes of draw_count-card draws from a deck whose rank values have group_sizes cards
+        each. A class (or shape) is a tuple whose (m - 1)th entry is how many rank values are drawn exactly m times.
+
+        Draws are counted (and sampled) rank value by rank value: drawing c of a group's n cards can happen in
+        comb(n, c) ways, and the ways of drawing the rest of a shape from the remaining groups are memoised.
+
+        :type group_sizes: list[int]
+        :type draw_count: int
+        """
+
+        self.group_sizes = group_sizes
+        self.draw_count = draw_count
+        self.hands = comb(sum(group_sizes), draw_count)
+
+        self._ways = lru_cache(maxsize=None)(self._count_ways)
+
+    def _count_ways(self, i, shape):
+        if i == len(self.group_sizes):
+            return 0 if any(shape) else 1
+
+        n = self.group_sizes[i]
+
+        return self._ways(i + 1, shape) + sum(
+            comb(n, c) * self._ways(i + 1, _remove_part(shape, c))
+            for c in range(1, min(n, len(shape)) + 1) if shape[c - 1]
+        )
+
+    def weights(self):
+        """
+        Yields each class with at least one draw, and the probability of a draw being in it.
+
+        :rtype: collections.abc.Iterator[tuple[tuple[int], float]]
+        """
+
+        for shape in _shapes(self.draw_count, max(self.group_sizes, default=0), len(self.group_sizes)):
+            ways = self._ways(0, shape)
+
+            if ways:
+                yield shape, ways / self.hands
+
+    def sample(self, shape, rng):
+        """
+        Returns how many cards to draw from each group, uniformly among the draws in a class.
+
+        :rtype: list[int]
+        """
+
+        counts = []
+
+        for i, n in enumerate(self.group_sizes):
+            choices = [(0, self._ways(i + 1, shape))] + [
+                (c, comb(n, c) * self._ways(i + 1, _remove_part(shape, c)))
+                for c in range(1, min(n, len(shape)) + 1) if shape[c - 1]
+            ]
+
+            x = rng.randrange(sum(ways for c, ways in choices))
+
+            for c, ways in choices:
+                if x < ways:
+                    break
+
+                x -= ways
+
+            counts.append(c)
+
+            if c:
+                shape = _remove_part(shape, c)
+
+        return counts
+
+
+def _remove_part(shape, part):
+    return shape[:part - 1] + (shape[part - 1] - 1,) + shape[part:]
+
+
+def _shapes(total, largest_part, most_parts):
+    """
+    Yields the shapes (see _MultiplicityStrata) of the partitions of total into at most most_parts parts of at most
+    largest_part each.
+    """
+
+    def partitions(remaining, largest, parts):
+        if remaining == 0:
+            yield ()
+            return
+
+        if parts == 0:
+            return
+
+        for part in range(min(remaining, largest), 0, -1):
+            for rest in partitions(remaining - part, part, parts - 1):
+                yield (part,) + rest
+
+    for partition in partitions(total, largest_part, most_parts):
+        counts = Counter(partition)
+
+        yield tuple(counts[m] for m in range(1, largest_part + 1))
+
+
+class Estimate:
+    def __init__(self, value, standard_error, hands):
+        """
+        An unbiased estimate of a probability, and its standard error.
+
+        :type value: float
+        :type standard_error: float
+        :param hands: The amount of hands evaluated to make the estimate.
+        :type hands: int
+        """
+
+        self.value = value
+        self.standard_error = standard_error
+        self.hands = hands
+
+    def __repr__(self):
+        return f"Estimate(value={self.value!r}, standard_error={self.standard_error!r}, hands={self.hands!r})"
+
+    @classmethod
+    def from_samples(cls, samples, hands):
+        """
+        Estimates a probability as the mean of some independent, unbiased samples of it.
+
+        :type samples: list[float]
+        :type hands: int
+        :rtype: Estimate
+        """
+
+        n = len(samples)
+        mean = sum(samples) / n
+        variance = sum((s - mean) ** 2 for s in samples) / (n - 1) if n > 1 else 0.0
+
+        return cls(mean, (variance / n) ** 0.5, hands)
+
+    def confidence_interval(self, confidence=0.95):
+        """
+        Returns a normal approximation confidence interval around the estimate.
+
+        :rtype: tuple[float, float]
+        """
+
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        return max(0.0, self.value - z * self.standard_error), min(1.0, self.value + z * self.standard_error)
+
+
+def _clopper_pearson_interval(hits, iterations, confidence):
+    """
+    Returns the Clopper-Pearson interval for hits successes out of iterations trials: the quantiles of two beta
+    distributions.
+    """
+
+    alpha = 1 - confidence
+
+    lower = _beta_quantile(alpha / 2, hits, iterations - hits + 1) if hits > 0 else 0.0
+    upper = _beta_quantile(1 - alpha / 2, hits + 1, iterations - hits) if hits < iterations else 1.0
+
+    return lower, upper
+
+
+def _beta_quantile(q, a, b):
+    """
+    Returns the x for which the regularized incomplete beta function I_x(a, b) is q, by bisection.
+    """
+
+    low, high = 0.0, 1.0
+
+    for _ in range(60):
+        middle = (low + high) / 2
+
+        if _regularized_beta(middle, a, b) < q:
+            low = middle
+        else:
+            high = middle
+
+    return (low + high) / 2
+
+
+def _regularized_beta(x, a, b):
+    """
+    Returns the regularized incomplete beta function I_x(a, b), evaluated with its continued fraction (using the
+    symmetry I_x(a, b) = 1 - I_(1-x)(b, a) where that converges faster).
+    """
+
+    if x <= 0:
+        return 0.0
+
+    if x >= 1:
+        return 1.0
+
+    if x > (a + 1) / (a + b + 2):
+        return 1 - _regularized_beta(1 - x, b, a)
+
+    front = exp(lgamma(a + b) - lgamma(a) - lgamma(b) + a * log(x) + b * log(1 - x)) / a
+
+    # Lentz's method
+    tiny = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    fraction = d
+
+    for m in range(1, 1000):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))
+        ):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+
+        if abs(c * d - 1) < 1e-15:
+            break
+
+    return front * fraction
+
+
+class Showdown:
+    def __init__(self, deck, player_count, hand_size, scorer, low_wins=False, card_filter=None,
+                 evaluation_cache=None, evaluator_class=HandEvaluatorMixin):
+        """
+        Estimates how often each seat wins when player_count hands of hand_size cards are dealt from one deck and
+        scored against each other. Each deal is one partial shuffle of player_count * hand_size cards (see
+        Simulator.samples), split into consecutive hands - seat 0 gets the first hand_size cards, and so on.
+
+        :type deck: Hand
+        :type player_count: int
+        :type hand_size: int
+        :param scorer: Scores a hand's HandEvaluatorMixin (e.g. methodcaller("get_total_rank_values"), a HandRanker,
+            or a has_* predicate). Scores must compare with each other, and be hashable.
+        :type scorer: callable
+        :param low_wins: Whether the lowest score wins, rather than the highest.
+        :param card_filter: Which of the deck's cards to keep, as with Hand.remove_cards (optional).
+        :param evaluation_cache: Caches the hands' query results (optional).
+        :type evaluation_cache: EvaluationCache
+        :param evaluator_class: Evaluates the hands, as for Simulator.
+        :type evaluator_class: type
+        """
+
+        if player_count < 1 or hand_size < 1:
+            raise ValueError("A showdown needs at least one player, and at least one card per hand.")
+
+        self.player_count = player_count
+        self.hand_size = hand_size
+        self.scorer = scorer
+        self.low_wins = low_wins
+        self.evaluation_cache = evaluation_cache
+        self.evaluator_class = evaluator_class
+
+        self.simulator = Simulator(deck, player_count * hand_size, {}, card_filter=card_filter)
+
+    def deals(self, iterations, seed=None):
+        """
+        Yields iterations-many deals, each a list of every seat's cards.
+        """
+
+        hand_size = self.hand_size
+        starts = range(0, self.player_count * hand_size, hand_size)
+
+        for cards in self.simulator.samples(iterations, seed):
+            yield [cards[start:start + hand_size] for start in starts]
+
+    def run(self, iterations, seed=None, workers=1, executor=None):
+        """
+        Deals and scores iterations-many showdowns, split across workers as in Simulator.run.
+
+        :rtype: ShowdownResult
+        """
+
+        results = _run_in_chunks(self._run, iterations, seed, workers, executor)
+
+        return ShowdownResult.merge(results)
+
+    def _run(self, iterations, seed):
+        scorer = self.scorer
+        evaluation_cache = self.evaluation_cache
+        evaluator_class = self.evaluator_class
+        best = min if self.low_wins else max
+        seats = range(self.player_count)
+
+        wins = [0] * self.player_count
+        ties = [0] * self.player_count
+        scores = [Counter() for _ in seats]
+
+        for hands in self.deals(iterations, seed):
+            hand_scores = [scorer(evaluator_class(cards, evaluation_cache)) for cards in hands]
+            winning_score = best(hand_scores)
+
+            winners = [s for s in seats if hand_scores[s] == winning_score]
+
+            if len(winners) == 1:
+                wins[winners[0]] += 1
+            else:
+                for s in winners:
+                    ties[s] += 1
+
+            for s in seats:
+                scores[s][hand_scores[s]] += 1
+
+        return ShowdownResult(iterations, wins, ties, scores)
+
+
+class ShowdownResult:
+    def __init__(self, iterations, wins, ties, scores):
+        """
+        The outcome of a Showdown run. A seat wins a showdown if its score is the best outright, ties if it shares the
+        best score, and loses otherwise.
+
+        :param iterations: The amount of showdowns dealt.
+        :type iterations: int
+        :param wins: The amount of showdowns each seat won outright.
+        :type wins: list[int]
+        :param ties: The amount of showdowns each seat tied for the best score.
+        :type ties: list[int]
+        :param scores: How often each seat's hand got each score.
+        :type scores: list[Counter]
+        """
+
+        self.iterations = iterations
+        self.wins = wins
+        self.ties = ties
+        self.scores = scores
+
+    @staticmethod
+    def merge(results):
+        """
+        Combines the results of showdowns between the same seats.
+
+        :type results: list[ShowdownResult]
+        :rtype: ShowdownResult
+        """
+
+        seats = range(len(results[0].wins))
+        scores = [Counter() for _ in seats]
+
+        for r in results:
+            for s in seats:
+                scores[s].update(r.scores[s])
+
+        return ShowdownResult(
+            sum(r.iterations for r in results),
+            [sum(r.wins[s] for r in results) for s in seats],
+            [sum(r.ties[s] for r in results) for s in seats],
+            scores
+        )
+
+    def win_rate(self, seat=0):
+        return self.wins[seat] / self.iterations
+
+    def tie_rate(self, seat=0):
+        return self.ties[seat] / self.iterations
+
+    def lose_rate(self, seat=0):
+        return 1 - (self.wins[seat] + self.ties[seat]) / self.iterations
+
+    def score_distribution(self, seat=0):
+        """
+        Returns how often a seat's hand got each score, by score in ascending order.
+
+        :rtype: dict
+        """
+
+        return {score: self.scores[seat][score] / self.iterations for score in sorted(self.scores[seat])}
+
+
+class HistogramPredicate:
+    """
+    A predicate over one of a hand's histograms (see histogram), phrased as a fold over its (key, count) pairs in
+    ascending key order. Because only a small state is carried from one key to the next, exact_probability can count
+    the hands which satisfy the predicate key by key, rather than enumerating hands.
+
+    The fold may be given every key of the deck (with a count of zero for those the hand lacks), or only the keys
+    present in the hand; a predicate must give the same answer either way.
+
+    Calling a predicate with a HandEvaluatorMixin evaluates it for that hand, so predicates can also be used with
+    Simulator.
+    """
+
+    # the HandEvaluatorMixin histogram which the predicate reads
+    histogram = "rank_values_histogram"
+
+    def initial(self):
+        raise NotImplementedError
+
+    def step(self, state, key, count):
+        """
+        Returns the state after a key with count cards. States must be hashable.
+        """
+
+        raise NotImplementedError
+
+    def accept(self, state):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in sorted(vars(self).items()))})"
+
+    def __call__(self, evaluator):
+        histogram = getattr(evaluator, self.histogram)
+        state = self.initial()
+
+        for key in sorted(histogram):
+            state = self.step(state, key, histogram[key])
+
+        return self.accept(state)
+
+
+class NOfAKindPredicate(HistogramPredicate):
+    def __init__(self, matching_sets_count, cards_count):
+        """
+        As HandEvaluatorMixin.has_m_many_n_of_a_kind.
+        """
+
+        self.matching_sets_count = matching_sets_count
+        self.cards_count = cards_count
+
+    def initial(self):
+        return 0
+
+    def step(self, state, key, count):
+        if count and count >= self.cards_count:
+            return min(state + 1, self.matching_sets_count)
+
+        return state
+
+    def accept(self, state):
+        return state >= self.matching_sets_count
+
+
+class StraightPredicate(HistogramPredicate):
+    def __init__(self, cards_count=5):
+        """
+        As HandEvaluatorMixin.has_straight.
+        """
+
+        self.cards_count = cards_count
+
+    def initial(self):
+        # the last rank value present, and the length of the run ending with it
+        return None, 0
+
+    def step(self, state, key, count):
+        if state is True or count == 0:
+            return state
+
+        previous, run_length = state
+        run_length = run_length + 1 if previous is not None and key == previous + 1 else 1
+
+        if run_length >= self.cards_count:
+            return True
+
+        return key, run_length
+
+    def accept(self, state):
+        return state is True or self.cards_count <= 0
+
+
+class FlushPredicate(HistogramPredicate):
+    histogram = "suits_histogram"
+
+    def __init__(self, cards_count=5):
+        """
+        As HandEvaluatorMixin.has_flush (for any suit).
+        """
+
+        self.cards_count = cards_count
+
+    def initial(self):
+        return False
+
+    def step(self, state, key, count):
+        return state or bool(count and count >= self.cards_count)
+
+    def accept(self, state):
+        return state
+
+
+def count_hands(histogram, draw_size, predicate):
+    """
+    Returns how many of the ways of drawing draw_size cards from a deck with this histogram satisfy the predicate.
+    Draws are counted key by key: drawing c of a key's n cards can happen in comb(n, c) ways, and the ways of
+    finishing the draw from the remaining keys are memoised by (key index, cards remaining, predicate state).
+
+    :type histogram: dict
+    :type draw_size: int
+    :type predicate: HistogramPredicate
+    :rtype: int
+    """
+
+    keys = sorted(histogram)
+    multiplicities = [histogram[k] for k in keys]
+
+    # how many cards remain from each key onwards, to cut off draws which can't be completed
+    remaining_cards = [sum(multiplicities[i:]) for i in range(len(keys) + 1)]
+
+    @lru_cache(maxsize=None)
+    def ways(i, remaining, state):
+        if remaining > remaining_cards[i]:
+            return 0
+
+        if i == len(keys):
+            return 1 if predicate.accept(state) else 0
+
+        return sum(
+            comb(multiplicities[i], count) * ways(i + 1, remaining - count, predicate.step(state, keys[i], count))
+            for count in range(min(multiplicities[i], remaining) + 1)
+        )
+
+    return ways(0, draw_size, predicate.initial())
+
+
+def suit_isomorphism_classes(deck, draw_size, card_filter=None):
+    """
+    Yields (cards, weight) for every class of draw_size-card draws from a deck which are the same up to a relabelling
+    of suits, where cards is one draw from the class (see Hand.canonicalize) and weight is how many draws of the deck's
+    cards fall in the class. Weights sum to comb(deck size, draw_size).
+
+    Every suit must hold the same ranks the same amount of times (as in generated and doubled decks), or else
+    relabelling suits would change the deck.
+
+    :type deck: Hand
+    :type draw_size: int
+    :param card_filter: Which of the deck's cards to keep, as with Hand.remove_cards (optional).
+    :rtype: collections.abc.Iterator[tuple[list[Card], int]]
+    """
+
+    cards = [c for c in deck.cards if card_filter(c)] if card_filter else list(deck.cards)
+
+    copies = dict()
+
+    for c in cards:
+        copies.setdefault((c.rank, c.suit), []).append(c)
+
+    suits = list(dict.fromkeys(c.suit for c in cards))
+    ranks = list(dict.fromkeys(c.rank for c in cards))
+    multiplicities = [len(copies.get((rank, suits[0]), [])) for rank in ranks] if suits else []
+
+    if any([len(copies.get((rank, suit), [])) for rank in ranks] != multiplicities for suit in suits):
+        raise ValueError("Every suit of the deck must hold the same ranks, the same amount of times.")
+
+    def suit_draws(i, remaining):
+        # every way of drawing up to remaining cards from one suit, as counts per rank, in descending order
+        if i == len(ranks):
+            yield ()
+            return
+
+        for count in range(min(multiplicities[i], remaining), -1, -1):
+            for rest in suit_draws(i + 1, remaining - count):
+                yield (count,) + rest
+
+    draws = list(suit_draws(0, draw_size))
+    draw_sizes = [sum(d) for d in draws]
+    draw_ways = [prod(comb(m, count) for m, count in zip(multiplicities, d)) for d in draws]
+
+    # the indexes of the draws of each size, for completing the last suit
+    draws_by_size = dict()
+
+    for i, size in enumerate(draw_sizes):
+        draws_by_size.setdefault(size, []).append(i)
+
+    def classes(suit_index, start, remaining, chosen):
+        # suits are given non-increasing draws (by index), so that each class is only visited once - and each suit
+        # must leave few enough cards that the suits after it can hold them
+        smallest_size = max(0, remaining - (len(suits) - suit_index - 1) * sum(multiplicities))
+
+        for size in range(smallest_size, remaining + 1):
+            candidates = draws_by_size.get(size, [])
+
+            for i in candidates[bisect_left(candidates, start):]:
+                if suit_index == len(suits) - 1:
+                    yield chosen + [i]
+                else:
+                    yield from classes(suit_index + 1, i, remaining - size, chosen + [i])
+
+    if not suits:
+        return
+
+    for chosen in classes(0, 0, draw_size, []):
+        weight = factorial(len(suits)) // prod(factorial(n) for n in Counter(chosen).values())
+        weight *= prod(draw_ways[i] for i in chosen)
+
+        yield [
+            c
+            for suit, i in zip(suits, chosen)
+            for rank, count in zip(ranks, draws[i])
+            for c in copies.get((rank, suit), [])[0:count]
+        ], weight
+
+
+def exact_probability(deck, draw_size, predicate, card_filter=None, iterations=100000, seed=None,
+                      enumerate_classes=False, cache=None):
+    """
+    Returns the probability that draw_size cards drawn from a deck satisfy a predicate.
+
+    If the predicate is a HistogramPredicate, it is computed exactly (as a Fraction) by counting over the deck's
+    histogram - see count_hands. Otherwise, if enumerate_classes is set, it is computed exactly by evaluating the
+    predicate once per suit isomorphism class of draws (see suit_isomorphism_classes), which is only correct for
+    predicates which don't care which suit is which. Otherwise, it falls back to estimating it (as a float) with a
+    Simulator.
+
+    :type deck: Hand
+    :type draw_size: int
+    :type predicate: HistogramPredicate | callable
+    :param card_filter: Which of the deck's cards to keep, as with Hand.remove_cards (optional).
+    :param iterations: How many samples to draw, if the probability has to be estimated.
+    :param seed: Seeds the samples, if the probability has to be estimated (optional).
+    :param enumerate_classes: Whether to enumerate suit isomorphism classes rather than sample.
+    :param cache: Keeps exact results of HistogramPredicates across runs (optional). Results whose counts don't fit
+        in 64 bits aren't kept.
+    :type cache: ArtifactCache
+    :rtype: Fraction | float
+    """
+
+    if not isinstance(predicate, HistogramPredicate) and enumerate_classes:
+        deck_size = len([c for c in deck.cards if card_filter(c)]) if card_filter else len(deck.cards)
+
+        satisfied = sum(
+            weight for cards, weight in suit_isomorphism_classes(deck, draw_size, card_filter)
+            if predicate(HandEvaluatorMixin(cards))
+        )
+
+        return Fraction(satisfied, comb(deck_size, draw_size))
+
+    if not isinstance(predicate, HistogramPredicate):
+        simulator = Simulator(deck, draw_size, {"predicate": predicate}, card_filter=card_filter)
+
+        return simulator.run(iterations, seed=seed).probability("predicate")
+
+    evaluator = HandEvaluatorMixin([c for c in deck.cards if card_filter(c)]) if card_filter else deck.evaluator
+    histogram = getattr(evaluator, predicate.histogram)
+    deck_size = sum(histogram.values())
+
+    if draw_size > deck_size:
+        raise ValueError(f"Can't draw {draw_size} cards from a deck of {deck_size}.")
+
+    hands = comb(deck_size, draw_size)
+
+    if cache is None or hands >= 1 << 64:
+        return Fraction(count_hands(histogram, draw_size, predicate), hands)
+
+    with cache.get(
+        ArtifactCache.key("exact_probability", evaluator.cards, draw_size, repr(predicate)),
+        lambda: {"counts": array("Q", [count_hands(histogram, draw_size, predicate), hands])}
+    ) as arrays:
+        return Fraction(*arrays["counts"])
+
+
+def total_value_distribution(deck, draw_size, value_map=None, attribute="rank_value", card_filter=None,
+                             iterations=None, seed=None, cache=None):
+    """
+    Returns the distribution of the total value of draw_size cards drawn from a deck (as with
+    Hand.get_total_rank_values).
+
+    It's computed exactly by counting over how many cards of each value the deck has (see _count_totals). If iterations
+    is set, the distribution is estimated from that many samples instead - for decks too large to count over.
+
+    :type deck: Hand
+    :type draw_size: int
+    :param value_map: Each rank's value, e.g. {"A": 1, "K": 10, ...} (optional - defaults to each card's attribute).
+    :type value_map: dict[str, int]
+    :param attribute: Which card attribute to total, if there's no value_map (e.g. "point_value").
+    :param card_filter: Which of the deck's cards to keep, as with Hand.remove_cards (optional).
+    :param iterations: How many samples to draw, to estimate the distribution rather than count it (optional).
+    :param seed: Seeds the samples (optional).
+    :param cache: Keeps exact distributions across runs (optional). Distributions whose counts don't fit in 64 bits
+        aren't kept.
+    :type cache: ArtifactCache
+    :rtype: TotalValueDistribution
+    """
+
+    cards = [c for c in deck.cards if card_filter(c)] if card_filter else deck.cards
+
+    if value_map is None:
+        values = list(map(attrgetter(attribute), cards))
+
+        # e.g. point values, which cards don't have unless they're given them
+        if None in values:
+            raise ValueError(f"Not every card has a {attribute}; give them one, or pass a value_map.")
+    else:
+        values = [value_map[c.rank] for c in cards]
+
+    if draw_size > len(values):
+        raise ValueError(f"Can't draw {draw_size} cards from a deck of {len(values)}.")
+
+    if iterations is not None:
+        sample = Random(seed).sample
+
+        return TotalValueDistribution(
+            Counter(sum(sample(values, draw_size)) for _ in range(iterations)), iterations, exact=False
+        )
+
+    hands = comb(len(values), draw_size)
+
+    if cache is None or hands >= 1 << 64:
+        return TotalValueDistribution(_count_totals(values, draw_size), hands)
+
+    def build():
+        counts = _count_totals(values, draw_size)
+
+        return {"totals": array("q", counts.keys()), "counts": array("Q", counts.values())}
+
+    # the distribution only depends on the multiset of values
+    value_cards = [Card(rank="", rank_value=v, suit="", color="") for v in values]
+    with cache.get(ArtifactCache.key("total_values", value_cards, draw_size), build) as arrays:
+        return TotalValueDistribution(dict(zip(arrays["totals"], arrays["counts"])), hands)
+
+
+def _count_totals(values, draw_size):
+    """
+    Counts the draws of draw_size values by their total: drawing c of a value's n copies can happen in comb(n, c) ways,
+    and shifts a draw's total by c times the value.
+
+    :rtype: Counter
+    """
+
+    # ways[k] counts the k-card draws by their total, over the values counted so far
+    ways = [Counter() for _ in range(draw_size + 1)]
+    ways[0][0] = 1
+
+    for value, multiplicity in Counter(values).items():
+        # from the largest draws down, so that each value is only drawn from once per draw
+        for k in range(draw_size, 0, -1):
+            for count in range(1, min(multiplicity, k) + 1):
+                weight = comb(multiplicity, count)
+
+                for total, w in ways[k - count].items():
+                    ways[k][total + count * value] += weight * w
+
+    return ways[draw_size]
+
+
+class TotalValueDistribution:
+    def __init__(self, counts, hands, exact=True):
+        """
+        The distribution of the total values of drawn hands (see total_value_distribution).
+
+        :param counts: How many hands add up to each total.
+        :type counts: dict[int, int]
+        :param hands: The amount of hands counted (or sampled).
+        :type hands: int
+        :param exact: Whether the counts cover every hand, rather than a sample of them.
+        """
+
+        self.hands = hands
+        self.exact = exact
+
+        self.values = sorted(total for total in counts if counts[total])
+        self.counts = [counts[total] for total in self.values]
+
+        self.pmf = array("d", (count / hands for count in self.counts))
+        self.cdf = array("d")
+
+        cumulative = 0
+
+        for count in self.counts:
+            cumulative += count
+            self.cdf.append(cumulative / hands)
+
+    def probability(self, total):
+        """
+        Returns the probability of a hand adding up to total - as a Fraction, if the distribution is exact.
+
+        :rtype: Fraction | float
+        """
+
+        i = bisect_left(self.values, total)
+        count = self.counts[i] if i < len(self.values) and self.values[i] == total else 0
+
+        return Fraction(count, self.hands) if self.exact else count / self.hands
+
+    def at_most(self, total):
+        """
+        Returns the probability of a hand adding up to total or less.
+
+        :rtype: float
+        """
+
+        i = bisect_left(self.values, total)
+
+        if i < len(self.values) and self.values[i] == total:
+            i += 1
+
+        return self.cdf[i - 1] if i else 0.0
+
+
+def _longest_run(mask):
+    """
+    Returns the length of the longest run of consecutive set bits in the bitmask.
+    """
+
+    length = 0
+
+    while mask:
+        mask &= mask >> 1
+        length += 1
+
+    return length
+
+
+def _longest_filled_run(rank_values, present, gaps):
+    """
+    Returns the length of the longest run of consecutive rank values, from a sorted list of those which exist, in
+    which at most gaps-many rank values aren't present.
+
+    :type rank_values: list[int]
+    :type present: collections.abc.Container[int]
+    :type gaps: int
+    """
+
+    longest = 0
+    start = 0
+    missing = 0
+
+    for end, rank_value in enumerate(rank_values):
+        if end and rank_value != rank_values[end - 1] + 1:
+            start = end
+            missing = 0
+
+        if rank_value not in present:
+            missing += 1
+
+        while missing > gaps:
+            if rank_values[start] not in present:
+                missing -= 1
+
+            start += 1
+
+        longest = max(longest, end - start + 1)
+
+    return longest
+
+
+class BatchEvaluator:
+    def __init__(self, schema):
+        """
+        Evaluates many encoded hands (see Hand.encode) at once, giving the same answers as HandEvaluatorMixin's has_*
+        methods. Each hand's suit and rank value histograms, and a bitmask of its rank values, are built in a single
+        pass over its codes using per-code lookup tables; every query is then answered from those.
+
+        Works for any schema, including hands drawn from doubled decks (whose codes simply repeat).
+
+        :type schema: DeckSchema
+        """
+
+        self.schema = schema
+
+        suit_indexes = {suit: i for i, suit in enumerate(schema.suits)}
+        rank_values = sorted(set(schema.code_rank_values))
+        rank_value_indexes = {rank_value: i for i, rank_value in enumerate(rank_values)}
+
+        self._suit_count = len(suit_indexes)
+        self._rank_value_count = len(rank_value_indexes)
+
+        self._code_suit_indexes = tuple(suit_indexes[s] for s in schema.code_suits)
+        self._code_rank_value_indexes = tuple(rank_value_indexes[v] for v in schema.code_rank_values)
+        self._code_rank_value_bits = tuple(1 << (v - rank_values[0]) for v in schema.code_rank_values)
+
+    def histograms(self, hand):
+        """
+        Returns a hand's suit counts and rank value counts (as lists indexed by suit and by ascending rank value),
+        plus a bitmask of its rank values.
+
+        :type hand: array | list[int]
+        """
+
+        suit_counts = [0] * self._suit_count
+        rank_value_counts = [0] * self._rank_value_count
+        rank_value_mask = 0
+
+        code_suit_indexes = self._code_suit_indexes
+        code_rank_value_indexes = self._code_rank_value_indexes
+        code_rank_value_bits = self._code_rank_value_bits
+
+        for code in hand:
+            suit_counts[code_suit_indexes[code]] += 1
+            rank_value_counts[code_rank_value_indexes[code]] += 1
+            rank_value_mask |= code_rank_value_bits[code]
+
+        return suit_counts, rank_value_counts, rank_value_mask
+
+    def evaluate(self, hands, flush_cards_count=5, straight_cards_count=5, matching_sets=None):
+        """
+        Evaluates every hand in one pass, returning a list of booleans (one per hand) for each of "flush",
+        "straight", "four_of_a_kind", "three_of_a_kind", "pair" and "two_pairs" - plus "m_many_n_of_a_kind" if
+        matching_sets is given.
+
+        :param hands: An N x k matrix of codes (e.g. a list of arrays).
+        :param flush_cards_count: As in HandEvaluatorMixin.has_flush.
+        :param straight_cards_count: As in HandEvaluatorMixin.has_straight.
+        :param matching_sets: A (matching_sets_count, cards_count) pair, as in has_m_many_n_of_a_kind (optional).
+        :rtype: dict[str, list[bool]]
+        """
+
+        results = {
+            "flush": [],
+            "straight": [],
+            "four_of_a_kind": [],
+            "three_of_a_kind": [],
+            "pair": [],
+            "two_pairs": []
+        }
+
+        if matching_sets:
+            results["m_many_n_of_a_kind"] = []
+
+        for hand in hands:
+            suit_counts, rank_value_counts, rank_value_mask = self.histograms(hand)
+
+            # only ranks which are present count towards a set, as with the evaluator's histograms
+            set_sizes = [c for c in rank_value_counts if c]
+
+            results["flush"].append(any(c >= flush_cards_count for c in suit_counts if c))
+            results["straight"].append(_longest_run(rank_value_mask) >= straight_cards_count)
+            results["four_of_a_kind"].append(any(c >= 4 for c in set_sizes))
+            results["three_of_a_kind"].append(any(c >= 3 for c in set_sizes))
+            results["pair"].append(any(c >= 2 for c in set_sizes))
+            results["two_pairs"].append(len([c for c in set_sizes if c >= 2]) >= 2)
+
+            if matching_sets:
+                matching_sets_count, cards_count = matching_sets
+                results["m_many_n_of_a_kind"].append(
+                    len([c for c in set_sizes if c >= cards_count]) >= matching_sets_count
+                )
+
+        return results
+
+    def has_flush(self, hands, cards_count=5):
+        return [
+            any(c >= cards_count for c in self.histograms(hand)[0] if c) for hand in hands
+        ]
+
+    def has_straight(self, hands, cards_count=5):
+        return [_longest_run(self.histograms(hand)[2]) >= cards_count for hand in hands]
+
+    def has_m_many_n_of_a_kind(self, hands, matching_sets_count, cards_count):
+        return [
+            len([c for c in self.histograms(hand)[1] if c and c >= cards_count]) >= matching_sets_count
+            for hand in hands
+        ]
+
+
+class HandPattern(namedtuple("HandPattern", ("kind", "first", "second"))):
+    """
+    A question to ask of a hand, for a PatternSet to answer. Make patterns with the class methods below.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def sets(cls, matching_sets_count, cards_count):
+        """
+        m-or-more sets of n cards of the same rank value, as in HandEvaluatorMixin.has_m_many_n_of_a_kind.
+        """
+
+        return cls("sets", matching_sets_count, cards_count)
+
+    @classmethod
+    def same_suit(cls, cards_count):
+        """
+        n-or-more cards of one suit, as in HandEvaluatorMixin.has_flush.
+        """
+
+        return cls("same_suit", cards_count, None)
+
+    @classmethod
+    def run(cls, cards_count):
+        """
+        A run of n-or-more consecutive rank values, as in HandEvaluatorMixin.has_straight.
+        """
+
+        return cls("run", cards_count, None)
+
+    @classmethod
+    def same_suit_run(cls, cards_count):
+        """
+        A run of n-or-more consecutive rank values within one suit, as in HandEvaluatorMixin.has_straight_flush.
+        """
+
+        return cls("same_suit_run", cards_count, None)
+
+    @classmethod
+    def total(cls, lowest, highest):
+        """
+        A total rank value between lowest and highest (inclusive), as in HandEvaluatorMixin.get_total_rank_values.
+        """
+
+        return cls("total", lowest, highest)
+
+
+class PatternSet:
+    def __init__(self, patterns):
+        """
+        Answers several HandPatterns at once. The patterns are compiled into what a hand's histograms need to give up
+        to answer all of them (which set sizes to count, and whether runs, runs within suits or totals are needed), so
+        each hand is read once however many questions are asked of it - rather than once per has_* query.
+
+        Answers come back as a named tuple with a field per pattern, or as a bitfield in which bit i is the answer to
+        the ith pattern.
+
+        :param patterns: Patterns by name (which must be valid identifiers), e.g.
+            {"pair": HandPattern.sets(1, 2), "flush": HandPattern.same_suit(4), "straight": HandPattern.run(5)}.
+        :type patterns: dict[str, HandPattern]
+        """
+
+        kinds = {"sets", "same_suit", "run", "same_suit_run", "total"}
+
+        for pattern in patterns.values():
+            if pattern.kind not in kinds:
+                raise ValueError(f"Unknown kind of pattern: {pattern.kind}.")
+
+        self.patterns = dict(patterns)
+        self.Result = namedtuple("PatternResult", self.patterns)
+
+        used_kinds = {pattern.kind for pattern in self.patterns.values()}
+
+        self._set_sizes = sorted({pattern.second for pattern in self.patterns.values() if pattern.kind == "sets"})
+        self._needs_runs = "run" in used_kinds
+        self._needs_suit_runs = "same_suit_run" in used_kinds
+
+    def __call__(self, evaluator):
+        """
+        Answers every pattern for an evaluator's hand, from its (incrementally kept) histograms and bitmasks - or, for
+        a WildcardEvaluator (whose histograms leave its wild cards out), from its own has_* queries.
+
+        :type evaluator: HandEvaluatorMixin
+        :rtype: tuple
+        """
+
+        if isinstance(evaluator, WildcardEvaluator):
+            return self.Result._make(self._query(evaluator))
+
+        return self.Result._make(self._answer(
+            evaluator.rank_values_histogram.values(),
+            evaluator.suits_histogram.values(),
+            evaluator._rank_values_bitmask() if self._needs_runs else 0,
+            evaluator._suit_rank_values_bitmasks().values() if self._needs_suit_runs else (),
+            evaluator.get_total_rank_values()
+        ))
+
+    def _query(self, evaluator):
+        """
+        Answers every pattern with the evaluator's queries, one at a time.
+        """
+
+        answers = []
+
+        for kind, first, second in self.patterns.values():
+            if kind == "sets":
+                answers.append(evaluator.has_m_many_n_of_a_kind(first, second))
+            elif kind == "same_suit":
+                answers.append(evaluator.has_flush(first))
+            elif kind == "run":
+                answers.append(first <= 0 or evaluator.has_straight(first))
+            elif kind == "same_suit_run":
+                answers.append(first <= 0 or evaluator.has_straight_flush(first))
+            else:
+                answers.append(first <= evaluator.get_total_rank_values() <= second)
+
+        return answers
+
+    def bits(self, evaluator):
+        """
+        Answers every pattern for an evaluator's hand, as a bitfield.
+
+        :type evaluator: HandEvaluatorMixin
+        :rtype: int
+        """
+
+        return self.to_bits(self(evaluator))
+
+    @staticmethod
+    def to_bits(answers):
+        return sum(1 << i for i, answer in enumerate(answers) if answer)
+
+    def evaluate(self, hands, bits=False):
+        """
+        Answers every pattern for each of a batch of hands, in a single pass over each hand's cards.
+
+        :param hands: Lists of cards.
+        :type hands: collections.abc.Iterable[list[Card]]
+        :param bits: Whether to return bitfields rather than named tuples.
+        :rtype: list[tuple] | list[int]
+        """
+
+        results = []
+
+        for cards in hands:
+            rank_value_counts = dict()
+            suit_rank_values = dict()
+            total = 0
+
+            for c in cards:
+                rank_value_counts[c.rank_value] = rank_value_counts.get(c.rank_value, 0) + 1
+                suit_rank_values.setdefault(c.suit, []).append(c.rank_value)
+                total += c.rank_value
+
+            base = min(rank_value_counts, default=0)
+            rank_mask = 0
+            suit_masks = []
+
+            if self._needs_runs:
+                for rank_value in rank_value_counts:
+                    rank_mask |= 1 << (rank_value - base)
+
+            if self._needs_suit_runs:
+                for rank_values in suit_rank_values.values():
+                    suit_masks.append(sum({1 << (rank_value - base) for rank_value in rank_values}))
+
+            answers = self._answer(
+                rank_value_counts.values(), map(len, suit_rank_values.values()), rank_mask, suit_masks, total
+            )
+
+            results.append(self.to_bits(answers) if bits else self.Result._make(answers))
+
+        return results
+
+    def evaluate_codes(self, hands, schema, bits=False):
+        """
+        Answers every pattern for each of a batch of encoded hands (see Hand.encode), using the per-code lookup tables
+        of the schema's BatchEvaluator (see DeckSchema.batch_evaluator).
+
+        :param hands: An N x k matrix of codes (e.g. a list of arrays).
+        :type schema: DeckSchema
+        :param bits: Whether to return bitfields rather than named tuples.
+        :rtype: list[tuple] | list[int]
+        """
+
+        batch_evaluator = schema.batch_evaluator()
+
+        rank_value_count = batch_evaluator._rank_value_count
+        suit_count = batch_evaluator._suit_count
+        code_rank_value_indexes = batch_evaluator._code_rank_value_indexes
+        code_suit_indexes = batch_evaluator._code_suit_indexes
+        code_bits = batch_evaluator._code_rank_value_bits
+        code_rank_values = schema.code_rank_values
+
+        results = []
+
+        for hand in hands:
+            rank_value_counts = [0] * rank_value_count
+            suit_counts = [0] * suit_count
+            suit_masks = [0] * suit_count
+            rank_mask = 0
+            total = 0
+
+            for code in hand:
+                suit_index = code_suit_indexes[code]
+
+                rank_value_counts[code_rank_value_indexes[code]] += 1
+                suit_counts[suit_index] += 1
+                suit_masks[suit_index] |= code_bits[code]
+                rank_mask |= code_bits[code]
+                total += code_rank_values[code]
+
+            # only suits which are present count, as with the evaluator's histograms
+            answers = self._answer(rank_value_counts, [c for c in suit_counts if c], rank_mask, suit_masks, total)
+
+            results.append(self.to_bits(answers) if bits else self.Result._make(answers))
+
+        return results
+
+    def _answer(self, rank_value_counts, suit_counts, rank_mask, suit_masks, total):
+        """
+        Answers every pattern from a hand's rank value counts, the counts of the suits it has, its rank value bitmask
+        and per-suit rank value bitmasks (if any pattern needs them), and its total rank value.
+        """
+
+        set_counts = dict.fromkeys(self._set_sizes, 0)
+
+        for count in rank_value_counts:
+            if count:
+                for size in self._set_sizes:
+                    if count >= size:
+                        set_counts[size] += 1
+
+        largest_suit = max(suit_counts, default=None)
+        longest_run = _longest_run(rank_mask) if self._needs_runs else 0
+        longest_suit_run = max(map(_longest_run, suit_masks), default=0) if self._needs_suit_runs else 0
+
+        answers = []
+
+        for kind, first, second in self.patterns.values():
+            if kind == "sets":
+                answers.append(set_counts[second] >= first)
+            elif kind == "same_suit":
+                answers.append(largest_suit is not None and largest_suit >= first)
+            elif kind == "run":
+                answers.append(first <= 0 or longest_run >= first)
+            elif kind == "same_suit_run":
+                answers.append(first <= 0 or longest_suit_run >= first)
+            else:
+                answers.append(first <= total <= second)
+
+        return answers
+
+
+def _straight_high_card(rank_mask):
+    """
+    Returns the index of the highest rank of the best five-card straight in a 13-bit rank mask (counting the ace as
+    low in A-2-3-4-5), or -1 if there is none.
+    """
+
+    for high in range(12, 3, -1):
+        if rank_mask >> (high - 4) & 0b11111 == 0b11111:
+            return high
+
+    if rank_mask & 0b1000000001111 == 0b1000000001111:
+        return 3
+
+    return -1
+
+
+def _hand_strength(category, ranks):
+    """
+    Packs a category and up to five tie-breaking rank indexes (most significant first) into a comparable integer.
+    """
+
+    strength = HAND_CATEGORIES.index(category)
+
+    for i in range(5):
+        strength = strength << 4 | (ranks[i] + 1 if i < len(ranks) else 0)
+
+    return strength
+
+
+def _best_unsuited_strength(rank_counts):
+    """
+    Returns the strength of the best five-card hand which can be made from cards with these counts per rank index,
+    ignoring flushes.
+    """
+
+    descending = [r for r in range(12, -1, -1) if rank_counts[r]]
+    quads = [r for r in descending if rank_counts[r] >= 4]
+    trips = [r for r in descending if rank_counts[r] >= 3]
+    pairs = [r for r in descending if rank_counts[r] >= 2]
+
+    def kickers(excluded, count):
+        return [r for r in descending if r not in excluded][0:count]
+
+    if quads:
+        return _hand_strength("FOUR_OF_A_KIND", [quads[0]] + kickers([quads[0]], 1))
+
+    if trips and len(pairs) >= 2:
+        return _hand_strength("FULL_HOUSE", [trips[0], [p for p in pairs if p != trips[0]][0]])
+
+    straight_high_card = _straight_high_card(sum(1 << r for r in descending))
+
+    if straight_high_card >= 0:
+        return _hand_strength("STRAIGHT", [straight_high_card])
+
+    if trips:
+        return _hand_strength("THREE_OF_A_KIND", [trips[0]] + kickers([trips[0]], 2))
+
+    if len(pairs) >= 2:
+        return _hand_strength("TWO_PAIRS", pairs[0:2] + kickers(pairs[0:2], 1))
+
+    if pairs:
+        return _hand_strength("PAIR", [pairs[0]] + kickers([pairs[0]], 3))
+
+    return _hand_strength("HIGH_CARD", descending[0:5])
+
+
+def _flush_strength(rank_mask):
+    straight_high_card = _straight_high_card(rank_mask)
+
+    if straight_high_card >= 0:
+        return _hand_strength("STRAIGHT_FLUSH", [straight_high_card])
+
+    return _hand_strength("FLUSH", [r for r in range(12, -1, -1) if rank_mask >> r & 1][0:5])
+
+
+class HandRanker:
+    # lookup tables shared by every ranker in the process, once built or loaded
+    _tables = None
+
+    def __init__(self, path=None, cache=None):
+        """
+        Ranks 5, 6 and 7 card hands from the default 52 card deck, using two lookup tables:
+
+        - the best flush (or straight flush) for every 13-bit mask of ranks within one suit, and
+        - the best other hand for every multiset of ranks, keyed by the sum of 5 ** rank index over the cards.
+
+        A hand's strength is the better of its rank multiset's entry and any of its suits' flush entries. Strengths
+        are integers which compare like the hands do (the higher, the better), and encode the hand's category (see
+        HAND_CATEGORIES). Ranking goes by each card's rank and suit; rank values are not used.
+
+        Building the tables takes a second or so; they are kept for the life of the process (and shared by every
+        ranker without a cache), and can be saved to and loaded from path.
+
+        Alternatively, the ranker can keep its own tables in an ArtifactCache. The flush table is then mapped from the
+        cache's file, and so shared by every process which ranks with it; the other table is read from the file into
+        a dict in each process, as dict lookups are much quicker than searching the mapped keys. Call close to unmap
+        the file when done with the ranker.
+
+        :param path: A file to load the tables from, or to save them to if it doesn't exist yet (optional).
+        :type path: str
+        :param cache: Where to keep the tables, instead of path (optional).
+        :type cache: ArtifactCache
+        """
+
+        self._cache = cache
+        self._mapped = None
+
+        if cache is not None:
+            self._mapped = cache.get(ArtifactCache.key("hand_ranks", DeckSchema.intern().views), self._table_arrays)
+            self._flush_strengths = self._mapped["flush"]
+            self._unsuited_strengths = dict(zip(self._mapped["rank_keys"], self._mapped["unsuited"]))
+
+        else:
+            if HandRanker._tables is None:
+                if path and os.path.exists(path):
+                    with open(path, "rb") as f:
+                        HandRanker._tables = pickle.load(f)
+                else:
+                    HandRanker._tables = self._build_tables()
+
+            if path and not os.path.exists(path):
+                with open(path, "wb") as f:
+                    pickle.dump(HandRanker._tables, f)
+
+            self._flush_strengths, self._unsuited_strengths = HandRanker._tables
+
+        self.schema = DeckSchema.intern()
+
+        suit_count = len(self.schema.suits)
+
+        self._code_rank_keys = tuple(5 ** (code // suit_count) for code in range(len(self.schema)))
+        self._code_rank_bits = tuple(1 << (code // suit_count) for code in range(len(self.schema)))
+        self._code_suits = tuple(code % suit_count for code in range(len(self.schema)))
+
+    def __getstate__(self):
+        if self._cache is None:
+            return self.__dict__
+
+        # the tables are mapped from the cache again, rather than copied to (e.g.) each worker process
+        return self._cache
+
+    def __setstate__(self, state):
+        if isinstance(state, ArtifactCache):
+            self.__init__(cache=state)
+        else:
+            self.__dict__.update(state)
+
+    @staticmethod
+    def _build_tables():
+        flush_strengths = [0] * (1 << 13)
+
+        for rank_mask in range(1 << 13):
+            if bin(rank_mask).count("1") >= 5:
+                flush_strengths[rank_mask] = _flush_strength(rank_mask)
+
+        unsuited_strengths = dict()
+
+        for hand_size in (5, 6, 7):
+            for ranks in combinations_with_replacement(range(13), hand_size):
+                rank_counts = [0] * 13
+
+                for r in ranks:
+                    rank_counts[r] += 1
+
+                if max(rank_counts) <= 4:
+                    unsuited_strengths[sum(5 ** r for r in ranks)] = _best_unsuited_strength(rank_counts)
+
+        return flush_strengths, unsuited_strengths
+
+    @staticmethod
+    def _table_arrays():
+        flush_strengths, unsuited_strengths = HandRanker._tables or HandRanker._build_tables()
+
+        return {
+            "flush": array("I", flush_strengths),
+            "rank_keys": array("Q", unsuited_strengths.keys()),
+            "unsuited": array("I", unsuited_strengths.values())
+        }
+
+    def close(self):
+        """
+        Unmaps the tables of a ranker which keeps them in an ArtifactCache (after which it can't rank any more).
+        """
+
+        if self._mapped is not None:
+            self._flush_strengths = None
+            self._mapped.close()
+            self._mapped = None
+
+    def rank_codes(self, codes):
+        """
+        Returns the strength of a hand of 5 to 7 default deck codes (see Hand.encode).
+
+        :type codes: array | list[int]
+        :rtype: int
+        """
+
+        code_rank_keys = self._code_rank_keys
+        code_rank_bits = self._code_rank_bits
+        code_suits = self._code_suits
+
+        rank_key = 0
+        suit_masks = [0, 0, 0, 0]
+
+        for code in codes:
+            rank_key += code_rank_keys[code]
+            suit_masks[code_suits[code]] |= code_rank_bits[code]
+
+        strength = self._unsuited_strengths[rank_key]
+
+        for rank_mask in suit_masks:
+            if self._flush_strengths[rank_mask] > strength:
+                strength = self._flush_strengths[rank_mask]
+
+        return strength
+
+    def rank(self, cards):
+        """
+        Returns a hand's category (see HAND_CATEGORIES) and strength.
+
+        :type cards: list[Card]
+        :rtype: tuple[str, int]
+        """
+
+        if not 5 <= len(cards) <= 7:
+            raise ValueError(f"Only hands of 5 to 7 cards can be ranked, not {len(cards)}.")
+
+        strength = self.rank_codes(self.schema.encode(cards))
+
+        return self.category(strength), strength
+
+    def rank_wild(self, cards, wild=None):
+        """
+        Returns the category and strength of the best hand which a hand's wild cards (jokers, by default) could make,
+        standing in for cards of the default deck which aren't already in the hand (so, as the ranker has no
+        five-of-a-kind, they never make one).
+
+        Rather than trying every card for every wild card, only substitutions which aren't dominated by another are
+        tried (see _wild_substitutes): cards of rank values the hand has (for sets), cards which complete a straight,
+        the best free cards of suits which could make a flush, and the highest free rank values (for kickers).
+
+        :type cards: list[Card]
+        :param wild: Which cards are wild (optional).
+        :type wild: callable
+        :rtype: tuple[str, int]
+        """
+
+        wild = wild or _is_joker
+
+        if not 5 <= len(cards) <= 7:
+            raise ValueError(f"Only hands of 5 to 7 cards can be ranked, not {len(cards)}.")
+
+        natural_cards = [c for c in cards if not wild(c)]
+        wildcards_count = len(cards) - len(natural_cards)
+
+        if not wildcards_count:
+            return self.rank(cards)
+
+        codes = list(self.schema.encode(natural_cards))
+
+        strength = max(
+            self.rank_codes(codes + list(substitutes))
+            for substitutes in combinations(self._wild_substitutes(codes, wildcards_count), wildcards_count)
+        )
+
+        return self.category(strength), strength
+
+    def _wild_substitutes(self, codes, wildcards_count):
+        """
+        Returns the codes which wild cards are worth trying as, in a hand of codes.
+        """
+
+        suit_count = len(self.schema.suits)
+        rank_count = len(self.schema.ranks)
+
+        held = set(codes)
+        ranks = {code // suit_count for code in codes}
+        suit_counts = Counter(code % suit_count for code in codes)
+
+        def free_suits(rank):
+            return [suit for suit in range(suit_count) if rank * suit_count + suit not in held]
+
+        candidate_ranks = set(ranks)
+
+        # the highest rank values the hand doesn't have, as kickers
+        candidate_ranks.update(sorted(set(range(rank_count)) - ranks, reverse=True)[:wildcards_count])
+
+        # the rank values missing from any straight the wild cards could complete (the lowest of which is ace-low)
+        for low in range(-1, rank_count - 4):
+            straight = {(low + i) % rank_count for i in range(5)}
+
+            if len(straight & ranks) + wildcards_count >= 5:
+                candidate_ranks.update(straight - ranks)
+
+        # suits of which the wild cards could complete a flush
+        flush_suits = [suit for suit in range(suit_count) if suit_counts[suit] + wildcards_count >= 5]
+
+        substitutes = set()
+
+        for rank in candidate_ranks:
+            other_suits = [suit for suit in free_suits(rank) if suit not in flush_suits]
+
+            # suits which can't make a flush are interchangeable, so only as many as there are wild cards are needed
+            for suit in [suit for suit in free_suits(rank) if suit in flush_suits] + other_suits[:wildcards_count]:
+                substitutes.add(rank * suit_count + suit)
+
+        for suit in flush_suits:
+            free_ranks = [rank for rank in range(rank_count - 1, -1, -1) if rank * suit_count + suit not in held]
+
+            for rank in free_ranks[:wildcards_count]:
+                substitutes.add(rank * suit_count + suit)
+
+        return sorted(substitutes)
+
+    @staticmethod
+    def category(strength):
+        return HAND_CATEGORIES[strength >> 20]
+
+    def compare(self, cards, other_cards):
+        """
+        Returns 1 if the first hand is better, -1 if the second is, or 0 if they tie.
+        """
+
+        strength, other_strength = self.rank(cards)[1], self.rank(other_cards)[1]
+
+        return (strength > other_strength) - (strength < other_strength)
+
+    def __call__(self, evaluator):
+        """
+        Returns the strength of an evaluator's hand (at its best, if the evaluator is a WildcardEvaluator), so that a
+        ranker can be used as a scorer.
+        """
+
+        if isinstance(evaluator, WildcardEvaluator):
+            return self.rank_wild(evaluator.cards, evaluator.wild)[1]
+
+        return self.rank(evaluator.cards)[1]
+
+
+class Card:
+    __slots__ = ("rank", "rank_value", "suit", "color", "point_value")
+
+    # incremented whenever a card's rank value is reassigned
+    _revision = 0
+
+    def __init__(self, rank, rank_value, suit, color, point_value=None):
+        """
+        A playing card.
+
+        :param rank: A card's rank (e.g. "Ace").
+        :type rank: str
+        :param rank_value: A rank's value (e.g. 14).
+        :type rank_value: int
+        :param suit: A card's suit.
+        :type suit: str
+        :param color: A card's color.
+        :type color: str
+        :param point_value: A card's point value - if that matters.
+        :type point_value: int
+        """
+
+        self.rank = rank
+        self.rank_value = rank_value
+        self.suit = suit
+        self.color = color
+        self.point_value = point_value
+
+    def __copy__(self):
+        return Card(self.rank, self.rank_value, self.suit, self.color, self.point_value)
+
+    def __deepcopy__(self, memo):
+        # every attribute is an immutable str or int, so a shallow copy is already a deep one
+        return self.__copy__()
+
+    def assign_custom_rank_value(self, custom_ranks_to_rank_values_dict):
+        """
+        :type custom_ranks_to_rank_values_dict: A dictionary mapping card ranks to point values.
+        """
+
+        self.rank_value = custom_ranks_to_rank_values_dict[self.rank]
+
+        # lets hand evaluators know that their counts may be stale
+        Card._revision += 1
+
+
+class CardView:
+    __slots__ = ("schema", "code")
+
+    def __init__(self, schema, code):
+        """
+        A read-only playing card, backed by its code within a DeckSchema. Reads the same as a Card.
+
+        :type schema: DeckSchema
+        :type code: int
+        """
+
+        self.schema = schema
+        self.code = code
+
+    @property
+    def rank(self):
+        return self.schema.code_ranks[self.code]
+
+    @property
+    def rank_value(self):
+        return self.schema.code_rank_values[self.code]
+
+    @property
+    def suit(self):
+        return self.schema.code_suits[self.code]
+
+    @property
+    def color(self):
+        return self.schema.code_colors[self.code]
+
+    @property
+    def point_value(self):
+        return None
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def to_card(self):
+        """
+        Returns a mutable Card with the same attributes.
+        """
+
+        return Card(rank=self.rank, rank_value=self.rank_value, suit=self.suit, color=self.color)
+
+
+class DeckSchema:
+    # schemas by their (suits, ranks) items, so that each distinct deck specification is only described once
+    _interned = dict()
+
+    # the schema of DEFAULT_CARD_SUITS and DEFAULT_CARD_RANKS
+    _default = None
+
+    def __init__(self, suits, ranks):
+        """
+        The suits and ranks of a deck. Each distinct card in the deck is identified by a small integer code
+        (rank index * suit count + suit index), which is also its position in a freshly generated deck. Use
+        DeckSchema.intern rather than constructing schemas directly.
+
+        :type suits: dict[str, str]
+        :type ranks: dict[str, int]
+        """
+
+        self.suits = dict(suits)
+        self.ranks = dict(ranks)
+
+        self.code_ranks = tuple(rank for rank in self.ranks for suit in self.suits)
+        self.code_rank_values = tuple(self.ranks[rank] for rank in self.ranks for suit in self.suits)
+        self.code_suits = tuple(suit for rank in self.ranks for suit in self.suits)
+        self.code_colors = tuple(self.suits[suit] for rank in self.ranks for suit in self.suits)
+
+        self.views = tuple(CardView(self, code) for code in range(len(self.code_ranks)))
+
+        self._codes = {(rank, suit): code for code, (rank, suit) in enumerate(zip(self.code_ranks, self.code_suits))}
+
+        # one of each code, in order: the template which generated hands copy
+        self.template_codes = tuple(range(len(self.views)))
+
+        self._evaluation_cache = None
+        self._batch_evaluator = None
+
+    @classmethod
+    def intern(cls, custom_suits=None, custom_ranks=None):
+        """
+        Returns the shared schema for these suits and ranks, falling back to the default suits/ranks for whichever
+        is unspecified (as Hand does).
+
+        :type custom_suits: dict[str, str]
+        :type custom_ranks: dict[str, int]
+        :rtype: DeckSchema
+        """
+
+        if not custom_suits and not custom_ranks:
+            # most hands are of the default deck, whose schema is looked up without building its key
+            if cls._default is None:
+                cls._default = cls.intern(DEFAULT_CARD_SUITS, DEFAULT_CARD_RANKS)
+
+            return cls._default
+
+        suits = custom_suits if custom_suits else DEFAULT_CARD_SUITS
+        ranks = custom_ranks if custom_ranks else DEFAULT_CARD_RANKS
+
+        key = (tuple(suits.items()), tuple(ranks.items()))
+
+        if key not in cls._interned:
+            cls._interned[key] = cls(suits, ranks)
+
+        return cls._interned[key]
+
+    def __len__(self):
+        return len(self.views)
+
+    def evaluation_cache(self, maxsize=100000):
+        """
+        Returns an EvaluationCache shared by everything which asks this schema for one (created with maxsize, the
+        first time).
+
+        :rtype: EvaluationCache
+        """
+
+        if self._evaluation_cache is None:
+            self._evaluation_cache = EvaluationCache(maxsize)
+
+        return self._evaluation_cache
+
+    def batch_evaluator(self):
+        """
+        Returns a BatchEvaluator (and so its per-code lookup tables) shared by everything which asks this schema for
+        one.
+
+        :rtype: BatchEvaluator
+        """
+
+        if self._batch_evaluator is None:
+            self._batch_evaluator = BatchEvaluator(self)
+
+        return self._batch_evaluator
+
+    def code(self, card):
+        """
+        :type card: Card | CardView
+        :rtype: int
+        """
+
+        return self._codes[(card.rank, card.suit)]
+
+    def encode(self, cards):
+        """
+        :type cards: list[Card | CardView]
+        :rtype: array
+        """
+
+        codes = self._codes
+
+        return array("H", [codes[(c.rank, c.suit)] for c in cards])
+
+    def decode(self, codes):
+        """
+        :type codes: array | list[int]
+        :rtype: list[CardView]
+        """
+
+        views = self.views
+
+        return [views[c] for c in codes]
+
+    def new_cards(self, codes=None):
+        """
+        Returns new, mutable Cards for the given codes (by default, one of each card in the deck).
+
+        :type codes: array | list[int]
+        :rtype: list[Card]
+        """
+
+        if codes is None:
+            codes = range(len(self.views))
+
+        return [
+            Card(
+                rank=self.code_ranks[c],
+                rank_value=self.code_rank_values[c],
+                suit=self.code_suits[c],
+                color=self.code_colors[c],
+            ) for c in codes
+        ]
+
+
+class CardFilter:
+    def __init__(self, ranks=None, suits=None, colors=None, rank_values=None, point_values=None, exclude=False):
+        """
+        A card filter declared by the attributes of the cards it keeps: a card is kept if it matches every criterion
+        which is given. Filters can be called with a card, so they work anywhere a lambda statement does (e.g.
+        Hand.remove_cards, or a Simulator's card_filter); ~card_filter keeps the cards a filter wouldn't.
+
+        Against a fixed table of cards, a filter can be compiled into a mask once (see mask), and then applied to any
+        number of orderings of the table without calling it again (see take, and PermutationDeck.remove_cards).
+
+        :type ranks: collections.abc.Iterable[str]
+        :type suits: collections.abc.Iterable[str]
+        :type colors: collections.abc.Iterable[str]
+        :param rank_values: The lowest and highest rank values to keep (inclusive).
+        :type rank_values: tuple[int, int]
+        :type point_values: collections.abc.Iterable[int]
+        :param exclude: Whether to keep the cards which don't match instead.
+        """
+
+        self.ranks = frozenset(ranks) if ranks is not None else None
+        self.suits = frozenset(suits) if suits is not None else None
+        self.colors = frozenset(colors) if colors is not None else None
+        self.rank_values = tuple(rank_values) if rank_values is not None else None
+        self.point_values = frozenset(point_values) if point_values is not None else None
+        self.exclude = exclude
+
+        # masks by the DeckSchema they were compiled against
+        self._schema_masks = dict()
+
+    def __call__(self, card):
+        return self._matches(card) != self.exclude
+
+    def _matches(self, card):
+        if self.ranks is not None and card.rank not in self.ranks:
+            return False
+
+        if self.suits is not None and card.suit not in self.suits:
+            return False
+
+        if self.colors is not None and card.color not in self.colors:
+            return False
+
+        if self.rank_values is not None and not self.rank_values[0] <= card.rank_value <= self.rank_values[1]:
+            return False
+
+        if self.point_values is not None and card.point_value not in self.point_values:
+            return False
+
+        return True
+
+    def __invert__(self):
+        return CardFilter(self.ranks, self.suits, self.colors, self.rank_values, self.point_values, not self.exclude)
+
+    def mask(self, cards):
+        """
+        Returns a mask over a table of cards, which is 1 where the filter keeps the card.
+
+        :type cards: collections.abc.Sequence[Card | CardView]
+        :rtype: bytes
+        """
+
+        return bytes(map(self, cards))
+
+    def schema_mask(self, schema):
+        """
+        Returns a mask over a DeckSchema's codes (see mask), compiled the first time it's asked for.
+
+        :type schema: DeckSchema
+        :rtype: bytes
+        """
+
+        if schema not in self._schema_masks:
+            self._schema_masks[schema] = self.mask(schema.views)
+
+        return self._schema_masks[schema]
+
+    @staticmethod
+    def take(indexes, mask):
+        """
+        Returns the indexes (into a table of cards, or codes of a schema) which a mask keeps, in order.
+
+        :type indexes: array
+        :type mask: bytes
+        :rtype: array
+        """
+
+        return array(indexes.typecode, compress(indexes, map(mask.__getitem__, indexes)))
+
+
+# the methods which profiling() instruments, by class name (resolved when profiling starts)
+PROFILED_METHODS = {
+    "Hand": (
+        "__init__", "add_cards", "double_cards", "remove_cards", "remove_top_card", "remove_all_cards",
+        "remove_cards_by_rank", "remove_lowest_ranked_card", "remove_lowest_point_value_card", "shuffle",
+        "draw_cards_from_deck"
+    ),
+    "HandEvaluatorMixin": (
+        "__init__", "add_cards", "remove_cards", "has_flush", "has_straight", "has_straight_flush",
+        "has_four_of_a_kind", "has_three_of_a_kind", "has_pair", "has_two_pairs", "has_m_many_n_of_a_kind",
+        "has_cards", "longest_straight", "longest_straight_flush"
+    ),
+    "HistogramPredicate": ("__call__",),
+    "Card": ("__init__", "__copy__")
+}
+
+# the ProfileStats of every profiling() block open in this process, outermost first
+_active_profiles = []
+
+# the originals of the instrumented methods, while any profiling() block is open
+_unprofiled_methods = dict()
+
+# the process which opened the outermost profiling() block
+_profiling_pid = None
+
+
+class ProfileStats:
+    def __init__(self):
+        """
+        How many times each instrumented method was called (e.g. "Card.__init__" counts card allocations, and
+        "Card.__copy__" card copies), and how many seconds were spent in it. Times are inclusive: a has_* method which
+        calls another is timed along with it.
+        """
+
+        self.calls = Counter()
+        self.seconds = Counter()
+
+    def snapshot(self):
+        """
+        Returns the stats as plain dicts, e.g. to send from a worker process, or to log.
+
+        :rtype: dict[str, dict[str, int | float]]
+        """
+
+        return {"calls": dict(self.calls), "seconds": dict(self.seconds)}
+
+    def merge(self, snapshot):
+        """
+        Adds the stats of a snapshot (e.g. from another process) to these.
+
+        :type snapshot: dict[str, dict[str, int | float]]
+        """
+
+        self.calls.update(snapshot["calls"])
+        self.seconds.update(snapshot["seconds"])
+
+    def per(self, hands):
+        """
+        Returns the stats divided by a number of simulated hands, to compare the cost of runs of different sizes.
+
+        :rtype: dict[str, dict[str, float]]
+        """
+
+        return {
+            "calls": {name: calls / hands for name, calls in self.calls.items()},
+            "seconds": {name: seconds / hands for name, seconds in self.seconds.items()}
+        }
+
+
+@contextmanager
+def profiling():
+    """
+    Counts and times calls to the methods in PROFILED_METHODS within the block, yielding the ProfileStats they're
+    recorded in. Simulations run in other processes (see Simulator.run) profile their chunks too, and their stats are
+    merged in. Blocks can be nested; each gets the calls made within it.
+
+    The methods are only replaced by instrumented ones while a block is open (in the process which opened it, not in
+    processes forked from it), so profiling costs nothing otherwise.
+
+    :rtype: collections.abc.Iterator[ProfileStats]
+    """
+
+    global _profiling_pid
+
+    stats = ProfileStats()
+
+    if not _unprofiled_methods:
+        _profiling_pid = os.getpid()
+        _instrument()
+
+    _active_profiles.append(stats)
+
+    try:
+        yield stats
+    finally:
+        _active_profiles.remove(stats)
+
+        if not _active_profiles:
+            _uninstrument()
+
+
+def _instrument():
+    for class_name, method_names in PROFILED_METHODS.items():
+        cls = globals()[class_name]
+
+        for method_name in method_names:
+            method = cls.__dict__[method_name]
+
+            _unprofiled_methods[(cls, method_name)] = method
+            setattr(cls, method_name, _profiled(method, f"{class_name}.{method_name}"))
+
+
+def _uninstrument():
+    for (cls, method_name), method in _unprofiled_methods.items():
+        setattr(cls, method_name, method)
+
+    _unprofiled_methods.clear()
+
+
+def _forget_profiling():
+    """
+    Runs in a process forked within a profiling() block (e.g. a pool's worker): the blocks open in the parent, and the
+    stats they record in, aren't the child's - so it starts unprofiled, and only profiles the blocks it opens itself.
+    """
+
+    _active_profiles.clear()
+
+    if _unprofiled_methods:
+        _uninstrument()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_profiling)
+
+
+def _profiled(method, name):
+    @wraps(method)
+    def profiled(*args, **kwargs):
+        start = perf_counter()
+
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+
+            for stats in _active_profiles:
+                stats.calls[name] += 1
+                stats.seconds[name] += elapsed
+
+    return profiled
+
+
+def _run_profiled(function, iterations, seed):
+    """
+    Runs a simulation chunk, returning its result along with a snapshot of its stats if it ran in another process
+    than the one profiling it (or None if it ran in the same one, where the stats were recorded directly).
+    """
+
+    if os.getpid() == _profiling_pid and _active_profiles:
+        return function(iterations, seed), None
+
+    with profiling() as stats:
+        result = function(iterations, seed)
+
+    return result, stats.snapshot()
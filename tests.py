@@ -1,5 +1,20 @@
 import unittest
-from models import Deck, Card, Hand
+from array import array
+from random import Random
+from operator import methodcaller
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import combinations, count
+from fractions import Fraction
+import os
+import json
+import multiprocessing
+import pickle
+import tempfile
+from models import Deck, Card, Hand, HandEvaluatorMixin, DeckSchema, BatchEvaluator, Simulator, SimulationResult
+from models import exact_probability, NOfAKindPredicate, StraightPredicate, FlushPredicate
+from models import HandRanker, EvaluationCache, suit_isomorphism_classes, total_value_distribution, Showdown
+from models import PermutationDeck, CardFilter, ArtifactCache, profiling, HandPattern, PatternSet
+from models import JSONLinesSink, CSVSink, BinarySink, WildcardEvaluator
 
 
 class HandEvaluations(unittest.TestCase):
@@ -117,26 +132,1211 @@ class HandEvaluations(unittest.TestCase):
 
         self.assertTrue(deck.evaluator.has_straight(7))
 
+    def assertEvaluatorIsCurrent(self, hand):
+        rebuilt = HandEvaluatorMixin(list(hand.cards))
+
+        self.assertEqual(hand.evaluator.suits_histogram, rebuilt.suits_histogram)
+        self.assertEqual(hand.evaluator.rank_values_histogram, rebuilt.rank_values_histogram)
+        self.assertEqual(hand.evaluator.all_card_ranks, rebuilt.all_card_ranks)
+        self.assertEqual(hand.evaluator.all_card_colors, rebuilt.all_card_colors)
+
+    def test_evaluator_tracks_mutations(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        hand = Hand.empty()
+
+        deck.double_cards()
+        self.assertEvaluatorIsCurrent(deck)
+        self.assertEqual(deck.evaluator.rank_values_histogram[14], 4)
+
+        deck.shuffle()
+        deck.remove_cards(lambda_statement=lambda x: x.rank != "A", index=13)
+        self.assertEvaluatorIsCurrent(deck)
+        self.assertNotIn(14, deck.evaluator.all_card_rank_values)
+
+        hand.draw_cards_from_deck(deck, 5)
+        self.assertEvaluatorIsCurrent(hand)
+        self.assertEvaluatorIsCurrent(deck)
+
+        deck.remove_cards_by_rank(["2", "3"])
+        hand.remove_lowest_ranked_card()
+        self.assertEvaluatorIsCurrent(hand)
+        self.assertEvaluatorIsCurrent(deck)
+
+    def test_evaluator_tracks_reassigned_rank_values(self):
+        deck = Deck()
+        ranks_to_rank_values = {c.rank: c.rank_value for c in deck.cards}
+        ranks_to_rank_values["A"] = 1
+
+        for card in deck.cards:
+            card.assign_custom_rank_value(ranks_to_rank_values)
+
+        deck.remove_top_card()
+
+        self.assertEvaluatorIsCurrent(deck)
+        self.assertEqual(deck.evaluator.rank_values_histogram[1], 4)
+        self.assertNotIn(14, deck.evaluator.all_card_rank_values)
+
+    def test_decks_share_interned_schema(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+
+        self.assertIs(deck.schema, Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"}).schema)
+        self.assertIs(deck.schema, DeckSchema.intern(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"}))
+        self.assertIsNot(deck.schema, Deck().schema)
+        self.assertEqual(deck.encode(), array("H", range(26)))
+
+    def test_hands_generate_their_cards_lazily(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        ranks_to_rank_values = {c.rank: c.rank_value for c in deck.cards}
+        ranks_to_rank_values["A"] = 1
+
+        for card in deck.cards:
+            card.assign_custom_rank_value(ranks_to_rank_values)
+
+        fresh_deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+
+        self.assertEqual(fresh_deck.encode(), deck.encode())
+        self.assertEqual(fresh_deck.evaluator.rank_values_histogram[14], 2)
+        self.assertTrue(all(c is not d for c, d in zip(fresh_deck.cards, deck.cards)))
+
+        with profiling() as stats:
+            for _ in range(100):
+                Hand().remove_all_cards()
+
+                unread_deck = Deck()
+                unread_deck.double_cards()
+                unread_deck.shuffle(seed=5)
+                unread_deck.get_sample_hand(5).draw_cards_from_deck(unread_deck, 5)
+
+            Deck.empty()
+            hand = Hand.empty(fresh_deck.schema)
+
+        self.assertNotIn("Card.__init__", stats.calls)
+        self.assertNotIn("HandEvaluatorMixin.__init__", stats.calls)
+        self.assertEqual(stats.calls["Hand.__init__"], 200)
+
+        # hands whose cards haven't been read change just as those whose cards have
+        read_deck, unread_deck = Deck(), Deck()
+        read_hand, unread_hand = Hand.empty(read_deck.schema), Hand.empty(unread_deck.schema)
+        self.assertEqual(len(read_deck.cards), 52)
+
+        for some_deck, some_hand in ((read_deck, read_hand), (unread_deck, unread_hand)):
+            self.assertEqual(some_deck.evaluator.rank_values_histogram[2], 4)
+
+            some_deck.double_cards()
+            some_deck.shuffle(seed=5)
+            some_deck.remove_cards_by_rank(["2"])
+            some_deck.remove_top_card()
+            some_deck.remove_cards(index=80)
+            some_hand.draw_cards_from_deck(some_deck, 7)
+            some_hand.evaluator.has_pair()
+
+        self.assertNotIn("cards", vars(unread_deck))
+        self.assertNotIn("cards", vars(unread_hand))
+        self.assertEqual(unread_deck.encode(), read_deck.encode())
+        self.assertEqual(unread_hand.encode(), read_hand.encode())
+        self.assertEqual(str(unread_hand), str(read_hand))
+        self.assertEqual(unread_hand.get_total_rank_values(), read_hand.get_total_rank_values())
+        self.assertEqual(unread_deck.evaluator.rank_values_histogram, read_deck.evaluator.rank_values_histogram)
+        self.assertEqual(unread_hand.evaluator.suits_histogram, read_hand.evaluator.suits_histogram)
+
+        self.assertEvaluatorIsCurrent(unread_deck)
+        self.assertEvaluatorIsCurrent(unread_hand)
+        self.assertEqual([c.rank for c in unread_deck.cards], [c.rank for c in read_deck.cards])
+
+        unread_deck.cards[0].assign_custom_rank_value({unread_deck.cards[0].rank: 20})
+        self.assertEqual(unread_deck.evaluator.rank_values_histogram[20], 1)
+
+        hand.draw_cards_from_deck(fresh_deck, 3)
+        self.assertEqual(hand.encode(), array("H", range(3)))
+        self.assertEvaluatorIsCurrent(hand)
+        self.assertEvaluatorIsCurrent(fresh_deck)
+
+        self.assertEqual(Hand.empty().cards, [])
+        self.assertEqual(len(Hand.from_codes([], deck.schema).encode()), 0)
+        self.assertEqual(Hand.empty().canonicalize(DeckSchema.intern().suits)[0].cards, [])
+
+    def test_encoded_hands_read_like_cards(self):
+        deck = Deck()
+        deck.double_cards()
+        deck.shuffle()
+
+        hand = Hand.from_codes(deck.encode()[0:13], deck.schema)
+
+        self.assertEqual(str(hand), " ".join(f"{c.rank}{c.suit}" for c in deck.cards[0:13]))
+        self.assertEqual([c.color for c in hand.cards], [c.color for c in deck.cards[0:13]])
+        self.assertEqual(
+            hand.evaluator.rank_values_histogram, HandEvaluatorMixin(deck.cards[0:13]).rank_values_histogram
+        )
+        self.assertFalse(hasattr(deck.cards[0], "__dict__"))
+
+    def test_doubled_cards_are_copies(self):
+        deck = Deck()
+        deck.double_cards()
+
+        deck.cards[0].assign_custom_rank_value({"2": 20})
+
+        self.assertEqual(deck.cards[52].rank, deck.cards[0].rank)
+        self.assertEqual(deck.cards[52].rank_value, 2)
+
+    def test_batch_evaluator_matches_evaluator(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
+        codes = deck.encode()
+
+        rng = Random(0)
+        hands = [array("H", rng.sample(codes, 13)) for _ in range(300)]
+        evaluators = [Hand.from_codes(h, deck.schema).evaluator for h in hands]
+
+        batch_evaluator = BatchEvaluator(deck.schema)
+        results = batch_evaluator.evaluate(hands, flush_cards_count=8, straight_cards_count=4, matching_sets=(3, 2))
+
+        self.assertEqual(results["flush"], [e.has_flush(8) for e in evaluators])
+        self.assertEqual(results["straight"], [e.has_straight(4) for e in evaluators])
+        self.assertEqual(results["four_of_a_kind"], [e.has_four_of_a_kind() for e in evaluators])
+        self.assertEqual(results["three_of_a_kind"], [e.has_three_of_a_kind() for e in evaluators])
+        self.assertEqual(results["pair"], [e.has_pair() for e in evaluators])
+        self.assertEqual(results["two_pairs"], [e.has_two_pairs() for e in evaluators])
+        self.assertEqual(results["m_many_n_of_a_kind"], [e.has_m_many_n_of_a_kind(3, 2) for e in evaluators])
+
+        for cards_count in range(0, 10):
+            self.assertEqual(
+                batch_evaluator.has_straight(hands, cards_count), [e.has_straight(cards_count) for e in evaluators]
+            )
+
+    def test_pattern_sets_match_evaluator(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
+
+        pattern_set = PatternSet({
+            "pair": HandPattern.sets(1, 2),
+            "two_pairs": HandPattern.sets(2, 2),
+            "three_of_a_kind": HandPattern.sets(1, 3),
+            "flush": HandPattern.same_suit(4),
+            "straight": HandPattern.run(3),
+            "long_straight": HandPattern.run(8),
+            "straight_flush": HandPattern.same_suit_run(3),
+            "low_total": HandPattern.total(0, 60)
+        })
+
+        def expected(evaluator):
+            return (
+                evaluator.has_pair(),
+                evaluator.has_two_pairs(),
+                evaluator.has_three_of_a_kind(),
+                evaluator.has_flush(4),
+                evaluator.has_straight(3),
+                evaluator.has_straight(8),
+                evaluator.has_straight_flush(3),
+                0 <= evaluator.get_total_rank_values() <= 60
+            )
+
+        hands = list(Simulator(deck, 7, {}).samples(300, seed=22))
+        hands.append([])
+        evaluators = [HandEvaluatorMixin(list(cards)) for cards in hands]
+
+        self.assertEqual([pattern_set(e) for e in evaluators], [expected(e) for e in evaluators])
+        self.assertEqual(pattern_set.evaluate(hands), [expected(e) for e in evaluators])
+        self.assertEqual(
+            pattern_set.evaluate_codes([deck.schema.encode(cards) for cards in hands], deck.schema),
+            [expected(e) for e in evaluators]
+        )
+        self.assertIs(deck.schema.batch_evaluator(), deck.schema.batch_evaluator())
+
+        answers = pattern_set(evaluators[0])
+        self.assertEqual(answers.flush, evaluators[0].has_flush(4))
+        self.assertEqual(
+            pattern_set.bits(evaluators[0]), sum(1 << i for i, answer in enumerate(answers) if answer)
+        )
+        self.assertEqual(pattern_set.evaluate(hands[0:1], bits=True), [pattern_set.bits(evaluators[0])])
+
+        # wild cards aren't in the histograms, so wildcard evaluators are answered with their own queries
+        joker = Card(rank="JOKER", rank_value=0, suit="🃏", color="NONE")
+        wildcard_evaluators = [WildcardEvaluator(list(cards[0:5]) + [joker]) for cards in hands[0:50]]
+
+        self.assertEqual([pattern_set(e) for e in wildcard_evaluators], [expected(e) for e in wildcard_evaluators])
+        self.assertNotEqual(
+            [pattern_set(e) for e in wildcard_evaluators],
+            [pattern_set(HandEvaluatorMixin(e.cards)) for e in wildcard_evaluators]
+        )
+
+        with self.assertRaises(ValueError):
+            PatternSet({"nothing": HandPattern("nothing", 1, None)})
+
+    def test_simulator_estimates_probabilities(self):
+        deck = Deck(custom_ranks={"2": 2, "3": 3}, custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+
+        simulator = Simulator(
+            deck=deck,
+            draw_count=2,
+            predicates={"pair": lambda e: e.has_pair(), "flush": lambda e: e.has_flush(2)}
+        )
+
+        result = simulator.run(30000)
+        low, high = result.confidence_interval("pair")
+
+        self.assertEqual(result.iterations, 30000)
+        self.assertAlmostEqual(result.probability("pair"), 1 / 3, delta=0.02)
+        self.assertAlmostEqual(result.probability("flush"), 1 / 3, delta=0.02)
+        self.assertTrue(low < result.probability("pair") < high)
+
+        empty = simulator.run(0)
+
+        for method in (methodcaller("probability", "pair"), methodcaller("confidence_interval", "pair"),
+                       methodcaller("confidence_interval", "pair", method="clopper-pearson")):
+            with self.assertRaises(ValueError):
+                method(empty)
+
+    def test_simulator_applies_card_filter(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
+
+        simulator = Simulator(deck=deck, draw_count=48, predicates={}, card_filter=lambda x: x.rank != "A")
+
+        for cards in simulator.samples(10):
+            self.assertEqual(len(cards), 48)
+            self.assertEqual(len(set(map(id, cards))), 48)
+            self.assertNotIn("A", {c.rank for c in cards})
+
+        with self.assertRaises(ValueError):
+            Simulator(deck=deck, draw_count=49, predicates={}, card_filter=lambda x: x.rank != "A")
+
+    def test_seeded_simulations_are_reproducible(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
+
+        simulator = Simulator(
+            deck=deck,
+            draw_count=13,
+            predicates={"two_pairs": methodcaller("has_two_pairs"), "straight": methodcaller("has_straight", 5)},
+            card_filter=lambda x: x.rank != "A"
+        )
+
+        result = simulator.run(2000, seed=7)
+
+        self.assertEqual(result.hits, simulator.run(2000, seed=7).hits)
+        self.assertEqual(result.iterations, 2000)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            threaded = simulator.run(2000, seed=7, workers=3, executor=executor)
+
+            self.assertEqual(threaded.hits, simulator.run(2000, seed=7, workers=3, executor=executor).hits)
+        self.assertEqual(threaded.iterations, 2000)
+
+        shuffled, reshuffled = Deck(), Deck()
+        shuffled.shuffle(seed=7)
+        reshuffled.shuffle(seed=7)
+
+        self.assertEqual(str(shuffled), str(reshuffled))
+
+    def test_simulator_runs_until_precise(self):
+        deck = Deck()
+        simulator = Simulator(deck=deck, draw_count=5, predicates={"pair": methodcaller("has_pair")})
+
+        result = simulator.run_until(half_width=0.01, batch_size=1000, seed=19)
+        lower, upper = result.confidence_interval("pair")
+
+        self.assertEqual(result.iterations % 1000, 0)
+        self.assertLessEqual(max(result.probability("pair") - lower, upper - result.probability("pair")), 0.01)
+        self.assertGreater(result.iterations, 1000)
+        self.assertEqual(result.hits, simulator.run_until(half_width=0.01, batch_size=1000, seed=19).hits)
+
+        # every batch runs in the same pool of worker processes
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(
+                simulator.run_until(half_width=0.02, batch_size=1000, seed=19, workers=2).hits,
+                simulator.run_until(half_width=0.02, batch_size=1000, seed=19, workers=2, executor=executor).hits
+            )
+
+        result = simulator.run_until(
+            relative_error=0.01, method="clopper-pearson", batch_size=1000, max_iterations=2500
+        )
+        self.assertEqual(result.iterations, 2500)
+
+        with self.assertRaises(ValueError):
+            simulator.run_until()
+
+        with self.assertRaises(ValueError):
+            simulator.run_until(half_width=0.01, batch_size=0)
+
+    def test_clopper_pearson_intervals(self):
+        result = SimulationResult(100, {"some": 5, "none": 0, "all": 100})
+
+        lower, upper = result.confidence_interval("some", method="clopper-pearson")
+        self.assertAlmostEqual(lower, 0.016432, places=6)
+        self.assertAlmostEqual(upper, 0.112835, places=6)
+
+        self.assertEqual(result.confidence_interval("none", method="clopper-pearson")[0], 0.0)
+        self.assertAlmostEqual(result.confidence_interval("none", method="clopper-pearson")[1], 0.036217, places=6)
+        self.assertEqual(result.confidence_interval("all", method="clopper-pearson")[1], 1.0)
+
+        wilson = result.confidence_interval("some")
+        self.assertTrue(lower < wilson[0] < wilson[1] < upper)
+
+    def test_variance_reduced_estimates(self):
+        deck = Deck()
+
+        simulator = Simulator(
+            deck=deck,
+            draw_count=5,
+            predicates={"four_of_a_kind": methodcaller("has_four_of_a_kind"), "straight": methodcaller("has_straight")}
+        )
+
+        four_of_a_kind = float(exact_probability(deck, 5, NOfAKindPredicate(1, 4)))
+        straight = float(exact_probability(deck, 5, StraightPredicate(5)))
+
+        # the rank multiplicity class of a hand decides whether it has a four-of-a-kind
+        stratified = simulator.run_stratified(1000, seed=20)
+        self.assertAlmostEqual(stratified["four_of_a_kind"].value, four_of_a_kind)
+        self.assertEqual(stratified["four_of_a_kind"].standard_error, 0)
+        self.assertLess(abs(stratified["straight"].value - straight), 4 * stratified["straight"].standard_error)
+
+        # drawing sets more often needs at least 10 times fewer hands than plain sampling for the same precision
+        importance = simulator.run_importance(2000, tilt=5, seed=20)["four_of_a_kind"]
+        plain_standard_error = (four_of_a_kind * (1 - four_of_a_kind) / 2000) ** 0.5
+
+        self.assertLess(abs(importance.value - four_of_a_kind), 4 * importance.standard_error)
+        self.assertLess(importance.standard_error, plain_standard_error / 10 ** 0.5)
+
+        antithetic = simulator.run_antithetic(2000, seed=20)["straight"]
+        self.assertEqual(antithetic.hands, 2000)
+        self.assertLess(abs(antithetic.value - straight), 4 * antithetic.standard_error)
+
+        lower, upper = antithetic.confidence_interval()
+        self.assertTrue(lower < antithetic.value < upper)
+
+        with self.assertRaises(ValueError):
+            Simulator(deck=deck, draw_count=27, predicates={}).run_antithetic(10)
+
+    def test_profiling_counts_and_times_calls(self):
+        unprofiled_add_cards = Hand.add_cards
+
+        with profiling() as stats:
+            deck = Deck()
+            deck.double_cards()
+
+            with profiling() as inner_stats:
+                hand = Hand(custom_cards=deck.cards[0:5])
+                hand.evaluator.has_pair()
+                NOfAKindPredicate(1, 4)(hand.evaluator)
+
+            simulator = Simulator(deck=deck, draw_count=5, predicates={"pair": methodcaller("has_pair")})
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                simulator.run(100, seed=21, workers=2, executor=executor)
+
+            simulator.run(100, seed=21, workers=2)
+
+        self.assertIs(Hand.add_cards, unprofiled_add_cards)
+
+        # the doubled deck's codes are only made into (104) Cards when they're first read, and its evaluator is never
+        # needed
+        self.assertNotIn("Card.__copy__", stats.calls)
+        self.assertEqual(stats.calls["Card.__init__"], 104)
+        self.assertEqual(stats.calls["Hand.__init__"], 2)
+        self.assertEqual(stats.calls["HandEvaluatorMixin.__init__"], 1 + 200)
+        self.assertEqual(stats.calls["HandEvaluatorMixin.has_pair"], 1 + 200)
+        self.assertGreater(stats.seconds["Hand.double_cards"], 0)
+
+        self.assertEqual(inner_stats.calls["Hand.__init__"], 1)
+        self.assertEqual(inner_stats.calls["Card.__init__"], 104)
+        self.assertEqual(inner_stats.calls["HistogramPredicate.__call__"], 1)
+        self.assertNotIn("Hand.double_cards", inner_stats.calls)
+
+        self.assertEqual(stats.per(200)["calls"]["HandEvaluatorMixin.has_pair"], 201 / 200)
+        self.assertEqual(stats.snapshot()["calls"]["Card.__init__"], 104)
+
+    @unittest.skipUnless(hasattr(os, "register_at_fork"), "Workers are only forked on POSIX.")
+    def test_profiling_leaves_forked_workers_unprofiled(self):
+        simulator = Simulator(deck=Deck(), draw_count=5, predicates={"pair": methodcaller("has_pair")})
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+            # the worker is forked within the block, while the methods are instrumented
+            with profiling() as stats:
+                simulator.run(100, seed=21, executor=pool)
+
+            self.assertEqual(stats.calls["HandEvaluatorMixin.has_pair"], 100)
+            self.assertFalse(pool.submit(hasattr, Hand.add_cards, "__wrapped__").result())
+
+    def test_simulations_stream_to_sinks_and_resume(self):
+        predicates = {"pair": methodcaller("has_pair"), "flush": methodcaller("has_flush", 4)}
+        simulator = Simulator(Deck(), 5, predicates)
+        calls = count()
+
+        def interrupted_pair(evaluator):
+            if next(calls) == 220:
+                raise RuntimeError("Interrupted.")
+
+            return evaluator.has_pair()
+
+        interrupted_simulator = Simulator(Deck(), 5, {"pair": interrupted_pair, "flush": predicates["flush"]})
+
+        with tempfile.TemporaryDirectory() as directory:
+            for sink_class in (JSONLinesSink, CSVSink, BinarySink):
+                for record_hands in (False, True):
+                    path = os.path.join(directory, f"{sink_class.__name__}-{record_hands}")
+                    resumed_path = f"{path}-resumed"
+
+                    result = simulator.run_batches(250, sink_class(path), 100, seed=25, record_hands=record_hands)
+
+                    calls = count()
+
+                    with self.assertRaises(RuntimeError):
+                        interrupted_simulator.run_batches(
+                            250, sink_class(resumed_path), 100, seed=25, record_hands=record_hands
+                        )
+
+                    # as if the interruption came partway through writing the third batch
+                    with open(resumed_path, "ab") as f:
+                        f.write(b"partial batch")
+
+                    resumed = simulator.run_batches(250, sink_class(resumed_path), 100, record_hands=record_hands)
+
+                    self.assertEqual(resumed.hits, result.hits)
+                    self.assertEqual(resumed.iterations, 250)
+
+                    with open(path, "rb") as f, open(resumed_path, "rb") as resumed_f:
+                        self.assertEqual(f.read(), resumed_f.read())
+
+                    with self.assertRaises(ValueError):
+                        simulator.run_batches(250, sink_class(resumed_path), 100, seed=26, record_hands=record_hands)
+
+                    with open(f"{resumed_path}.checkpoint", encoding="utf-8") as f:
+                        checkpoint = json.load(f)
+
+                    self.assertEqual(checkpoint["batches"], 3)
+                    self.assertEqual(checkpoint["hits"], list(result.hits.values()))
+
+                    os.remove(resumed_path)
+
+                    with self.assertRaises(ValueError):
+                        simulator.run_batches(250, sink_class(resumed_path), 100, record_hands=record_hands)
+
+                # predicates named by ints, which a JSON checkpoint would key by strings
+                straights_path = os.path.join(directory, f"{sink_class.__name__}-straights")
+                straights_resumed_path = f"{straights_path}-resumed"
+
+                def interrupted_straight(evaluator):
+                    if next(calls) == 220:
+                        raise RuntimeError("Interrupted.")
+
+                    return evaluator.has_straight(3)
+
+                straights_simulator = Simulator(Deck(), 5, {2: StraightPredicate(2), 3: StraightPredicate(3)})
+                straights = straights_simulator.run_batches(250, sink_class(straights_path), 100, seed=25)
+
+                calls = count()
+
+                with self.assertRaises(RuntimeError):
+                    Simulator(Deck(), 5, {2: StraightPredicate(2), 3: interrupted_straight}).run_batches(
+                        250, sink_class(straights_resumed_path), 100, seed=25
+                    )
+
+                resumed = straights_simulator.run_batches(250, sink_class(straights_resumed_path), 100)
+
+                self.assertEqual(resumed.hits, straights.hits)
+                self.assertEqual(list(resumed.hits), [2, 3])
+
+            header, batches = BinarySink.read(os.path.join(directory, "BinarySink-True"))
+            batches = list(batches)
+
+            self.assertEqual(header["predicates"], ["pair", "flush"])
+            self.assertEqual([b.index for b in batches], [0, 1, 2])
+            self.assertEqual(SimulationResult.merge([b.result for b in batches]).hits, result.hits)
+
+            for b in batches:
+                self.assertEqual(len(b.codes), 5 * b.result.iterations)
+
+                for i, hand_bits in enumerate(b.bits):
+                    evaluator = HandEvaluatorMixin([simulator.cards[k] for k in b.codes[i * 5:i * 5 + 5]])
+
+                    self.assertEqual(hand_bits, evaluator.has_pair() | evaluator.has_flush(4) << 1)
+
+    def test_simulator_runs_in_worker_processes(self):
+        deck = Deck(custom_ranks={"2": 2, "3": 3, "4": 4}, custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+
+        simulator = Simulator(deck=deck, draw_count=3, predicates={"pair": methodcaller("has_pair")})
+
+        result = simulator.run(3000, seed=11, workers=2)
+
+        self.assertEqual(result.iterations, 3000)
+        self.assertEqual(result.hits, simulator.run(3000, seed=11, workers=2).hits)
+        self.assertEqual(simulator.tally(methodcaller("get_total_rank_values"), 300, seed=3, workers=2).total(), 300)
+
+    def test_exact_probability_matches_enumeration(self):
+        deck = Deck(
+            custom_ranks={"2": 2, "3": 3, "4": 4, "6": 6, "7": 7},
+            custom_suits={"𓆏": "GREEN", "𓃰": "GREY"}
+        )
+        deck.double_cards()
+
+        hands = [HandEvaluatorMixin(list(cards)) for cards in combinations(deck.cards, 6)]
+
+        for predicate in [
+            NOfAKindPredicate(1, 3),
+            NOfAKindPredicate(2, 2),
+            StraightPredicate(3),
+            StraightPredicate(1),
+            FlushPredicate(4),
+        ]:
+            self.assertEqual(
+                exact_probability(deck, 6, predicate),
+                Fraction(len([e for e in hands if predicate(e)]), len(hands))
+            )
+
+        self.assertEqual(exact_probability(deck, 6, StraightPredicate(4)), 0)
+        filtered_hands = [
+            HandEvaluatorMixin(list(cards)) for cards in combinations([c for c in deck.cards if c.rank != "7"], 6)
+        ]
+
+        self.assertEqual(
+            exact_probability(deck, 6, NOfAKindPredicate(1, 3), card_filter=lambda x: x.rank != "7"),
+            Fraction(len([e for e in filtered_hands if e.has_three_of_a_kind()]), len(filtered_hands))
+        )
+
+    def test_exact_probability_falls_back_to_sampling(self):
+        deck = Deck(custom_ranks={"2": 2, "3": 3}, custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+
+        probability = exact_probability(deck, 2, lambda e: e.has_pair(), iterations=20000, seed=1)
+
+        self.assertIsInstance(probability, float)
+        self.assertAlmostEqual(probability, 1 / 3, delta=0.02)
+
+    def test_hand_ranker_ranks_hands(self):
+        def cards(*names):
+            return [Card(rank=n[:-1], rank_value=0, suit=n[-1], color="") for n in names]
+
+        ranker = HandRanker()
+
+        self.assertEqual(ranker.rank(cards("A♠", "2♠", "3♠", "4♠", "5♠"))[0], "STRAIGHT_FLUSH")
+        self.assertEqual(ranker.rank(cards("A♠", "A♡", "3♠", "3♢", "3♣", "K♢"))[0], "FULL_HOUSE")
+        self.assertEqual(ranker.rank(cards("2♠", "7♠", "9♠", "J♠", "K♠", "K♡", "K♢"))[0], "FLUSH")
+        self.assertEqual(ranker.rank(cards("10♠", "J♡", "Q♢", "K♣", "A♣", "2♢", "2♡"))[0], "STRAIGHT")
+        self.assertEqual(ranker.rank(cards("2♠", "2♡", "5♢", "5♣", "9♣", "9♢", "K♡"))[0], "TWO_PAIRS")
+
+        self.assertEqual(
+            ranker.compare(cards("A♠", "A♡", "9♢", "8♣", "4♣"), cards("A♢", "A♣", "9♠", "8♡", "3♡")), 1
+        )
+        self.assertEqual(
+            ranker.compare(cards("A♠", "2♠", "3♢", "4♣", "5♣"), cards("2♢", "3♣", "4♡", "5♡", "6♡")), -1
+        )
+        self.assertEqual(
+            ranker.compare(cards("A♠", "K♠", "Q♢", "J♣", "9♣"), cards("A♢", "K♣", "Q♡", "J♡", "9♡")), 0
+        )
+
+        rng = Random(5)
+
+        for _ in range(200):
+            codes = rng.sample(range(52), 7)
+
+            self.assertEqual(
+                ranker.rank_codes(codes),
+                max(ranker.rank_codes(five_codes) for five_codes in combinations(codes, 5))
+            )
+
+        with self.assertRaises(ValueError):
+            ranker.rank(cards("A♠", "A♡", "9♢", "8♣"))
+
+    def test_hand_ranker_saves_and_loads_tables(self):
+        self.addCleanup(setattr, HandRanker, "_tables", HandRanker._tables)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "hand_ranks.pickle")
+
+            built = HandRanker(path=path)
+
+            self.assertTrue(os.path.exists(path))
+
+            # otherwise the tables already built would be reused, rather than loaded from path
+            HandRanker._tables = None
+            loaded = HandRanker(path=path)
+
+            self.assertIsNotNone(HandRanker._tables)
+            self.assertIsNot(loaded._unsuited_strengths, built._unsuited_strengths)
+            self.assertEqual(loaded._unsuited_strengths, built._unsuited_strengths)
+            self.assertEqual(loaded.rank_codes(range(0, 20, 4)), built.rank_codes(range(0, 20, 4)))
+
+    def test_artifact_cache_maps_stored_arrays(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ArtifactCache(directory)
+            builds = []
+
+            def build():
+                builds.append(1)
+                return {"counts": array("Q", [1, 2 ** 40]), "totals": array("q", [-3]), "empty": array("d")}
+
+            key = ArtifactCache.key("test", Deck().cards, 5)
+
+            for _ in range(2):
+                arrays = cache.get(key, build)
+
+                self.assertEqual(list(arrays["counts"]), [1, 2 ** 40])
+                self.assertEqual(list(arrays["totals"]), [-3])
+                self.assertEqual(len(arrays["empty"]), 0)
+
+            self.assertEqual(len(builds), 1)
+
+            doubled = Deck()
+            doubled.double_cards()
+
+            self.assertNotEqual(ArtifactCache.key("test", doubled.cards, 5), key)
+            self.assertEqual(ArtifactCache.key("test", list(reversed(Deck().cards)), 5), key)
+
+            with open(cache.path(key), "r+b") as f:
+                f.write(b"\0" * 4)
+
+            self.assertIsNone(cache.load(key))
+            self.assertEqual(list(cache.get(key, build)["totals"]), [-3])
+            self.assertEqual(len(builds), 2)
+
+            with self.assertRaises(ValueError):
+                cache.store(key, {"a_very_long_array_name": array("B")})
+
+            deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+            deck.double_cards()
+
+            for _ in range(2):
+                self.assertEqual(
+                    exact_probability(deck, 13, NOfAKindPredicate(1, 4), cache=cache),
+                    exact_probability(deck, 13, NOfAKindPredicate(1, 4))
+                )
+                self.assertEqual(
+                    total_value_distribution(deck, 5, cache=cache).counts, total_value_distribution(deck, 5).counts
+                )
+
+            shared_tables = HandRanker._tables
+            ranker = HandRanker(cache=cache)
+            unpickled = pickle.loads(pickle.dumps(ranker))
+
+            # rankers with a cache keep their own tables, rather than replacing those every other ranker shares
+            self.assertIs(HandRanker._tables, shared_tables)
+            self.assertEqual(unpickled.rank_codes(range(0, 28, 4)), HandRanker().rank_codes(range(0, 28, 4)))
+            self.assertEqual(len(os.listdir(directory)), 4)
+
+            ranker.close()
+            unpickled.close()
+
+            self.assertTrue(ranker._mapped is None and unpickled._mapped is None)
+
+            with cache.load(key) as arrays:
+                self.assertEqual(list(arrays["totals"]), [-3])
+
+            self.assertTrue(arrays.mapped.closed)
+
+    def test_straights_with_non_contiguous_rank_values(self):
+        deck = Deck(
+            custom_ranks={"A": 1, "3": 3, "4": 4, "5": 5, "7": 7, "J": 10, "Q": 10, "K": 10, "X": 11, "Y": 12},
+            custom_suits={"𓆏": "GREEN", "𓃰": "GREY"}
+        )
+
+        def longest_straight(cards):
+            rank_values = sorted({c.rank_value for c in cards})
+
+            return max(
+                (j - i for i in range(len(rank_values)) for j in range(i + 1, len(rank_values) + 1)
+                 if rank_values[j - 1] - rank_values[i] == j - 1 - i),
+                default=0
+            )
+
+        rng = Random(3)
+
+        for _ in range(200):
+            hand = Hand(custom_cards=rng.sample(deck.cards, 7))
+
+            self.assertEqual(hand.evaluator.longest_straight(), longest_straight(hand.cards))
+            self.assertEqual(
+                hand.evaluator.longest_straight_flush(),
+                max(longest_straight([c for c in hand.cards if c.suit == suit]) for suit in hand.evaluator.all_card_suits)
+            )
+
+            for cards_count in range(0, 6):
+                self.assertEqual(
+                    hand.evaluator.has_straight(cards_count), longest_straight(hand.cards) >= cards_count
+                )
+
+    def test_has_straight_flush(self):
+        hand = Hand(
+            custom_cards=[
+                Card(rank="3", rank_value=3, suit="𓆏", color="RED"),
+                Card(rank="4", rank_value=4, suit="𓆏", color="RED"),
+                Card(rank="5", rank_value=5, suit="𓃰", color="BLACK"),
+                Card(rank="6", rank_value=6, suit="𓆏", color="RED"),
+                Card(rank="7", rank_value=7, suit="𓆏", color="RED"),
+            ]
+        )
+
+        self.assertTrue(hand.evaluator.has_straight(5))
+        self.assertFalse(hand.evaluator.has_straight_flush(3))
+        self.assertTrue(hand.evaluator.has_straight_flush(2))
+
+        hand.add_cards([Card(rank="5", rank_value=5, suit="𓆏", color="RED")])
+
+        self.assertTrue(hand.evaluator.has_straight_flush(5))
+        self.assertEqual(hand.evaluator.longest_straight_flush(), 5)
+
+    def test_draw_cards_from_deck(self):
+        deck = Deck()
+        deck.shuffle(seed=1)
+        top_cards = deck.cards[0:5]
+
+        hand = Hand()
+        hand.remove_all_cards()
+        hand.draw_cards_from_deck(deck, 5)
+
+        self.assertEqual(hand.cards, top_cards)
+        self.assertEqual(len(deck.cards), 47)
+        self.assertEvaluatorIsCurrent(hand)
+        self.assertEvaluatorIsCurrent(deck)
+
+        with self.assertRaises(IndexError):
+            hand.draw_cards_from_deck(deck, 48)
+
+    def test_shoe_deals_successive_hands(self):
+        deck = Deck()
+        deck.shuffle(seed=2)
+
+        shoe = deck.shoe()
+        hands = list(shoe.deal_hands(5, 5))
+
+        self.assertEqual([c for h in hands for c in h.cards], deck.cards[0:25])
+        self.assertEqual(len(shoe), 27)
+        self.assertEqual(len(deck.cards), 52)
+
+        hand = hands[0]
+        hand.draw_cards_from_deck(shoe, 2)
+
+        self.assertEqual(hand.cards[5:7], deck.cards[25:27])
+        self.assertEvaluatorIsCurrent(hand)
+
+        with self.assertRaises(IndexError):
+            list(shoe.deal_hands(6, 5))
+
+        shoe.reset()
+
+        self.assertEqual(shoe.deal(3), deck.cards[0:3])
+
+    def test_permutation_deck_moves_indexes_not_cards(self):
+        deck = Deck()
+        permutation_deck = deck.permutation_deck()
+
+        permutation_deck.shuffle(seed=16)
+        shuffled = permutation_deck.cards
+
+        self.assertNotEqual(shuffled, deck.cards)
+        self.assertEqual(sorted(map(id, shuffled)), sorted(map(id, deck.cards)))
+
+        other = PermutationDeck(deck.cards)
+        other.shuffle(seed=16)
+        self.assertEqual(other.cards, shuffled)
+
+        hand = permutation_deck.get_sample_hand(5)
+        self.assertEqual(hand.cards, shuffled[0:5])
+        self.assertIs(hand.table, permutation_deck.table)
+        self.assertEqual(hand.evaluator.rank_values_histogram, HandEvaluatorMixin(shuffled[0:5]).rank_values_histogram)
+
+        sample = permutation_deck.sample(7, seed=16)
+        self.assertEqual(len(sample), 7)
+        self.assertEqual(len(set(map(id, sample.cards))), 7)
+        self.assertEqual(permutation_deck.cards, shuffled)
+
+        permutation_deck.remove_cards(lambda x: x.rank != "A", index=13)
+        self.assertEqual(permutation_deck.cards, [c for c in shuffled if c.rank != "A"][0:13])
+
+        permutation_deck.truncate(5)
+        self.assertEqual(len(permutation_deck), 5)
+
+        permutations = deck.permutation_deck().permutations(100, seed=16)
+        self.assertEqual(len(permutations), 100)
+        self.assertTrue(all(sorted(p) == list(range(52)) for p in permutations))
+        self.assertGreater(len(set(map(tuple, permutations))), 1)
+
+    def test_card_filters_compile_to_masks(self):
+        deck = Deck()
+        deck.double_cards()
+        deck.cards[0].point_value = 5
+
+        card_filter = CardFilter(suits=["♡", "♢"], rank_values=(10, 13))
+
+        def lambda_statement(c):
+            return c.suit in ("♡", "♢") and 10 <= c.rank_value <= 13
+
+        self.assertEqual([card_filter(c) for c in deck.cards], [lambda_statement(c) for c in deck.cards])
+        self.assertEqual([(~card_filter)(c) for c in deck.cards], [not lambda_statement(c) for c in deck.cards])
+        self.assertEqual(len([c for c in deck.cards if CardFilter(colors=["BLACK"], ranks=["A"])(c)]), 4)
+        self.assertEqual([c for c in deck.cards if CardFilter(point_values=[5])(c)], deck.cards[0:1])
+
+        permutation_deck = deck.permutation_deck()
+        permutation_deck.shuffle(seed=17)
+        permutations = permutation_deck.permutations(10, seed=17)
+
+        expected = [c for c in permutation_deck.cards if lambda_statement(c)]
+        permutation_deck.remove_cards(card_filter)
+        self.assertEqual(permutation_deck.cards, expected)
+
+        for order, filtered in zip(permutations, permutation_deck.filter_permutations(permutations, card_filter)):
+            self.assertEqual(list(filtered), [i for i in order if lambda_statement(permutation_deck.table[i])])
+
+        hand = Hand()
+        hand.remove_cards(card_filter)
+        self.assertEqual(len(hand.cards), 8)
+        self.assertEvaluatorIsCurrent(hand)
+
+        codes = Hand().encode()
+        kept = CardFilter.take(codes, card_filter.schema_mask(hand.schema))
+        self.assertEqual(kept, hand.encode())
+        self.assertIs(card_filter.schema_mask(hand.schema), card_filter.schema_mask(hand.schema))
+
+        class CountedFilter(CardFilter):
+            calls = 0
+
+            def __call__(self, card):
+                CountedFilter.calls += 1
+                return super().__call__(card)
+
+        counted_filter = CountedFilter(suits=["♡", "♢"], rank_values=(10, 13))
+        counted_filter.schema_mask(hand.schema)
+        calls = CountedFilter.calls
+
+        # hands whose cards haven't been read are filtered by their codes, without calling the filter
+        for evaluated in (False, True):
+            hand = Hand()
+            hand.double_cards()
+
+            if evaluated:
+                hand.evaluator.has_pair()
+
+            hand.remove_cards(counted_filter, index=10)
+            self.assertEqual(hand.encode(), (kept + kept)[0:10])
+            self.assertEvaluatorIsCurrent(hand)
+
+        self.assertEqual(CountedFilter.calls, calls)
+
+        hand = Hand()
+        hand.add_jokers(2)
+        hand.remove_cards(~card_filter)
+        self.assertEqual(len(hand.cards), 46)
+        self.assertEvaluatorIsCurrent(hand)
+
+        hand = Hand()
+        ranks_to_rank_values = {c.rank: c.rank_value for c in hand.cards}
+        ranks_to_rank_values["A"] = 10
+
+        for card in hand.cards:
+            card.assign_custom_rank_value(ranks_to_rank_values)
+
+        # once they've been read (and maybe changed), they're filtered card by card
+        hand.remove_cards(counted_filter)
+        self.assertEqual(len(hand.cards), 10)
+        self.assertEvaluatorIsCurrent(hand)
+        self.assertEqual(CountedFilter.calls, calls + 52)
+
+        deck.remove_cards_by_rank(("2", "3"))
+        self.assertEqual(len(deck.cards), 88)
+        self.assertEvaluatorIsCurrent(deck)
+
+    def test_evaluation_cache_shares_suit_isomorphic_hands(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        cache = deck.schema.evaluation_cache()
+
+        self.assertIs(cache, Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"}).schema.evaluation_cache())
+
+        hand = Hand(custom_cards=[c for c in deck.cards if c.rank in ("2", "3", "4") and c.suit == "𓆏"],
+                    evaluation_cache=cache)
+        relabelled = Hand(custom_cards=[c for c in deck.cards if c.rank in ("2", "3", "4") and c.suit == "𓃰"],
+                          evaluation_cache=cache)
+
+        self.assertEqual(hand.evaluator.canonical_key(), relabelled.evaluator.canonical_key())
+        self.assertTrue(hand.evaluator.has_straight_flush(3))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        self.assertTrue(relabelled.evaluator.has_straight_flush(3))
+        self.assertTrue(relabelled.evaluator.has_straight_flush(3))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        relabelled.remove_top_card()
+
+        self.assertFalse(relabelled.evaluator.has_straight_flush(3))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+        cache.clear()
+
+    def test_evaluation_cache_evicts_least_recently_used(self):
+        cache = EvaluationCache(maxsize=2)
+
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        cache.get("a", lambda: 1)
+        cache.get("c", lambda: 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("a", lambda: None), 1)
+        self.assertEqual(cache.get("b", lambda: None), None)
+
+    def test_cached_simulations_match_uncached(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
+
+        predicates = {
+            "flush": methodcaller("has_flush", 7),
+            "straight": methodcaller("has_straight", 5),
+            "two_pairs": methodcaller("has_two_pairs"),
+        }
+
+        uncached = Simulator(deck, 5, predicates)
+        cached = Simulator(deck, 5, predicates, evaluation_cache=EvaluationCache())
+
+        self.assertEqual(uncached.run(3000, seed=4).hits, cached.run(3000, seed=4).hits)
+        self.assertGreater(cached.evaluation_cache.hits, 0)
+
+    def test_canonicalize_collapses_suit_relabellings(self):
+        deck = Deck()
+
+        def hand_of(*names):
+            return Hand(custom_cards=[c for c in deck.cards if f"{c.rank}{c.suit}" in names])
+
+        hand, hand_count = hand_of("2♠", "3♠", "K♡", "A♢").canonicalize(suits=deck.schema.suits)
+        relabelled, relabelled_count = hand_of("2♢", "3♢", "K♠", "A♣").canonicalize(suits=deck.schema.suits)
+
+        self.assertEqual(str(hand), str(relabelled))
+        self.assertEqual(str(hand), "2♠ 3♠ A♣ K♡")
+        self.assertEqual((hand_count, relabelled_count), (24, 24))
+
+        flush, flush_count = hand_of("2♡", "5♡", "9♡", "J♡", "K♡").canonicalize(suits=deck.schema.suits)
+
+        self.assertEqual({c.suit for c in flush.cards}, {"♠"})
+        self.assertEqual(flush_count, 4)
+
+    def test_suit_isomorphism_classes_give_exact_probabilities(self):
+        deck = Deck(
+            custom_ranks={"2": 2, "3": 3, "4": 4, "5": 5, "6": 6},
+            custom_suits={"𓆏": "GREEN", "𓃰": "GREY", "♡": "RED"}
+        )
+        deck.double_cards()
+
+        classes = list(suit_isomorphism_classes(deck, 5))
+        hands = [HandEvaluatorMixin(list(cards)) for cards in combinations(deck.cards, 5)]
+
+        self.assertEqual(sum(weight for cards, weight in classes), len(hands))
+        self.assertLess(len(classes), len(hands) / 4)
+
+        def straight_flush(evaluator):
+            return evaluator.has_straight_flush(3)
+
+        self.assertEqual(
+            exact_probability(deck, 5, straight_flush, enumerate_classes=True),
+            Fraction(len([e for e in hands if straight_flush(e)]), len(hands))
+        )
+
+        with self.assertRaises(ValueError):
+            list(suit_isomorphism_classes(deck, 5, card_filter=lambda x: x.rank != "2" or x.suit != "♡"))
+
+    def test_sweep_lowest_cards_matches_removing_them(self):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
+
+        def straights_and_pairs(evaluator):
+            return evaluator.longest_straight(), evaluator.longest_straight_flush(), evaluator.has_two_pairs()
+
+        for cards in Simulator(deck, 12, {}).samples(50, seed=13):
+            hand = Hand(custom_cards=list(cards))
+            swept = hand.sweep_lowest_cards(straights_and_pairs, 3)
+
+            self.assertEqual(len(hand.cards), 12)
+            self.assertEqual(sorted(swept), list(range(3, 13)))
+
+            while len(hand.cards) >= 3:
+                self.assertEqual(swept[len(hand.cards)], straights_and_pairs(hand.evaluator))
+
+                hand.remove_lowest_ranked_card()
+
+        hand = Hand(custom_cards=[
+            Card(rank="10", rank_value=10, suit="𓆏", color="GREEN"),
+            Card(rank="2", rank_value=2, suit="𓆏", color="GREEN"),
+            Card(rank="3", rank_value=3, suit="𓃰", color="GREY")
+        ])
+        hand.remove_lowest_ranked_card()
+
+        self.assertEqual(sorted(c.rank_value for c in hand.cards), [3, 10])
+
+    def test_total_value_distribution_matches_enumeration(self):
+        deck = Deck(
+            custom_ranks={"A": 14, "K": 13, "Q": 12, "J": 11, "10": 10, "2": 2},
+            custom_suits={"𓆏": "GREEN", "𓃰": "GREY", "♡": "RED"}
+        )
+        value_map = {"A": 1, "K": 10, "Q": 10, "J": 10, "10": 10, "2": 2}
+
+        totals = [sum(value_map[c.rank] for c in cards) for cards in combinations(deck.cards, 4)]
+        distribution = total_value_distribution(deck, 4, value_map)
+
+        self.assertEqual(distribution.hands, len(totals))
+        self.assertEqual(distribution.values, sorted(set(totals)))
+
+        for total in distribution.values:
+            self.assertEqual(distribution.probability(total), Fraction(totals.count(total), len(totals)))
+
+        self.assertEqual(distribution.probability(3), 0)
+        self.assertAlmostEqual(distribution.cdf[-1], 1)
+
+        for total in range(min(totals) - 1, max(totals) + 2):
+            self.assertAlmostEqual(distribution.at_most(total), len([t for t in totals if t <= total]) / len(totals))
+
+        by_rank_value = total_value_distribution(deck, 4, card_filter=lambda x: x.rank != "2")
+        self.assertEqual(by_rank_value.values[0], 10 + 10 + 10 + 11)
+
+        sampled = total_value_distribution(deck, 4, value_map, iterations=20000, seed=14)
+        self.assertFalse(sampled.exact)
+        self.assertAlmostEqual(sampled.at_most(22), distribution.at_most(22), delta=0.02)
+
+        with self.assertRaises(ValueError):
+            total_value_distribution(deck, 19, value_map)
+
+        # default cards have no point values
+        with self.assertRaises(ValueError):
+            total_value_distribution(Deck(), 5, attribute="point_value")
+
+    def test_showdown_scores_every_seat(self):
+        deck = Deck(custom_ranks={"2": 2, "3": 3}, custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        total = methodcaller("get_total_rank_values")
+
+        # two of the four cards match, so a third of the deals are ties
+        result = Showdown(deck, 2, 1, total).run(20000, seed=15)
+
+        self.assertEqual(result.iterations, 20000)
+        self.assertEqual(result.wins[0] + result.wins[1] + result.ties[0], 20000)
+        self.assertEqual(result.ties[0], result.ties[1])
+        self.assertAlmostEqual(result.tie_rate(0), 1 / 3, delta=0.02)
+        self.assertAlmostEqual(result.win_rate(1), 1 / 3, delta=0.02)
+        self.assertAlmostEqual(result.lose_rate(0), result.win_rate(1))
+        self.assertEqual(list(result.score_distribution(1)), [2, 3])
+
+        showdown = Showdown(deck, 2, 2, total, low_wins=True)
+
+        for hands in showdown.deals(100, seed=15):
+            self.assertEqual([len(cards) for cards in hands], [2, 2])
+            self.assertEqual(sorted(c.rank_value for cards in hands for c in cards), [2, 2, 3, 3])
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            result = showdown.run(1000, seed=15, workers=2, executor=executor)
+
+        self.assertEqual(result.wins, showdown.run(1000, seed=15, workers=2).wins)
+        self.assertEqual(result.wins[0] + result.wins[1] + result.ties[0], 1000)
+
+        result = Showdown(Deck(), 3, 7, HandRanker()).run(200, seed=15)
+
+        self.assertEqual(sum(sum(result.scores[s].values()) for s in range(3)), 600)
+        self.assertLessEqual(sum(result.wins), 200)
+        self.assertGreaterEqual(sum(result.wins) + sum(result.ties), 200)
+
+        with self.assertRaises(ValueError):
+            Showdown(Deck(), 11, 5, HandRanker())
+
+    def test_wildcards_stand_in_for_best_cards(self):
+        deck = Deck()
+        rng = Random(23)
+        ranker = HandRanker()
+
+        queries = [
+            methodcaller("has_pair"), methodcaller("has_two_pairs"), methodcaller("has_four_of_a_kind"),
+            methodcaller("has_m_many_n_of_a_kind", 1, 5), methodcaller("has_m_many_n_of_a_kind", 2, 3),
+            methodcaller("has_m_many_n_of_a_kind", 0, 5),
+            methodcaller("has_flush", 4), methodcaller("has_straight", 5), methodcaller("has_straight", 7),
+            methodcaller("has_straight_flush", 4)
+        ]
+
+        aces = [c for c in deck.cards if c.rank == "A"]
+        kings = [c for c in deck.cards if c.rank == "K"]
+
+        for i in range(60):
+            jokers_count = rng.choice([1, 2])
+
+            # some hands with large sets, which wild cards can't take past four of a kind
+            if i % 4:
+                natural_cards = rng.sample(deck.cards, rng.choice([3, 5]))
+            else:
+                natural_cards = rng.sample(aces, rng.choice([3, 4])) + rng.sample(kings, rng.choice([1, 3]))
+
+            hand = Hand(custom_cards=list(natural_cards))
+            hand.add_jokers(jokers_count)
+            hand.use_wildcards()
+
+            # wild cards stand in for cards the hand doesn't already hold, for the evaluator as for the ranker
+            free_cards = [c for c in deck.cards if c not in natural_cards]
+            substitutions = list(combinations(free_cards, jokers_count))
+
+            self.assertEqual(hand.evaluator.wildcards_count, jokers_count)
+            self.assertEqual(
+                [query(hand.evaluator) for query in queries],
+                [any(query(HandEvaluatorMixin(natural_cards + list(s))) for s in substitutions) for query in queries]
+            )
+
+            if 5 <= len(hand.cards) <= 7:
+                codes = list(deck.schema.encode(natural_cards))
+                free_codes = [code for code in range(52) if code not in codes]
+
+                self.assertEqual(
+                    ranker(hand.evaluator),
+                    max(ranker.rank_codes(codes + list(s)) for s in combinations(free_codes, jokers_count))
+                )
+
+        hand = Hand(custom_cards=rng.sample(deck.cards, 7))
+        evaluator = hand.evaluator
+        hand.use_wildcards()
+
+        self.assertEqual([query(hand.evaluator) for query in queries], [query(evaluator) for query in queries])
+        self.assertEqual(ranker(hand.evaluator), ranker(evaluator))
+
+        # a joker can't make a fifth ace
+        hand = Hand(custom_cards=list(aces))
+        hand.add_jokers(1)
+        hand.use_wildcards()
+
+        self.assertEqual(ranker.rank_wild(hand.cards)[0], "FOUR_OF_A_KIND")
+        self.assertFalse(hand.evaluator.has_m_many_n_of_a_kind(1, 5))
+        self.assertTrue(hand.evaluator.has_m_many_n_of_a_kind(2, 1))
+
+        # sweeps evaluate the hand the way it's evaluated
+        hand = Hand(custom_cards=aces[0:3] + kings[0:1])
+        hand.add_jokers(1)
+        hand.use_wildcards()
+
+        self.assertEqual(
+            hand.sweep_lowest_cards(methodcaller("has_four_of_a_kind")),
+            {1: False, 2: False, 3: False, 4: False, 5: True}
+        )
+
     @staticmethod
     @unittest.skip
     def test_get_foak_probability():
 
-        foak_count = 0
-        iterations = 100000
-
-        for i in range(0, iterations):
-            deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
 
-            deck.double_cards()
-            deck.shuffle()
-            deck.remove_cards(lambda_statement=lambda x: x.rank != "A", index=13)
+        simulator = Simulator(
+            deck=deck,
+            draw_count=13,
+            predicates={"four_of_a_kind": lambda e: e.has_four_of_a_kind()},
+            card_filter=lambda x: x.rank != "A"
+        )
 
-            if deck.evaluator.has_four_of_a_kind():
-                foak_count += 1
+        # sample until the estimate is within 2% of the true probability, 95% of the time
+        result = simulator.run_until(relative_error=0.02)
 
         print(
             "The probability of having a four-of-a-kind given this custom deck is around {} %.".format(
-                foak_count / iterations * 100
+                result.probability("four_of_a_kind") * 100
+            )
+        )
+
+        print(
+            "The importance sampled probability of a four-of-a-kind given this custom deck is around {} %.".format(
+                simulator.run_importance(10000, tilt=2)["four_of_a_kind"].value * 100
+            )
+        )
+
+        print(
+            "The probability of having a four-of-a-kind given this custom deck is exactly {} %.".format(
+                float(
+                    exact_probability(deck, 13, NOfAKindPredicate(1, 4), card_filter=lambda x: x.rank != "A")
+                ) * 100
             )
         )
 
@@ -144,25 +1344,36 @@ class HandEvaluations(unittest.TestCase):
     @unittest.skip
     def test_get_straights_probability():
 
-        for i in range(3, 9):
-            straight_count = 0
-            straight_length = i
-            iterations = 50000
-
-            for j in range(0, iterations):
-                deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
 
-                deck.double_cards()
-                deck.shuffle()
-                deck.remove_cards(lambda_statement=lambda x: x.rank != "A", index=13)
+        simulator = Simulator(
+            deck=deck,
+            draw_count=13,
+            predicates={
+                straight_length: (lambda e, n=straight_length: e.has_straight(n)) for straight_length in range(3, 9)
+            },
+            card_filter=lambda x: x.rank != "A"
+        )
 
-                if deck.evaluator.has_straight(straight_length):
-                    straight_count += 1
+        result = simulator.run_until(half_width=0.002)
 
+        for straight_length in range(3, 9):
             print(
                 "The probability of this deck containing a {}-card straight is around {} %.".format(
                     straight_length,
-                    straight_count / iterations * 100
+                    result.probability(straight_length) * 100
+                )
+            )
+
+            print(
+                "The probability of this deck containing a {}-card straight is exactly {} %.".format(
+                    straight_length,
+                    float(
+                        exact_probability(
+                            deck, 13, StraightPredicate(straight_length), card_filter=lambda x: x.rank != "A"
+                        )
+                    ) * 100
                 )
             )
 
@@ -182,21 +1393,20 @@ class HandEvaluations(unittest.TestCase):
         for i in range(3, 13):
             straight_count_frequencies[i] = 0
 
-        for i in range(max_iterations):
+        deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        deck.double_cards()
 
-            deck = Deck(custom_suits={"𓆏": "GREEN", "𓃰": "GREY"})
+        simulator = Simulator(deck=deck, draw_count=12, predicates={}, card_filter=lambda x: x.rank != "A")
 
-            deck.double_cards()
-            deck.shuffle()
-            deck.remove_cards(lambda_statement=lambda x: x.rank != "A", index=13)
+        for cards in simulator.samples(max_iterations):
 
-            hand = deck.get_sample_hand(12)
+            hand = Hand(custom_cards=cards)
 
-            while len(hand.cards) >= straight_length:
-                if hand.evaluator.has_straight(straight_length):
-                    straight_count_frequencies[len(hand.cards)] += 1
+            sweep = hand.sweep_lowest_cards(lambda e: e.has_straight(straight_length), straight_length)
 
-                hand.remove_lowest_ranked_card()
+            for cards_count, has_straight in sweep.items():
+                if has_straight:
+                    straight_count_frequencies[cards_count] += 1
 
         for i in sorted(straight_count_frequencies.keys()):
             print(
@@ -261,110 +1471,67 @@ class HandEvaluations(unittest.TestCase):
             "2": 2
         }
 
-        total_rank_values = {}
+        deck = Deck()
+        deck.remove_cards_by_rank(["10", "9", "8"])
 
-        for i in range(0, 50000):
-            hand = Hand()
-            deck = Deck()
+        distribution = total_value_distribution(deck, 5, ranks_to_rank_values)
 
-            deck.remove_cards_by_rank(["10", "9", "8"])
-            deck.shuffle()
+        total_rank_value_histogram = [
+            (total, cumulative * 100) for total, cumulative in zip(distribution.values, distribution.cdf)
+        ]
 
-            for card in hand.cards:
-                card.assign_custom_rank_value(ranks_to_rank_values)
+        print(total_rank_value_histogram)
 
-            for card in deck.cards:
-                card.assign_custom_rank_value(ranks_to_rank_values)
+    @staticmethod
+    @unittest.skip
+    def test_determine_if_other_hands_have_lower_total_card_rank_values():
 
-            hand.remove_all_cards()
-            hand.draw_cards_from_deck(deck, 5)
+        ranks_to_rank_values = {
+            "A": 1,
+            "K": 10,
+            "Q": 10,
+            "J": 10,
+            "10": 10,
+            "9": 9,
+            "8": 6,
+            "7": 7,
+            "6": 6,
+            "5": 5,
+            "4": 4,
+            "3": 3,
+            "2": 2
+        }
 
-            total = hand.get_total_rank_values()
+        player_count = 5
 
-            if total not in total_rank_values:
-                total_rank_values[total] = 1
-            else:
-                total_rank_values[total] += 1
+        deck = Deck()
+        deck.remove_cards_by_rank(["10", "9", "8"])
 
-        total_rank_values = dict(sorted(total_rank_values.items()))
+        for card in deck.cards:
+            card.assign_custom_rank_value(ranks_to_rank_values)
+
+        showdown = Showdown(
+            deck=deck,
+            player_count=player_count,
+            hand_size=5,
+            scorer=methodcaller("get_total_rank_values"),
+            low_wins=True
+        )
 
-        # for trv in total_rank_values:
-        #     print(trv, total_rank_values[trv] / 500)
+        result = showdown.run(50000)
 
-        # print(sum([total_rank_values[trv] / 500 for trv in total_rank_values]))
+        lowest_vs_caught = {
+            "WON": result.wins[0],
+            "CAUGHT": result.iterations - result.wins[0]
+        }
+
+        print(lowest_vs_caught)
 
         sum = 0
         total_rank_value_histogram = []
 
-        for trv in total_rank_values:
-            sum += total_rank_values[trv] / 500
+        for trv, probability in result.score_distribution(0).items():
+            sum += probability * 100
             total_rank_value_histogram.append((trv, sum))
 
         print(total_rank_value_histogram)
-
-    # @staticmethod
-    # def test_determine_if_other_hands_have_lower_total_card_rank_values():
-    #
-    #     ranks_to_rank_values = {
-    #         "A": 1,
-    #         "K": 10,
-    #         "Q": 10,
-    #         "J": 10,
-    #         "10": 10,
-    #         "9": 9,
-    #         "8": 6,
-    #         "7": 7,
-    #         "6": 6,
-    #         "5": 5,
-    #         "4": 4,
-    #         "3": 3,
-    #         "2": 2
-    #     }
-    #
-    #     player_count = 5
-    #
-    #     lowest_vs_caught = {
-    #         "WON": 0,
-    #         "CAUGHT": 0
-    #     }
-    #
-    #     total_rank_values = {}
-    #
-    #     for i in range(0, 50000):
-    #
-    #         deck = Deck()
-    #
-    #         deck.remove_cards_by_rank(["10", "9", "8"])
-    #         deck.shuffle()
-    #
-    #         for card in deck.cards:
-    #             card.assign_custom_rank_value(ranks_to_rank_values)
-    #
-    #         hands = [Hand() for h in range(0, player_count)]
-    #
-    #         for h in hands:
-    #             h.remove_all_cards()
-    #             h.draw_cards_from_deck(deck, 5)
-    #
-    #         hand_rank_value_totals = [h.get_total_rank_values() for h in hands]
-    #
-    #         total = hands[0].get_total_rank_values()
-    #
-    #         if total not in total_rank_values:
-    #             total_rank_values[total] = 1
-    #         else:
-    #             total_rank_values[total] += 1
-    #
-    #         if total == min(hand_rank_value_totals) and hand_rank_value_totals.count(total) == 1:
-    #             lowest_vs_caught["WON"] += 1
-    #         else:
-    #             lowest_vs_caught["CAUGHT"] += 1
-    #
-    #     sum = 0
-    #     total_rank_value_histogram = []
-    #
-    #     for trv in total_rank_values:
-    #         sum += total_rank_values[trv] / 500
-    #         total_rank_value_histogram.append((trv, sum))
-    #
-    #     print(total_rank_value_histogram)